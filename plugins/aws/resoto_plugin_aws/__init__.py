@@ -114,6 +114,34 @@ class AWSPlugin(BaseCollectorPlugin):
             default=20,
             type=int,
         )
+        arg_parser.add_argument(
+            "--aws-collector-pool-size",
+            help="AWS Collector Thread Pool Size per Region (default: 5)",
+            dest="aws_collector_pool_size",
+            default=5,
+            type=int,
+        )
+        arg_parser.add_argument(
+            "--aws-api-rate",
+            help="AWS API calls per second per account, region and service (default: 20)",
+            dest="aws_api_rate",
+            default=20.0,
+            type=float,
+        )
+        arg_parser.add_argument(
+            "--aws-api-burst",
+            help="AWS API call burst size per account, region and service (default: 50)",
+            dest="aws_api_burst",
+            default=50,
+            type=int,
+        )
+        arg_parser.add_argument(
+            "--aws-api-retries",
+            help="Maximum retries of a single throttled AWS API call (default: 10)",
+            dest="aws_api_retries",
+            default=10,
+            type=int,
+        )
         arg_parser.add_argument(
             "--aws-collect",
             help="AWS services to collect (default: all)",
@@ -16,7 +16,7 @@ from .utils import aws_session, paginate, arn_partition
 from .resources import *
 from prometheus_client import Summary, Counter
 from pkg_resources import resource_filename
-from typing import List, Optional, Dict, Tuple
+from typing import List, Optional, Dict, Tuple, Callable
 from retrying import retry
 from pprint import pformat
 from resotolib.logging import log
@@ -253,6 +253,22 @@ def retry_on_request_limit_exceeded(e):
     return False
 
 
+def add_graph(graph: Graph, other: Graph) -> None:
+    """Add all nodes and edges of other to graph
+
+    Unlike Graph.merge() the roots are not connected and edges that
+    already exist in graph are skipped.
+    """
+    graph._log_edge_creation = False
+    try:
+        graph.update(
+            edges=[edge for edge in other.edges if not graph.has_edge(*edge)],
+            nodes=other.nodes,
+        )
+    finally:
+        graph._log_edge_creation = True
+
+
 class AWSAccountCollector:
     def __init__(self, regions: List, account: AWSAccount) -> None:
         self.regions = [AWSRegion(region, {}, _account=account) for region in regions]
@@ -303,6 +319,41 @@ class AWSAccountCollector:
             "elastic_ips": self.collect_elastic_ips,
             "cloudwatch_alarms": self.collect_cloudwatch_alarms,
         }
+        # Collectors that look up resources of other collectors in the graph have to declare them here.
+        # They are only started once all of their dependencies have finished.
+        # Collectors without dependencies in the same region run concurrently.
+        self.collector_dependencies = {
+            "iam_groups": ["iam_policies"],
+            "iam_roles": ["iam_instance_profiles", "iam_policies"],
+            "iam_users": ["iam_policies", "iam_groups"],
+            "reserved_instances": ["instances"],
+            "subnets": ["vpcs"],
+            "route_tables": ["vpcs"],
+            "security_groups": ["vpcs"],
+            "internet_gateways": ["vpcs"],
+            "instances": ["keypairs"],
+            "volumes": ["instances"],
+            "snapshots": ["volumes"],
+            "elbs": ["vpcs", "subnets", "security_groups", "instances"],
+            "albs": ["vpcs", "subnets", "security_groups"],
+            "alb_target_groups": ["vpcs", "instances", "albs"],
+            "autoscaling_groups": ["instances"],
+            "network_acls": ["vpcs", "subnets"],
+            "network_interfaces": ["vpcs", "subnets", "security_groups", "instances"],
+            "nat_gateways": ["vpcs", "subnets", "network_interfaces"],
+            "rds_instances": ["vpcs", "subnets", "security_groups"],
+            "eks_clusters": ["autoscaling_groups"],
+            "vpc_peering_connections": ["vpcs"],
+            "vpc_endpoints": [
+                "vpcs",
+                "subnets",
+                "route_tables",
+                "security_groups",
+                "network_interfaces",
+            ],
+            "elastic_ips": ["instances", "network_interfaces"],
+            "cloudwatch_alarms": ["instances"],
+        }
         self.collector_set = set(self.global_collectors.keys()).union(
             set(self.region_collectors.keys())
         )
@@ -353,17 +404,13 @@ class AWSAccountCollector:
                     log.debug(f"Adding graph of region {region.name} to account graph")
                     self.graph.merge(graph)
 
-    @retry(
-        stop_max_attempt_number=10,
-        wait_exponential_multiplier=3000,
-        wait_exponential_max=300000,
-        retry_on_exception=retry_on_request_limit_exceeded,
-    )
     def collect_resources(self, collectors: Dict, region: AWSRegion) -> Graph:
         log.info(
             f"Collecting resources in AWS account {self.account.dname} region {region.name}"
         )
         graph = Graph(root=region)
+        graph_lock = Lock()
+        pending = {}
         for collector_name, collector in collectors.items():
             if (
                 len(ArgumentParser.args.aws_collect) > 0
@@ -373,39 +420,91 @@ class AWSAccountCollector:
                     f"Not running {collector_name} collector in account {self.account.dname} region {region.name}"
                 )
                 continue
-            try:
-                log.debug(
-                    f"Running {collector_name} collector in account {self.account.dname} region {region.name}"
-                )
-                collector(region, graph)
-            except botocore.exceptions.ClientError as e:
-                if e.response["Error"]["Code"] == "UnauthorizedOperation":
+            pending[collector_name] = collector
+
+        # Dependencies on collectors that are not running in this region are considered satisfied
+        dependencies = {
+            collector_name: {
+                dependency
+                for dependency in self.collector_dependencies.get(collector_name, [])
+                if dependency in pending
+            }
+            for collector_name in pending
+        }
+        done = set()
+        authorized = True
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=ArgumentParser.args.aws_collector_pool_size,
+            thread_name_prefix=f"aws_{self.account.id}_{region.id}",
+        ) as executor:
+            running = {}
+            while running or (pending and authorized):
+                if authorized:
+                    for collector_name in list(pending.keys()):
+                        if dependencies[collector_name].issubset(done):
+                            future = executor.submit(
+                                self.run_collector,
+                                collector_name,
+                                pending.pop(collector_name),
+                                region,
+                                graph,
+                                graph_lock,
+                                len(dependencies[collector_name]) > 0,
+                            )
+                            running[future] = collector_name
+                if not running:
                     log.error(
-                        f"Not authorized to collect resources in account {self.account.dname} region {region.id}"
-                    )
-                    return graph
-                elif e.response["Error"]["Code"] in (
-                    "RequestLimitExceeded",
-                    "Throttling",
-                ):
-                    raise
-                else:
-                    log.exception(
                         (
-                            f"An AWS API error occured during {collector_name} resource collection in "
-                            f"account {self.account.dname} region {region.name} - skipping resources"
+                            f"Unable to resolve collector dependencies in account {self.account.dname} "
+                            f"region {region.name} - not running {', '.join(pending.keys())}"
                         )
                     )
-                    metrics_unhandled_collector_exceptions.labels(
-                        account=self.account.dname,
-                        region=region.name,
-                        collector=collector_name,
-                    ).inc()
-            except Exception:
+                    break
+                finished, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in finished:
+                    done.add(running.pop(future))
+                    if not future.result():
+                        authorized = False
+        graph.resolve_deferred_connections()
+        return graph
+
+    def run_collector(
+        self,
+        collector_name: str,
+        collector: Callable,
+        region: AWSRegion,
+        graph: Graph,
+        graph_lock: Lock,
+        with_dependencies: bool,
+    ) -> bool:
+        """Run a single collector against its own graph and merge the result into the region graph.
+
+        Collectors that depend on other collectors get a copy of the region graph, so they can
+        find the resources of their dependencies. Returns False if the collector was not authorized
+        to collect resources in this region.
+        """
+        collector_graph = Graph(root=region)
+        if with_dependencies:
+            with graph_lock:
+                add_graph(collector_graph, graph)
+        try:
+            log.debug(
+                f"Running {collector_name} collector in account {self.account.dname} region {region.name}"
+            )
+            collector(region, collector_graph)
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] == "UnauthorizedOperation":
+                log.error(
+                    f"Not authorized to collect resources in account {self.account.dname} region {region.id}"
+                )
+                return False
+            else:
                 log.exception(
                     (
-                        f"Unhandeled collector exception while collecting {collector_name} resources in "
-                        f"account {self.account.dname} region {region.name}"
+                        f"An AWS API error occured during {collector_name} resource collection in "
+                        f"account {self.account.dname} region {region.name} - skipping resources"
                     )
                 )
                 metrics_unhandled_collector_exceptions.labels(
@@ -413,7 +512,22 @@ class AWSAccountCollector:
                     region=region.name,
                     collector=collector_name,
                 ).inc()
-        return graph
+        except Exception:
+            log.exception(
+                (
+                    f"Unhandeled collector exception while collecting {collector_name} resources in "
+                    f"account {self.account.dname} region {region.name}"
+                )
+            )
+            metrics_unhandled_collector_exceptions.labels(
+                account=self.account.dname,
+                region=region.name,
+                collector=collector_name,
+            ).inc()
+        finally:
+            with graph_lock:
+                add_graph(graph, collector_graph)
+        return True
 
     # todo: more targeted caching than four layers of lru_cache()
     @lru_cache()
@@ -2,10 +2,12 @@ import botocore.exceptions
 import sys
 import inspect
 import pathlib
-from typing import Iterable
+from functools import partial
+from typing import Iterable, List, Dict
 from collections import deque
 from itertools import islice
 from sqlalchemy import create_engine, func
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import (
@@ -23,6 +25,7 @@ from resotov1.cli import replace_placeholder
 from resotolib.utils import split_esc, iec_size_format
 from resotolib.args import get_arg_parser, ArgumentParser
 from resoto_plugin_aws.utils import aws_session
+from resoto_plugin_aws.cmd.s3_listing import collect_bucket_objects
 from resoto_plugin_aws.resources import AWSAccount
 from resoto_plugin_aws import current_account_id, AWSPlugin, get_org_accounts
 
@@ -58,11 +61,18 @@ def add_args(arg_parser: ArgumentParser) -> None:
     )
     arg_parser.add_argument(
         "--aws-s3-skip-checks",
-        help="Skip SQL exists checks (default: False)",
+        help="Skip SQL upserts, only use on an empty database (default: False)",
         dest="aws_s3_skip_checks",
         action="store_true",
         default=False,
     )
+    arg_parser.add_argument(
+        "--aws-s3-pool-size",
+        help="Number of buckets and prefixes to list in parallel (default: 10)",
+        dest="aws_s3_pool_size",
+        default=10,
+        type=int,
+    )
     arg_parser.add_argument(
         "--aws-s3-collect",
         help="Collect from S3 (default: False)",
@@ -116,13 +126,18 @@ class Bucket(Base):
 
 class BucketObject(Base):
     __tablename__ = "bucketobjects"
-    __table_args__ = (PrimaryKeyConstraint("account", "bucket_name", "name"),)
+    # Without a rowid the rows are stored in the primary key b-tree, ordered by
+    # (account, bucket_name, name): this serves the directory and object listings.
+    __table_args__ = (
+        PrimaryKeyConstraint("account", "bucket_name", "name"),
+        {"sqlite_with_rowid": False},
+    )
 
-    account = Column(String, index=True)
-    bucket_name = Column(String, index=True)
-    name = Column(String, index=True)
-    size = Column(Integer, index=True)
-    mtime = Column(DateTime, index=True)
+    account = Column(String)
+    bucket_name = Column(String)
+    name = Column(String)
+    size = Column(Integer)
+    mtime = Column(DateTime)
 
     def __repr__(self):
         return (
@@ -178,65 +193,57 @@ def cli():
 
 def collect():
     accounts = get_accounts()
-    for account in accounts:
-        if not ArgumentParser.args.aws_s3_bucket:
-            try:
-                buckets = collect_buckets(account)
-            except Exception:
-                log.exception(f"Failed to collect buckets in {account.rtdname}")
-            else:
-                for bucket in buckets:
-                    try:
-                        collect_bucket(account, bucket.name)
-                    except Exception:
-                        log.exception(
-                            f"Failed to collect bucket {bucket.name} in {account.rtdname}"
-                        )
-        else:
-            try:
-                collect_bucket(account, ArgumentParser.args.aws_s3_bucket)
-            except Exception:
-                log.exception(
-                    f"Failed to collect bucket {ArgumentParser.args.aws_s3_bucket} in {account.rtdname}"
-                )
-
-
-def collect_bucket(account: AWSAccount, bucket_name):
-    session = aws_session(account.id, account.role)
-    s3 = session.resource("s3")
     dbs = Session()
 
-    log.info(
-        f"Collecting all objects in AWS S3 bucket {bucket_name} in {account.rtdname}"
+    def buckets():
+        for account in accounts:
+            # one session per account: creating a session assumes the role of the account
+            client = aws_session(account.id, account.role).client("s3")
+            if not ArgumentParser.args.aws_s3_bucket:
+                try:
+                    bucket_names = [
+                        bucket.name for bucket in collect_buckets(account, client)
+                    ]
+                except Exception:
+                    log.exception(f"Failed to collect buckets in {account.rtdname}")
+                    continue
+            else:
+                bucket_names = [ArgumentParser.args.aws_s3_bucket]
+            for bucket_name in bucket_names:
+                yield account, client, bucket_name
+
+    collect_bucket_objects(
+        buckets(),
+        partial(write_bucket_objects, dbs),
+        ArgumentParser.args.aws_s3_pool_size,
     )
-    bucket = s3.Bucket(bucket_name)
-    for bucket_object in bucket.objects.all():
-        # TODO: this could be highly optimized via batching
-        if (
-            not ArgumentParser.args.aws_s3_skip_checks
-            and dbs.query(BucketObject)
-            .filter_by(
-                account=account.id, bucket_name=bucket_name, name=bucket_object.key
-            )
-            .scalar()
-            is not None
-        ):
-            continue
-
-        bo = BucketObject(
-            account=account.id,
-            bucket_name=bucket_name,
-            name=bucket_object.key,
-            size=bucket_object.size,
-            mtime=bucket_object.last_modified,
+
+
+def write_bucket_objects(dbs, account_id: str, bucket_name: str, objects: List[Dict]):
+    """Bulk upsert one page of bucket objects"""
+    statement = insert(BucketObject)
+    if not ArgumentParser.args.aws_s3_skip_checks:
+        statement = statement.on_conflict_do_update(
+            index_elements=["account", "bucket_name", "name"],
+            set_={"size": statement.excluded.size, "mtime": statement.excluded.mtime},
         )
-        dbs.add(bo)
+    dbs.execute(
+        statement,
+        [
+            {
+                "account": account_id,
+                "bucket_name": bucket_name,
+                "name": bucket_object["Key"],
+                "size": bucket_object["Size"],
+                "mtime": bucket_object["LastModified"],
+            }
+            for bucket_object in objects
+        ],
+    )
     dbs.commit()
 
 
-def collect_buckets(account: AWSAccount):
-    session = aws_session(account.id, account.role)
-    client = session.client("s3")
+def collect_buckets(account: AWSAccount, client):
     dbs = Session()
     response = client.list_buckets()
     buckets = response.get("Buckets", [])
@@ -244,21 +251,25 @@ def collect_buckets(account: AWSAccount):
     log.info(f"Collecting all buckets in {account.rtdname}")
 
     for bucket in buckets:
-        bucket_name = bucket.get("Name")
-        bucket_ctime = bucket.get("CreationDate")
-
-        if (
-            not ArgumentParser.args.aws_s3_skip_checks
-            and dbs.query(Bucket)
-            .filter_by(account=account.id, name=bucket_name)
-            .scalar()
-            is not None
-        ):
-            continue
-
-        b = Bucket(account=account.id, name=bucket_name, ctime=bucket_ctime)
-        log.info(f"Found bucket {bucket_name} in {account.rtdname}")
-        dbs.add(b)
+        log.info(f"Found bucket {bucket.get('Name')} in {account.rtdname}")
+    if buckets:
+        statement = insert(Bucket)
+        if not ArgumentParser.args.aws_s3_skip_checks:
+            statement = statement.on_conflict_do_update(
+                index_elements=["account", "name"],
+                set_={"ctime": statement.excluded.ctime},
+            )
+        dbs.execute(
+            statement,
+            [
+                {
+                    "account": account.id,
+                    "name": bucket.get("Name"),
+                    "ctime": bucket.get("CreationDate"),
+                }
+                for bucket in buckets
+            ],
+        )
     dbs.commit()
 
     return dbs.query(Bucket).filter_by(account=account.id)
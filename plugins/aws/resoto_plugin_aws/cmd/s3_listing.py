@@ -0,0 +1,107 @@
+import resotolib.logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from functools import partial
+from queue import Queue, Empty, Full
+from threading import Event
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+from resoto_plugin_aws.resources import AWSAccount
+
+log = resotolib.logging.getLogger("resoto.cmd")
+
+
+class ListingCancelled(Exception):
+    pass
+
+
+def list_bucket_objects(
+    client: Any,
+    bucket_name: str,
+    prefix: str,
+    delimiter: str,
+    put: Callable[[List[Dict]], None],
+) -> List[str]:
+    """List all objects below prefix page by page and return the common prefixes found"""
+    paginator = client.get_paginator("list_objects_v2")
+    args = {"Bucket": bucket_name, "Prefix": prefix}
+    if delimiter:
+        args["Delimiter"] = delimiter
+    prefixes = []
+    for page in paginator.paginate(**args):
+        prefixes.extend(p["Prefix"] for p in page.get("CommonPrefixes", []))
+        if page.get("Contents"):
+            put(page["Contents"])
+    return prefixes
+
+
+def collect_bucket_objects(
+    buckets: Iterable[Tuple[AWSAccount, Any, str]],
+    write: Callable[[str, str, List[Dict]], None],
+    pool_size: int,
+) -> None:
+    """List the objects of all buckets in parallel.
+
+    buckets yields the account, the S3 client of the account and the bucket name.
+    The top level of a bucket is listed first, every prefix found is then listed in parallel.
+    Every page of objects is handed to write(account_id, bucket_name, objects) on the calling thread.
+    The pages are handed over via a bounded queue to limit the memory used by pages.
+    """
+    pages: Queue = Queue(maxsize=pool_size * 2)
+    cancelled = Event()
+    listings: Dict[Future, Tuple[AWSAccount, Any, str, str]] = {}
+
+    def put(account_id: str, bucket_name: str, objects: List[Dict]) -> None:
+        while not cancelled.is_set():
+            try:
+                pages.put((account_id, bucket_name, objects), timeout=0.1)
+                return
+            except Full:
+                pass
+        raise ListingCancelled()
+
+    with ThreadPoolExecutor(
+        max_workers=pool_size, thread_name_prefix="aws_s3"
+    ) as executor:
+
+        def submit(
+            account: AWSAccount, client: Any, bucket_name: str, prefix: str, delimiter
+        ) -> None:
+            future = executor.submit(
+                list_bucket_objects,
+                client,
+                bucket_name,
+                prefix,
+                delimiter,
+                partial(put, account.id, bucket_name),
+            )
+            listings[future] = (account, client, bucket_name, prefix)
+
+        try:
+            for account, client, bucket_name in buckets:
+                log.info(
+                    f"Collecting all objects in AWS S3 bucket {bucket_name} in {account.rtdname}"
+                )
+                submit(account, client, bucket_name, "", "/")
+
+            while listings or not pages.empty():
+                try:
+                    write(*pages.get(timeout=0.1))
+                    continue
+                except Empty:
+                    pass
+                for future in [future for future in listings if future.done()]:
+                    account, client, bucket_name, prefix = listings.pop(future)
+                    try:
+                        prefixes = future.result()
+                    except Exception:
+                        log.exception(
+                            f"Failed to collect bucket {bucket_name} prefix '{prefix}' in {account.rtdname}"
+                        )
+                        continue
+                    for prefix in prefixes:
+                        submit(account, client, bucket_name, prefix, None)
+        except BaseException:
+            # Listings blocked on the full queue would never finish and the pool would wait forever.
+            cancelled.set()
+            for future in listings:
+                future.cancel()
+            raise
@@ -1,12 +1,18 @@
 import boto3
 import boto3.session
+import botocore.session
+import time
 import uuid
-from typing import Iterable
+from functools import partial
+from threading import Lock
+from typing import Iterable, Dict, Tuple, Optional
 from resotolib.args import ArgumentParser
 from resotolib.baseresources import BaseRegion, BaseResource
 from resotolib.graph import Graph
+from resotolib.logging import log
 from retrying import retry
 from prometheus_client import Counter
+from botocore.config import Config
 from botocore.exceptions import ConnectionClosedError, CredentialRetrievalError
 
 
@@ -14,6 +20,157 @@ metrics_session_exceptions = Counter(
     "resoto_plugin_aws_session_exceptions_total",
     "Unhandled AWS Plugin Session Exceptions",
 )
+metrics_api_throttled = Counter(
+    "resoto_plugin_aws_api_throttled_total",
+    "AWS API calls that were answered with a throttling error",
+    ["account", "region", "service"],
+)
+
+# Error codes AWS services use to signal that a client is sending requests too fast.
+THROTTLING_ERROR_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottledException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+    "RequestThrottled",
+    "SlowDown",
+    "EC2ThrottledException",
+}
+
+
+class TokenBucket:
+    """Thread safe token bucket that adapts its refill rate to throttling responses.
+
+    Every API call consumes one token. Tokens are refilled with `rate` tokens per second
+    up to `burst` tokens. When AWS answers with a throttling error the rate is halved,
+    every successful call increases it again by a small amount up to the configured maximum.
+    """
+
+    def __init__(self, rate: float, burst: int, min_rate: float = 0.5) -> None:
+        self.max_rate = max(rate, min_rate)
+        self.min_rate = min_rate
+        self.rate = self.max_rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.last_refill = time.monotonic()
+        self.lock = Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.last_refill) * self.rate
+        )
+        self.last_refill = now
+
+    def acquire(self) -> float:
+        """Take one token out of the bucket, blocking until one is available.
+
+        Returns the number of seconds the caller had to wait.
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def throttled(self) -> None:
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            # drain the bucket so that the next calls are spaced by the reduced rate
+            self.tokens = min(self.tokens, 0)
+
+    def succeeded(self) -> None:
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class RateLimiter:
+    """Registry of token buckets, one per account, region and service.
+
+    Shared by all sessions and clients of this process, so that parallel collectors
+    talking to the same service endpoint share the same request budget.
+    """
+
+    def __init__(self) -> None:
+        self.buckets: Dict[Tuple[Optional[str], Optional[str], str], TokenBucket] = {}
+        self.lock = Lock()
+
+    def bucket(
+        self, account: Optional[str], region: Optional[str], service: str
+    ) -> TokenBucket:
+        key = (account, region, service)
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(
+                    ArgumentParser.args.aws_api_rate, ArgumentParser.args.aws_api_burst
+                )
+                self.buckets[key] = bucket
+            return bucket
+
+    def before_call(
+        self, account: Optional[str], model, context: Dict, **kwargs
+    ) -> None:
+        service = model.service_model.service_name
+        self.bucket(account, context.get("client_region"), service).acquire()
+
+    def after_call(
+        self, account: Optional[str], model, context: Dict, http_response, **kwargs
+    ) -> None:
+        if http_response is not None and http_response.status_code < 300:
+            service = model.service_model.service_name
+            self.bucket(account, context.get("client_region"), service).succeeded()
+
+    def needs_retry(
+        self,
+        account: Optional[str],
+        operation,
+        request_dict: Dict,
+        response=None,
+        **kwargs,
+    ) -> None:
+        # Only observe the response: the decision to retry is left to the botocore retry handler.
+        if response is None:
+            return None
+        error_code = response[1].get("Error", {}).get("Code")
+        if error_code in THROTTLING_ERROR_CODES:
+            service = operation.service_model.service_name
+            region = request_dict.get("context", {}).get("client_region")
+            log.debug(
+                f"AWS API throttled in account {account} region {region} service {service} - slowing down"
+            )
+            metrics_api_throttled.labels(
+                account=str(account), region=str(region), service=service
+            ).inc()
+            # slow down all following calls: the retry itself is delayed by the botocore backoff
+            self.bucket(account, region, service).throttled()
+        return None
+
+    def botocore_session(self, account: Optional[str]) -> botocore.session.Session:
+        """Botocore session that rate limits all clients and retries only the throttled call."""
+        session = botocore.session.get_session()
+        session.set_default_client_config(
+            Config(
+                retries={
+                    "max_attempts": ArgumentParser.args.aws_api_retries,
+                    "mode": "standard",
+                }
+            )
+        )
+        session.register("before-call", partial(self.before_call, account))
+        session.register("after-call", partial(self.after_call, account))
+        session.register("needs-retry", partial(self.needs_retry, account))
+        return session
+
+
+rate_limiter = RateLimiter()
 
 
 def retry_on_session_error(e):
@@ -48,11 +205,13 @@ def aws_session(aws_account=None, aws_role=None):
             aws_access_key_id=credentials["AccessKeyId"],
             aws_secret_access_key=credentials["SecretAccessKey"],
             aws_session_token=credentials["SessionToken"],
+            botocore_session=rate_limiter.botocore_session(aws_account),
         )
     else:
         return boto3.session.Session(
             aws_access_key_id=ArgumentParser.args.aws_access_key_id,
             aws_secret_access_key=ArgumentParser.args.aws_secret_access_key,
+            botocore_session=rate_limiter.botocore_session(aws_account),
         )
 
 
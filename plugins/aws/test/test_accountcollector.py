@@ -0,0 +1,36 @@
+from resotolib.args import get_arg_parser
+from resotolib.baseresources import BaseResource
+from resoto_plugin_aws import AWSPlugin
+from resoto_plugin_aws.accountcollector import AWSAccountCollector
+from resoto_plugin_aws.resources import AWSAccount, AWSRegion, AWSVPC, AWSEC2Subnet
+
+
+def test_collect_resources_with_dependencies():
+    arg_parser = get_arg_parser()
+    AWSPlugin.add_args(arg_parser)
+    arg_parser.parse_args([])
+    account = AWSAccount("123", {})
+    region = AWSRegion("us-east-1", {}, _account=account)
+    collector = AWSAccountCollector(["us-east-1"], account)
+    started = []
+
+    def collect_vpcs(r: AWSRegion, graph) -> None:
+        started.append("vpcs")
+        graph.add_resource(r, AWSVPC("vpc-1", {}, _account=account, _region=r))
+
+    def collect_subnets(r: AWSRegion, graph) -> None:
+        started.append("subnets")
+        vpc = graph.search_first("id", "vpc-1")
+        assert vpc is not None
+        subnet = AWSEC2Subnet("subnet-1", {}, _account=account, _region=r)
+        graph.add_resource(r, subnet)
+        graph.add_edge(vpc, subnet)
+
+    graph = collector.collect_resources(
+        {"subnets": collect_subnets, "vpcs": collect_vpcs}, region
+    )
+    assert started == ["vpcs", "subnets"]
+    vpc = graph.search_first("id", "vpc-1")
+    subnet = graph.search_first("id", "subnet-1")
+    assert isinstance(vpc, BaseResource) and isinstance(subnet, BaseResource)
+    assert subnet in graph.successors(vpc)
@@ -18,3 +18,7 @@ def test_args():
     assert ArgumentParser.args.aws_dont_scrape_current is False
     assert ArgumentParser.args.aws_account_pool_size == 5
     assert ArgumentParser.args.aws_region_pool_size == 20
+    assert ArgumentParser.args.aws_collector_pool_size == 5
+    assert ArgumentParser.args.aws_api_rate == 20.0
+    assert ArgumentParser.args.aws_api_burst == 50
+    assert ArgumentParser.args.aws_api_retries == 10
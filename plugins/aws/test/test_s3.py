@@ -0,0 +1,73 @@
+import threading
+import pytest
+from resoto_plugin_aws.cmd.s3_listing import collect_bucket_objects
+from resoto_plugin_aws.resources import AWSAccount
+
+
+class Paginator:
+    def __init__(self, objects, pages_per_prefix=1):
+        self.objects = objects
+        self.pages_per_prefix = pages_per_prefix
+
+    def paginate(self, Bucket, Prefix, Delimiter=None):
+        names = [name for name in self.objects[Bucket] if name.startswith(Prefix)]
+        if Delimiter:
+            prefixes = sorted(
+                {
+                    Prefix + name[len(Prefix) :].split(Delimiter, 1)[0] + Delimiter
+                    for name in names
+                    if Delimiter in name[len(Prefix) :]
+                }
+            )
+            names = [name for name in names if Delimiter not in name[len(Prefix) :]]
+            yield {"CommonPrefixes": [{"Prefix": prefix} for prefix in prefixes]}
+        for _ in range(self.pages_per_prefix):
+            yield {"Contents": [{"Key": name} for name in names]}
+
+
+class Client:
+    def __init__(self, objects, pages_per_prefix=1):
+        self.paginator = Paginator(objects, pages_per_prefix)
+
+    def get_paginator(self, name):
+        assert name == "list_objects_v2"
+        return self.paginator
+
+
+def test_collect_bucket_objects():
+    account = AWSAccount("123", {})
+    client = Client(
+        {
+            "b1": ["a", "d1/b", "d1/d2/c", "d3/d"],
+            "b2": ["e"],
+        }
+    )
+    written = []
+    main_thread = threading.current_thread()
+
+    def write(account_id, bucket_name, objects):
+        # all database writes happen on the calling thread
+        assert threading.current_thread() == main_thread
+        written.extend((account_id, bucket_name, o["Key"]) for o in objects)
+
+    buckets = [(account, client, "b1"), (account, client, "b2")]
+    collect_bucket_objects(buckets, write, pool_size=2)
+    assert sorted(written) == [
+        ("123", "b1", "a"),
+        ("123", "b1", "d1/b"),
+        ("123", "b1", "d1/d2/c"),
+        ("123", "b1", "d3/d"),
+        ("123", "b2", "e"),
+    ]
+
+
+def test_failed_write_stops_listings():
+    account = AWSAccount("123", {})
+    # many more pages than the queue can hold: the listings block on the full queue
+    client = Client({"b1": ["a"]}, pages_per_prefix=100)
+
+    def write(account_id, bucket_name, objects):
+        raise RuntimeError("database is gone")
+
+    with pytest.raises(RuntimeError):
+        collect_bucket_objects([(account, client, "b1")], write, pool_size=1)
@@ -1,5 +1,5 @@
 from resoto_plugin_aws.resources import AWSRegion
-from resoto_plugin_aws.utils import arn_partition
+from resoto_plugin_aws.utils import arn_partition, TokenBucket, RateLimiter
 
 
 def test_arn_partition():
@@ -9,3 +9,36 @@ def test_arn_partition():
     assert arn_partition(us_east_1) == "aws"
     assert arn_partition(cn_north_1) == "aws-cn"
     assert arn_partition(us_gov_east_1) == "aws-us-gov"
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=100, burst=2)
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    # bucket is empty: the next call has to wait for a refill
+    assert bucket.acquire() > 0
+    bucket.throttled()
+    assert bucket.rate == 50
+    bucket.succeeded()
+    assert bucket.rate == 55
+    for _ in range(20):
+        bucket.succeeded()
+    assert bucket.rate == 100
+
+
+def test_throttled_call_does_not_wait():
+    class ServiceModel:
+        service_name = "ec2"
+
+    class Operation:
+        service_model = ServiceModel()
+
+    limiter = RateLimiter()
+    bucket = TokenBucket(rate=100, burst=2)
+    limiter.buckets[("123", "us-east-1", "ec2")] = bucket
+    response = (None, {"Error": {"Code": "RequestLimitExceeded"}})
+    context = {"context": {"client_region": "us-east-1"}}
+    limiter.needs_retry("123", Operation(), context, response=response)
+    # the rate is reduced, but the retry does not take a token: botocore delays it already
+    assert bucket.rate == 50
+    assert bucket.tokens == 0
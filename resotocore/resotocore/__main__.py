@@ -1,6 +1,8 @@
 import logging
+import os
 import platform
 import ssl
+import tempfile
 from asyncio import Queue
 from datetime import timedelta
 from ssl import SSLContext
@@ -19,6 +21,7 @@ from resotocore.cli.command import aliases, all_commands
 from resotocore.config.config_handler_service import ConfigHandlerService
 from resotocore.db.db_access import DbAccess
 from resotocore.dependencies import db_access, setup_process, parse_args, system_info
+from resotocore.leader_election import LeaderElection
 from resotocore.message_bus import MessageBus
 from resotocore.model.model_handler import ModelHandlerDB
 from resotocore.model.typed_model import to_json, class_fqn
@@ -26,7 +29,7 @@ from resotocore.query.template_expander import DBTemplateExpander
 from resotocore.task.scheduler import Scheduler
 from resotocore.task.subscribers import SubscriptionHandler
 from resotocore.task.task_handler import TaskHandlerService
-from resotocore.util import shutdown_process, utc
+from resotocore.util import shutdown_process, utc, Periodic
 from resotocore.web import runner
 from resotocore.web.api import Api
 from resotocore.web.certificate_handler import CertificateHandler
@@ -69,7 +72,9 @@ def run(arguments: List[str]) -> None:
 
     # wait here for an initial connection to the database before we continue. blocking!
     created, system_data, sdb = DbAccess.connect(args, timedelta(seconds=60))
-    event_sender = NoEventSender() if args.analytics_opt_out else PostHogEventSender(system_data)
+    # analytics events are kept on disk, as long as they can not be delivered
+    spill_file = os.path.join(tempfile.gettempdir(), "resotocore_analytics.ndjson")
+    event_sender = NoEventSender() if args.analytics_opt_out else PostHogEventSender(system_data, spill_file=spill_file)
     db = db_access(args, sdb, event_sender)
     cert_handler = CertificateHandler.lookup(args, sdb)
     message_bus = MessageBus()
@@ -101,6 +106,22 @@ def run(arguments: List[str]) -> None:
         db.running_task_db, db.job_db, message_bus, event_sender, subscriptions, scheduler, cli, args
     )
     cli_deps.extend(task_handler=task_handler)
+
+    async def on_elected() -> None:
+        await subscriptions.start()
+        await task_handler.start()
+
+    async def on_demoted() -> None:
+        await task_handler.stop()
+        await subscriptions.stop()
+
+    scheme = "https" if args.tls_cert else "http"
+    host = args.host[0] if isinstance(args.host, list) else args.host
+    url = args.advertise_url or f"{scheme}://{host}:{args.port}"
+    # only the leader runs workflows and jobs, all other processes serve read requests
+    leader_election = LeaderElection(db.lease_db, url, on_elected, on_demoted) if args.leader_election else None
+    # the model can be changed by any process: reload it periodically
+    model_reload = Periodic("model_reload", model.invalidate, timedelta(seconds=60))
     api = Api(
         db,
         model,
@@ -114,6 +135,7 @@ def run(arguments: List[str]) -> None:
         cli,
         template_expander,
         args,
+        leader_election,
     )
     event_emitter = emit_recurrent_events(
         event_sender, model, subscriptions, worker_task_queue, message_bus, timedelta(hours=1), timedelta(hours=1)
@@ -124,12 +146,15 @@ def run(arguments: List[str]) -> None:
         cli_deps.extend(forked_tasks=Queue())
         await db.start()
         await event_sender.start()
-        await subscriptions.start()
         await scheduler.start()
         await worker_task_queue.start()
         await event_emitter.start()
         await cli.start()
-        await task_handler.start()
+        if leader_election:
+            await model_reload.start()
+            await leader_election.start()
+        else:
+            await on_elected()
         await api.start()
         if created:
             await event_sender.core_event(CoreEvent.SystemInstalled)
@@ -150,13 +175,16 @@ def run(arguments: List[str]) -> None:
     async def on_stop() -> None:
         duration = utc() - info.started_at
         await api.stop()
-        await task_handler.stop()
+        if leader_election:
+            await leader_election.stop()
+            await model_reload.stop()
+        else:
+            await on_demoted()
         await cli.stop()
         await event_sender.core_event(CoreEvent.SystemStopped, total_seconds=int(duration.total_seconds()))
         await event_emitter.stop()
         await worker_task_queue.stop()
         await scheduler.stop()
-        await subscriptions.stop()
         await db.stop()
         await event_sender.stop()
 
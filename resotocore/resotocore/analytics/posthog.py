@@ -1,16 +1,23 @@
 from __future__ import annotations
 import asyncio
+import json
 import logging
+import os
+import random
 from collections import deque
+from dataclasses import replace
 from datetime import timedelta, datetime
-from typing import Any, MutableSequence, Optional
+from itertools import chain
+from typing import Any, Optional, Deque, Dict, Tuple, Union, List, Set
 
 from aiohttp import ClientSession
 from posthog import Client
 
-from resotocore.analytics import AnalyticsEventSender, AnalyticsEvent
+from resotocore.analytics import AnalyticsEventSender, AnalyticsEvent, CoreEvent
+from resotocore.async_extensions import run_async
 from resotocore.db import SystemData
-from resotocore.util import uuid_str, Periodic, utc
+from resotocore.types import Json
+from resotocore.util import uuid_str, Periodic, utc, utc_str, from_utc
 
 log = logging.getLogger(__name__)
 
@@ -18,8 +25,24 @@ log = logging.getLogger(__name__)
 class PostHogEventSender(AnalyticsEventSender):
     """
     This analytics event sender uses PostHog (https://posthog.com) to capture all analytics events.
+    Events are held in a bounded ring buffer and sent to PostHog periodically.
+    Events of frequent kinds are aggregated: per flush interval one event is sent for all events
+    of the same kind and context, with summed counters.
+    Events that could not be sent are spilled to disk up to a maximum size.
+    Spilled events are sent again, once sending events succeeds again.
     """
 
+    # events of these kinds are emitted with high frequency and are aggregated per flush interval
+    aggregated_kinds = {
+        CoreEvent.CLICommand,
+        CoreEvent.Query,
+        CoreEvent.NodeCreated,
+        CoreEvent.NodeUpdated,
+        CoreEvent.NodeDeleted,
+        CoreEvent.NodesDesiredUpdated,
+        CoreEvent.NodesMetadataUpdated,
+    }
+
     def __init__(
         self,
         system_data: SystemData,
@@ -28,6 +51,10 @@ class PostHogEventSender(AnalyticsEventSender):
         host: str = "https://analytics.some.engineering",
         client_flush_interval: float = 0.5,
         client_retries: int = 3,
+        max_queued: int = 50000,
+        sample_rate: float = 1.0,
+        spill_file: Optional[str] = None,
+        max_spill_bytes: int = 10 * 1024 * 1024,
     ):
         """
         Create a new PostHog sender.
@@ -37,6 +64,10 @@ class PostHogEventSender(AnalyticsEventSender):
         :param host: Only here for testing purposes.
         :param client_flush_interval: only here for testing purposes.
         :param client_retries: only here for testing purposes.
+        :param max_queued: maximum number of queued events. The oldest events are dropped when the limit is reached.
+        :param sample_rate: fraction of events to send. Aggregated and system events are always sent.
+        :param spill_file: events that could not be sent are written to this file.
+        :param max_spill_bytes: maximum size of the spill file. Events are dropped when the limit is reached.
         """
         # Note: the client also has the ability to queue events with a flush interval.
         # Sadly: in order to shutdown one has to wait the full interval in worst case!
@@ -44,16 +75,32 @@ class PostHogEventSender(AnalyticsEventSender):
         # In case of shutdown all events are flushed directly and the system is stopped.
         # Note 2: the public api-key is fetched on demand
         self.client = Client(
-            api_key="n/a", host=host, flush_interval=client_flush_interval, max_retries=client_retries, gzip=True
+            api_key="n/a",
+            host=host,
+            flush_interval=client_flush_interval,
+            max_retries=client_retries,
+            gzip=True,
+            on_error=self.send_failed,
         )
         self.run_id = uuid_str()  # create a unique id for this instance run
         self.system_data = system_data
-        self.queue: MutableSequence[AnalyticsEvent] = deque()
+        self.queue: Deque[AnalyticsEvent] = deque(maxlen=max_queued)
+        # (kind, context) -> first event, number of events, summed counters
+        self.aggregated: Dict[Tuple[str, str], Tuple[AnalyticsEvent, int, Dict[str, Union[int, float]]]] = {}
+        self.max_queued = max_queued
+        self.sample_rate = sample_rate
+        self.spill_file = spill_file
+        self.max_spill_bytes = max_spill_bytes
+        self.dropped = 0
         self.flush_at = flush_at
         self.flusher = Periodic("flush_analytics", self.flush, interval)
         self.lock = asyncio.Lock()
         self.last_fetched: Optional[datetime] = None
         self.session: Optional[ClientSession] = None
+        # false, if events could not be sent with the last flush
+        self.online = True
+        # message ids of all events, that could not be sent
+        self.failed: Set[str] = set()
 
     async def capture(self, event: AnalyticsEvent) -> None:
         """
@@ -61,10 +108,24 @@ class PostHogEventSender(AnalyticsEventSender):
         The queue is flushed by a scheduled function.
         Only in the rare case when the queue size reached its maximum the queue will be flushed directly.
         """
-        async with self.lock:
+        if event.kind in self.aggregated_kinds:
+            key = (event.kind, json.dumps(event.context, sort_keys=True, default=str))
+            existing = self.aggregated.get(key)
+            if existing:
+                first, count, counters = existing
+                for name, value in event.counters.items():
+                    counters[name] = counters.get(name, 0) + value
+                self.aggregated[key] = (first, count + 1, counters)
+            elif len(self.aggregated) < self.max_queued:
+                self.aggregated[key] = (event, 1, dict(event.counters))
+            else:
+                self.dropped += 1
+        elif event.kind.startswith("system.") or self.sample_rate >= 1 or random.random() < self.sample_rate:
+            if len(self.queue) == self.max_queued:
+                self.dropped += 1
             self.queue.append(event)
 
-        if len(self.queue) >= self.flush_at:
+        if len(self.queue) + len(self.aggregated) >= self.flush_at:
             await self.flush()
 
     async def refresh_public_api_key(self) -> None:
@@ -97,14 +158,104 @@ class PostHogEventSender(AnalyticsEventSender):
 
         # acquire the lock, send all events to the client and clear the queue
         async with self.lock:
-            for event in self.queue:
-                self.client.capture(
-                    distinct_id=self.system_data.system_id,
-                    event=event.kind,
-                    properties={**event.context, **event.counters, "run_id": self.run_id},  # type: ignore
-                    timestamp=event.at,
-                )
+            events = list(self.queue)
+            for event, count, counters in self.aggregated.values():
+                events.append(replace(event, counters={**counters, "aggregated_events": count}))
             self.queue.clear()
+            self.aggregated = {}
+            if self.dropped:
+                log.debug(f"Analytics queue full: {self.dropped} events have been dropped.")
+                self.dropped = 0
+            # sending and spilling does not need to happen on the event loop
+            await run_async(self.send, events)
+
+    def send(self, events: List[AnalyticsEvent]) -> None:
+        # spilled events are only sent again, if the last flush could send its events
+        spilled, claimed = self.claim_spilled() if self.online else ([], None)
+        by_id: Dict[str, AnalyticsEvent] = {}
+        self.failed.clear()
+        for event in chain(spilled, events):
+            properties = {**event.context, **event.counters, "run_id": self.run_id}
+            if (
+                self.sample_rate < 1
+                and event.kind not in self.aggregated_kinds
+                and not event.kind.startswith("system.")
+            ):
+                properties["sample_rate"] = self.sample_rate
+            message_id = uuid_str()
+            by_id[message_id] = event
+            self.client.capture(
+                distinct_id=self.system_data.system_id,
+                event=event.kind,
+                properties=properties,
+                timestamp=event.at,
+                message_id=message_id,
+            )
+        # wait until all events have been sent or have failed
+        self.client.flush()
+        failed = [event for message_id, event in by_id.items() if message_id in self.failed]
+        if by_id:
+            self.online = not failed
+        # events are removed from the spill file only after they have been sent
+        self.spill(failed)
+        if claimed:
+            try:
+                os.remove(claimed)
+            except Exception as ex:
+                log.debug(f"Could not remove spilled analytics events: {ex}")
+
+    def send_failed(self, error: Exception, batch: List[Json]) -> None:
+        # called by the client for every batch of messages, that could not be sent
+        log.debug(f"Could not send {len(batch)} analytics events: {error}")
+        self.failed.update(msg["messageId"] for msg in batch if "messageId" in msg)
+
+    def spill(self, events: List[AnalyticsEvent]) -> None:
+        if self.spill_file is None or not events:
+            return
+        try:
+            size = os.path.getsize(self.spill_file) if os.path.exists(self.spill_file) else 0
+            with open(self.spill_file, "a", encoding="utf-8") as file:
+                for event in events:
+                    line = json.dumps(self.event_to_json(event), default=str) + "\n"
+                    size += len(line)
+                    if size > self.max_spill_bytes:
+                        log.debug("Analytics spill file is full: drop events.")
+                        break
+                    file.write(line)
+        except Exception as ex:
+            log.debug(f"Could not spill analytics events: {ex}")
+
+    def claim_spilled(self) -> Tuple[List[AnalyticsEvent], Optional[str]]:
+        """
+        Read all spilled events.
+        :return: the spilled events and the claimed file, that has to be removed once the events have been sent.
+        """
+        if self.spill_file is None or not os.path.exists(self.spill_file):
+            return [], None
+        try:
+            # claim the file first: other processes might use the same spill file
+            claimed = f"{self.spill_file}.{self.run_id}"
+            os.replace(self.spill_file, claimed)
+            with open(claimed, encoding="utf-8") as file:
+                events = [self.event_from_json(json.loads(line)) for line in file if line.strip()]
+            return events, claimed
+        except Exception as ex:
+            log.debug(f"Could not read spilled analytics events: {ex}")
+            return [], None
+
+    @staticmethod
+    def event_to_json(event: AnalyticsEvent) -> Json:
+        return {
+            "system": event.system,
+            "kind": event.kind,
+            "context": event.context,
+            "counters": event.counters,
+            "at": utc_str(event.at),
+        }
+
+    @staticmethod
+    def event_from_json(js: Json) -> AnalyticsEvent:
+        return AnalyticsEvent(js["system"], js["kind"], js["context"], js["counters"], from_utc(js["at"]))
 
     async def __aenter__(self) -> PostHogEventSender:
         return await self.start()
@@ -1,10 +1,13 @@
 import asyncio
+import os
 from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from typing import Any, Optional
 
 # Global bounded thread pool to bridge sync io with asyncio.
 GlobalAsyncPool: Optional[ThreadPoolExecutor] = None
+# Global thread pool to move cpu intensive work out of the event loop.
+GlobalTransformPool: Optional[ThreadPoolExecutor] = None
 
 
 async def run_async(sync_func, *args: Any, **kwargs: Any) -> Any:  # type: ignore
@@ -15,3 +18,12 @@ async def run_async(sync_func, *args: Any, **kwargs: Any) -> Any:  # type: ignor
     # run in executor does not allow passing kwargs. apply them partially here if defined
     fn_with_args = sync_func if not kwargs else partial(sync_func, **kwargs)
     return await asyncio.get_event_loop().run_in_executor(GlobalAsyncPool, fn_with_args, *args)
+
+
+async def run_transform(sync_func, *args: Any) -> Any:  # type: ignore
+    global GlobalTransformPool  # pylint: disable=global-statement
+    if GlobalTransformPool is None:
+        # cpu bound work: more threads than cores do not help
+        pool_size = os.cpu_count() or 4
+        GlobalTransformPool = ThreadPoolExecutor(pool_size, "transform")  # pylint: disable=consider-using-with
+    return await asyncio.get_event_loop().run_in_executor(GlobalTransformPool, sync_func, *args)
@@ -1,9 +1,11 @@
 from argparse import ArgumentParser
-from typing import TypeVar, Union, Any, Callable, AsyncIterator, NoReturn, Optional, Awaitable
+from typing import TypeVar, Union, Any, Callable, AsyncIterator, NoReturn, Optional, Awaitable, List
 
+from aiostream import stream
 from aiostream.core import Stream
 from parsy import Parser, regex
 
+from resotocore.async_extensions import run_transform
 from resotocore.model.graph_access import Section
 from resotocore.parse_util import (
     make_parser,
@@ -80,6 +82,33 @@ def is_edge(a: Any) -> bool:
     return "from" in a and "to" in a if isinstance(a, dict) else False
 
 
+def offload_map(in_stream: JsGen, fn: Callable[[Any], Any], chunk_size: int, parallelism: int) -> JsGen:
+    """
+    Apply fn to all elements of the stream outside the event loop.
+    Elements are transformed in chunks of chunk_size on the transform thread pool.
+    At most parallelism chunks are in flight, so the source is only consumed as fast as the result.
+    The order of elements is maintained.
+    A chunk size of 0 applies fn inline on the event loop.
+    """
+    if chunk_size <= 0:
+        return stream.map(in_stream, fn)
+
+    def transform(chunk: List[Any]) -> List[Any]:
+        return [fn(elem) for elem in chunk]
+
+    async def transform_chunk(chunk: List[Any]) -> List[Any]:
+        return await run_transform(transform, chunk)  # type: ignore
+
+    async def flatten() -> AsyncIterator[Any]:
+        chunks = stream.chunks(in_stream, chunk_size)
+        async with stream.map(chunks, transform_chunk, ordered=True, task_limit=parallelism).stream() as streamer:
+            async for chunk in streamer:
+                for elem in chunk:
+                    yield elem
+
+    return flatten()
+
+
 class NoExitArgumentParser(ArgumentParser):
     def error(self, message: str) -> NoReturn:
         raise AttributeError(f"Could not parse arguments: {message}")
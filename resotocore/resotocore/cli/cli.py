@@ -71,7 +71,7 @@ from resotocore.query.model import (
     Sort,
 )
 from resotocore.query.query_parser import aggregate_parameter_parser
-from resotocore.util import utc_str, utc, from_utc
+from resotocore.util import utc_str, utc, from_utc, gather_limited
 
 log = logging.getLogger(__name__)
 
@@ -301,8 +301,8 @@ class CLI:
                 assert query.aggregate is None, "Can not combine aggregate and count!"
                 group_by = [AggregateVariable(AggregateVariableName(arg), "name")] if arg else []
                 aggregate = Aggregate(group_by, [AggregateFunction("sum", 1, [], "count")])
-                # If the query should be explained, we want the output as is
-                if "explain" not in parsed_options:
+                # If the query should be explained or profiled, we want the output as is
+                if "explain" not in parsed_options and "profile" not in parsed_options:
                     additional_commands.append(self.command("aggregate_to_count", None, ctx))
                 query = replace(query, aggregate=aggregate)
                 query = query.add_sort(f"{PathRoot}count")
@@ -354,7 +354,13 @@ class CLI:
         final_query = with_sort.on_section(ctx.env.get("section", PathRoot))
         options = ExecuteSearchCommand.argument_string(parsed_options)
         query_string = str(final_query)
-        execute_search = self.command("execute_search", options + query_string, ctx)
+        # the query has been parsed already: hand it over directly instead of parsing the rendered string again
+        search_command: ExecuteSearchCommand = self.commands["execute_search"]  # type: ignore
+        try:
+            source = search_command.search(final_query, parsed_options, ctx)
+        except Exception as ex:
+            raise CLIParseError(f"execute_search can not parse arg {query_string}. Reason: {ex}") from ex
+        execute_search = ExecutableCommand("execute_search", search_command, options + query_string, source)
         return final_query, parsed_options, [execute_search, *additional_commands]
 
     async def evaluate_cli_command(
@@ -400,14 +406,28 @@ class CLI:
 
         replaced = self.replace_placeholder(cli_input, **context.env)
         command_lines: List[ParsedCommands] = multi_command_parser.parse(replaced)
-        keep_raw = not replace_place_holder or JobsCommand.is_jobs_update(command_lines[0].commands[0])
+        keep_raw = not replace_place_holder or any(JobsCommand.is_jobs_update(c) for c in command_lines[0].commands)
         command_lines = multi_command_parser.parse(cli_input) if keep_raw else command_lines
-        res = [await parse_line(cmd_line) for cmd_line in command_lines]
+        # command lines are parsed independently of each other
+        res = await gather_limited([parse_line(cmd_line) for cmd_line in command_lines], self.line_parallelism)
         await send_analytics(res)
         return res
 
     async def execute_cli_command(self, cli_input: str, sink: Sink[T], ctx: CLIContext = EmptyContext) -> List[Any]:
-        return [await parsed.to_sink(sink) for parsed in await self.evaluate_cli_command(cli_input, ctx, True)]
+        parsed = await self.evaluate_cli_command(cli_input, ctx, True)
+        if all(line.side_effect_free for line in parsed):
+            # no line can influence the result of another line: execute them concurrently
+            return await gather_limited([line.to_sink(sink) for line in parsed], self.line_parallelism)
+        else:
+            return [await line.to_sink(sink) for line in parsed]
+
+    @property
+    def line_parallelism(self) -> int:
+        """
+        Maximum number of command lines of one request that are handled concurrently.
+        """
+        args = self.dependencies.lookup.get("args")
+        return int(getattr(args, "cli_line_parallelism", 1))
 
     @staticmethod
     def replacements(**env: str) -> Dict[str, str]:
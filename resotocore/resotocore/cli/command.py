@@ -10,16 +10,18 @@ import re
 import shutil
 import tarfile
 import tempfile
+import threading
 from abc import abstractmethod, ABC
 from asyncio import Future, Task
 from asyncio.subprocess import Process
 from collections import defaultdict
-from contextlib import suppress
+from contextlib import suppress, asynccontextmanager, AsyncExitStack
 from dataclasses import dataclass
 from datetime import timedelta
 from functools import partial
 from itertools import dropwhile
-from typing import Dict, List, Tuple, Optional, Any, AsyncIterator, Hashable, Iterable, Callable, Awaitable, cast, Set
+from time import perf_counter
+from typing import Dict, List, Tuple, Optional, Any, AsyncIterator, Iterable, Callable, Awaitable, cast, Set, Union
 from urllib.parse import urlparse, urlunparse
 
 import aiofiles
@@ -57,8 +59,12 @@ from resotocore.cli.model import (
     CLIDependencies,
     ParsedCommand,
     NoTerminalOutput,
+    NoSideEffect,
 )
 from resotocore.config import ConfigEntity
+from resotocore.db import SearchProfile
+from resotocore.db.async_arangodb import AsyncCursorContext
+from resotocore.db.graphdb import GraphDB
 from resotocore.db.model import QueryModel
 from resotocore.dependencies import system_info
 from resotocore.error import CLIParseError, ClientError, CLIExecutionError
@@ -84,15 +90,20 @@ from resotocore.task.task_description import Job, TimeTrigger, EventTrigger, Exe
 from resotocore.types import Json, JsonElement
 from resotocore.util import (
     uuid_str,
+    time_or_duration_ago,
     value_in_path_get,
     value_in_path,
     utc,
+    utc_str,
     shutdown_process,
     if_set,
     duration,
     identity,
     rnd_str,
     set_value_in_path,
+    json_digest,
+    DigestSet,
+    BloomFilter,
 )
 from resotocore.web.content_renderer import (
     respond_ndjson,
@@ -112,7 +123,7 @@ log = logging.getLogger(__name__)
 # Such a part is not executed, but builds a search, which is executed.
 # Therefore, the parse method is implemented in a dummy fashion here.
 # The real interpretation happens in CLI.create_query.
-class SearchCLIPart(CLICommand, ABC):
+class SearchCLIPart(CLICommand, NoSideEffect, ABC):
     def parse(self, arg: Optional[str] = None, ctx: CLIContext = EmptyContext, **kwargs: Any) -> CLIAction:
         return CLISource.empty()
 
@@ -121,7 +132,7 @@ class SearchPart(SearchCLIPart):
     """
 
     ```shell
-    search [--with-edges] [--explain] <search-statement>
+    search [--with-edges] [--explain] [--profile] [--at <time>] <search-statement>
     ```
 
     This command allows to search the graph using filters, traversals, functions and aggregates.
@@ -130,6 +141,12 @@ class SearchPart(SearchCLIPart):
 
     - `--with-edges`: Return edges in addition to nodes.
     - `--explain`: Instead of executing the search, analyze its cost.
+    - `--profile`: Execute the search, discard the result and show where the time has been spent.
+    - `--at` <time>: Search the state of the graph at this point in time: a timestamp (e.g. 2022-09-01T10:00:00Z)
+       or a duration before now (e.g. 7d). Requires resotocore to be started with `--graph-history`.
+       The state is reconstructed from the recorded history of the graph, which takes some time for big graphs.
+       Changes older than `--graph-history-compact-after` are combined per day:
+       for such a point in time, the state at the end of the day (UTC) is searched.
 
     ## Parameters
 
@@ -254,6 +271,23 @@ class SearchPart(SearchCLIPart):
        Complex: The estimated cost is quite high. Check other properties. Maybe an index can be used?
        Bad: The estimated cost is very high. It will most probably run long and/or will take a lot of resources.
 
+    Use --profile to understand where the time of a search is spent.
+    The search is executed with profiling enabled in the database, the result is consumed and discarded.
+    All durations are reported in seconds.
+
+    - `compile`: time to compile the search into a database query.
+    - `fetch`: time spent waiting for the database: execution and fetching all results including the network.
+    - `transform`: time spent to transform the database documents into the resulting json.
+    - `serialize`: time spent to serialize the resulting json.
+    - `total`: overall time of the search.
+    - `db_execution`: execution time as reported by the database. See `db_phases` for the different phases.
+    - `items`: number of returned items.
+    - `scanned_full`, `scanned_index`: number of documents scanned via full collection scan or via index.
+    - `filtered`: number of documents filtered out.
+    - `peak_memory_usage`: maximum memory in bytes used by the database to execute this search.
+    - `nodes`: every node of the execution plan with the used collection and indexes,
+       number of calls, number of items and the accumulated runtime.
+
 
     ## Examples
 
@@ -297,6 +331,38 @@ class SearchPart(SearchCLIPart):
     estimated_nr_items: 8
     full_collection_scan: false
     rating: simple
+
+    # Execute the search and show where the time has been spent.
+    > search --profile is(volume) and volume_status=available
+    compile: 0.0004
+    db_execution: 0.0179
+    db_phases:
+      parsing: 0.0001
+      optimizing plan: 0.0008
+      executing: 0.0166
+    fetch: 0.0213
+    filtered: 1636
+    items: 163
+    nodes:
+    - calls: 2
+      collection: resoto
+      id: 6
+      indexes:
+      - kinds_id_name_ctime
+      items: 1799
+      runtime: 0.0121
+      type: IndexNode
+    peak_memory_usage: 294912
+    scanned_full: 0
+    scanned_index: 1799
+    serialize: 0.0012
+    total: 0.0265
+    transform: 0.0021
+
+    # Search the state of the graph one week ago
+    > search --at 7d is(volume) and volume_status=available | count
+    total matched: 12
+    total unmatched: 0
     ```
 
     ## Environment Variables
@@ -770,7 +836,7 @@ class CountCommand(SearchCLIPart):
         return CLIFlow(count_in_stream)
 
 
-class EchoCommand(CLICommand):
+class EchoCommand(CLICommand, NoSideEffect):
     """
     ```shell
     echo <message>
@@ -804,7 +870,7 @@ class EchoCommand(CLICommand):
         return CLISource.single(lambda: stream.just(strip_quotes(arg if arg else "")))
 
 
-class JsonCommand(CLICommand):
+class JsonCommand(CLICommand, NoSideEffect):
     """
     ```shell
     json <json-string>
@@ -904,7 +970,7 @@ class SleepCommand(CLICommand):
             raise AttributeError("Sleep needs the time in seconds as arg.") from ex
 
 
-class AggregateToCountCommand(CLICommand, InternalPart):
+class AggregateToCountCommand(CLICommand, InternalPart, NoSideEffect):
     """
     ```shell
     aggregate_to_count
@@ -952,10 +1018,10 @@ class AggregateToCountCommand(CLICommand, InternalPart):
         return CLIFlow(to_count)
 
 
-class ExecuteSearchCommand(CLICommand, InternalPart):
+class ExecuteSearchCommand(CLICommand, InternalPart, NoSideEffect):
     """
     ```shell
-    execute_search [--with-edges] [--explain] <search-statement>
+    execute_search [--with-edges] [--explain] [--profile] [--at <time>] <search-statement>
     ```
 
     This command is usually not invoked directly - use `search` instead.
@@ -964,6 +1030,8 @@ class ExecuteSearchCommand(CLICommand, InternalPart):
 
     - `--with-edges`: Return edges in addition to nodes.
     - `--explain`: Instead of executing the search, analyze its cost.
+    - `--profile`: Execute the search, discard the result and return the profile of the execution.
+    - `--at` <time>: Search the state of the graph at this point in time.
 
     ## Parameters
 
@@ -985,7 +1053,9 @@ class ExecuteSearchCommand(CLICommand, InternalPart):
         parser = NoExitArgumentParser()
         parser.add_argument("--with-edges", dest="with-edges", default=None, action="store_true")
         parser.add_argument("--explain", dest="explain", default=None, action="store_true")
-        parsed, rest = parser.parse_known_args(arg.split(maxsplit=2))
+        parser.add_argument("--profile", dest="profile", default=None, action="store_true")
+        parser.add_argument("--at", dest="at", default=None)
+        parsed, rest = parser.parse_known_args(arg.split(maxsplit=5))
         return {k: v for k, v in vars(parsed).items() if v is not None}, " ".join(rest)
 
     @staticmethod
@@ -994,40 +1064,55 @@ class ExecuteSearchCommand(CLICommand, InternalPart):
         for key, value in args.items():
             if value is True:
                 result.append(f"--{key}")
+            elif isinstance(value, str):
+                result.append(f"--{key} {value}")
         return " ".join(result) + " " if result else ""
 
     def parse(self, arg: Optional[str] = None, ctx: CLIContext = EmptyContext, **kwargs: Any) -> CLISource:
-        # db name is coming from the env
-        graph_name = ctx.env["graph"]
         if not arg:
             raise CLIParseError("search command needs a search-statement to execute, but nothing was given!")
 
         # Read all argument flags / options
         parsed, rest = self.parse_known(arg)
-        with_edges: bool = parsed.get("with-edges", False)
-        explain: bool = parsed.get("explain", False)
-
         # all templates are expanded at this point, so we can call the parser directly.
         query = parse_query(rest, **ctx.env)
-        db = self.dependencies.db_access.get_graph_db(graph_name)
+        return self.search(query, parsed, ctx)
 
-        async def load_query_model() -> QueryModel:
+    def search(self, query: Query, options: Dict[str, Any], ctx: CLIContext = EmptyContext) -> CLISource:
+        """
+        Create the source for an already parsed search.
+        The CLI uses this method directly for combined search parts, so the query is not rendered and parsed again.
+        """
+        # db name is coming from the env
+        graph_name = ctx.env["graph"]
+        with_edges: bool = options.get("with-edges", False)
+        explain: bool = options.get("explain", False)
+        profile: bool = options.get("profile", False)
+        at = if_set(options.get("at"), time_or_duration_ago)
+        db_access = self.dependencies.db_access
+        graph_db = db_access.get_graph_db(graph_name)
+
+        @asynccontextmanager
+        async def use_db() -> AsyncIterator[GraphDB]:
+            # the state at a point in time is reconstructed lazily, when the search is executed
+            if at:
+                async with db_access.use_graph_at(graph_name, at) as db:
+                    yield db
+            else:
+                yield graph_db
+
+        async def load_query_model(search_profile: Optional[SearchProfile] = None) -> QueryModel:
             model = await self.dependencies.model_handler.load_model()
-            query_model = QueryModel(query, model)
-            await db.to_query(query_model)  # only here to validate the query itself (can throw)
+            query_model = QueryModel(query, model, search_profile)
+            # validate the query (can throw): the compiled query is kept in the query model and used for execution
+            await graph_db.to_query(query_model, with_edges)
             return query_model
 
-        async def explain_search() -> AsyncIterator[Json]:
-            query_model = await load_query_model()
-            explanation = await db.explain(query_model, with_edges)
-            yield to_js(explanation)
-
-        async def prepare() -> Tuple[Optional[int], AsyncIterator[Json]]:
-            query_model = await load_query_model()
+        async def execute(db: GraphDB, query_model: QueryModel) -> AsyncCursorContext:
             count = ctx.env.get("count", "true").lower() != "false"
             timeout = if_set(ctx.env.get("search_timeout"), duration)
-            context = (
-                await db.search_aggregation(query_model)
+            return (
+                await db.search_aggregation(query_model, timeout=timeout)
                 if query.aggregate
                 else (
                     await db.search_graph_gen(query_model, with_count=count, timeout=timeout)
@@ -1035,6 +1120,36 @@ class ExecuteSearchCommand(CLICommand, InternalPart):
                     else await db.search_list(query_model, with_count=count, timeout=timeout)
                 )
             )
+
+        async def explain_search() -> AsyncIterator[Json]:
+            query_model = await load_query_model()
+            async with use_db() as db:
+                explanation = await db.explain(query_model, with_edges)
+            yield to_js(explanation)
+
+        async def profile_search() -> AsyncIterator[Json]:
+            start = perf_counter()
+            search_profile = SearchProfile()
+            query_model = await load_query_model(search_profile)
+            async with use_db() as db:
+                async with await execute(db, query_model) as cursor:
+                    async for elem in cursor:
+                        serialize_start = perf_counter()
+                        json.dumps(elem)
+                        search_profile.serialize += perf_counter() - serialize_start
+            search_profile.total = perf_counter() - start
+            yield to_js(search_profile)
+
+        async def prepare() -> Tuple[Optional[int], AsyncIterator[Json]]:
+            query_model = await load_query_model()
+            # the database is used until the cursor is closed
+            db_usage = AsyncExitStack()
+            try:
+                db = await db_usage.enter_async_context(use_db())
+                context = await execute(db, query_model)
+            except BaseException:
+                await db_usage.aclose()
+                raise
             cursor = context.cursor
 
             # since we can not use context boundaries here,
@@ -1045,13 +1160,19 @@ class ExecuteSearchCommand(CLICommand, InternalPart):
                         yield e
                 finally:
                     cursor.close()
+                    await db_usage.aclose()
 
             return cursor.count(), iterate_and_close()
 
-        return CLISource.single(explain_search) if explain else CLISource(prepare)
+        if explain:
+            return CLISource.single(explain_search)
+        elif profile:
+            return CLISource.single(profile_search)
+        else:
+            return CLISource(prepare)
 
 
-class EnvCommand(CLICommand):
+class EnvCommand(CLICommand, NoSideEffect):
     """
     ```shell
     env
@@ -1088,7 +1209,7 @@ class EnvCommand(CLICommand):
         return CLISource.with_count(lambda: stream.just(ctx.env), len(ctx.env))
 
 
-class ChunkCommand(CLICommand):
+class ChunkCommand(CLICommand, NoSideEffect):
     """
     ```shell
     chunk [num]
@@ -1134,7 +1255,7 @@ class ChunkCommand(CLICommand):
         return CLIFlow(lambda in_stream: stream.chunks(in_stream, size))
 
 
-class FlattenCommand(CLICommand):
+class FlattenCommand(CLICommand, NoSideEffect):
     """
     ```shell
     flatten
@@ -1181,16 +1302,25 @@ class FlattenCommand(CLICommand):
         return CLIFlow(lambda in_stream: stream.flatmap(in_stream, iterate))
 
 
-class UniqCommand(CLICommand):
+class UniqCommand(CLICommand, NoSideEffect):
     """
     ```shell
-    uniq
+    uniq [--approximate [expected_count]]
     ```
 
     All elements flowing through the uniq command are analyzed and all duplicates get removed.
     Note: a hash value is computed from json objects, which is ignorant of the order of properties,
     so that `{"a": 1, "b": 2}` is declared equal to `{"b": 2, "a": 1}`
 
+    Only a fixed size hash of every element is kept.
+    If the number of hashes gets too big, they are stored on disk.
+
+    ## Options
+
+    - `--approximate` [optional]: Use a bloom filter with a fixed memory size instead of remembering every hash.
+      A unique element is removed with a probability of 0.1%, if there are not more than
+      `expected_count` (default: 1000000) unique elements.
+
     ## Examples
 
     ```shell
@@ -1207,6 +1337,9 @@ class UniqCommand(CLICommand):
     ```
     """
 
+    # number of hashes held in memory, before they are spilled to disk
+    max_in_memory = 250000
+
     @property
     def name(self) -> str:
         return "uniq"
@@ -1215,27 +1348,32 @@ class UniqCommand(CLICommand):
         return "Remove all duplicated objects from the stream."
 
     def parse(self, arg: Optional[str] = None, ctx: CLIContext = EmptyContext, **kwargs: Any) -> CLIFlow:
-        visited = set()
-
-        def hashed(item: Any) -> Hashable:
-            if isinstance(item, dict):
-                return json.dumps(item, sort_keys=True)
-            else:
-                raise CLIParseError(f"{self.name} can not make {item}:{type(item)} uniq")
+        parser = NoExitArgumentParser()
+        parser.add_argument("--approximate", type=int, nargs="?", const=1000000, default=None)
+        parsed = parser.parse_args(arg.split() if arg else [])
 
-        def has_not_seen(item: Any) -> bool:
-            item = item if isinstance(item, Hashable) else hashed(item)
+        def hashed(item: Any) -> bytes:
+            try:
+                return json_digest(item)
+            except Exception as ex:
+                raise CLIParseError(f"{self.name} can not make {item}:{type(item)} uniq") from ex
 
-            if item in visited:
-                return False
-            else:
-                visited.add(item)
-                return True
+        async def uniq(in_stream: Stream) -> AsyncIterator[JsonElement]:
+            visited: Union[DigestSet, BloomFilter] = (
+                BloomFilter(parsed.approximate) if parsed.approximate else DigestSet(self.max_in_memory)
+            )
+            try:
+                async with in_stream.stream() as streamer:
+                    async for item in streamer:
+                        if visited.add(hashed(item)):
+                            yield item
+            finally:
+                visited.close()
 
-        return CLIFlow(lambda in_stream: stream.filter(in_stream, has_not_seen))
+        return CLIFlow(uniq)
 
 
-class JqCommand(CLICommand, OutputTransformer):
+class JqCommand(CLICommand, OutputTransformer, NoSideEffect):
     """
     ```
     jq <filter>
@@ -1303,17 +1441,23 @@ class JqCommand(CLICommand, OutputTransformer):
         if not arg:
             raise AttributeError("jq requires an argument to be parsed")
 
-        compiled = jq.compile(self.rewrite_props(strip_quotes(arg), ctx))
+        program = self.rewrite_props(strip_quotes(arg), ctx)
+        # compile here to report errors while parsing
+        jq.compile(program)
+        # elements are processed in the transform thread pool: every thread uses its own compiled program
+        local = threading.local()
 
         def process(in_json: Json) -> Json:
-            out = compiled.input(in_json).all()
+            if not hasattr(local, "compiled"):
+                local.compiled = jq.compile(program)
+            out = local.compiled.input(in_json).all()
             result = out[0] if len(out) == 1 else out
             return cast(Json, result)
 
-        return CLIFlow(lambda in_stream: stream.map(in_stream, process))
+        return CLIFlow(lambda in_stream: self.map_offloaded(in_stream, process))
 
 
-class KindsCommand(CLICommand, PreserveOutputFormat):
+class KindsCommand(CLICommand, PreserveOutputFormat, NoSideEffect):
     """
     ```shell
     kinds [-p property_path] [name]
@@ -1427,6 +1571,246 @@ class KindsCommand(CLICommand, PreserveOutputFormat):
         return CLISource(source)
 
 
+class HistoryCommand(CLICommand, PreserveOutputFormat, NoSideEffect):
+    """
+    ```shell
+    history [--change <change_id>] [--after <time>] [--before <time>] [--limit <num>] [<node_id>]
+    ```
+
+    Show the recorded changes of the graph, latest change first.
+    Changes are only recorded, if resotocore is started with `--graph-history`.
+    Every merge records the created nodes, the updated nodes with the previous values of all changed properties,
+    the deleted nodes with their complete content and all created and deleted edges.
+    All changes of one merge share the same change id.
+
+    Recorded changes are deleted after `--graph-history-retention`.
+    All changes of a node on the same day are combined after `--graph-history-compact-after`.
+
+    ## Options
+
+    - `--change` <change_id> [Optional]: only show changes of the merge with this change id.
+    - `--after` <time> [Optional]: only show changes after this point in time.
+    - `--before` <time> [Optional]: only show changes before this point in time.
+    - `--limit` <num> [Optional, default=100]: show at most this number of changes.
+
+    A point in time is either a timestamp (e.g. 2022-09-01T10:00:00Z) or a duration before now (e.g. 7d).
+
+    ## Parameters
+
+    - `node_id` [Optional]: only show changes of the node with this id.
+
+    ## Examples
+
+    ```shell
+    # Show the changes of a node in the last 7 days
+    > history --after 7d Iw7kEaGbfDKzRaQrlVrgSg
+    change: 5a8e2a4f-4d5a-4a4c-9a7e-3b0c2f8d3e1a
+    changed_at: '2022-09-01T10:00:00Z'
+    id: Iw7kEaGbfDKzRaQrlVrgSg
+    action: node_updated
+    kinds:
+    - aws_ec2_volume
+    hash: 3f6a7e
+    before_hash: 8c1d2b
+    before:
+      reported.volume_status: in-use
+      updated: '2022-08-31T10:00:00Z'
+    full: false
+    ```
+
+    ## Related
+
+    - `search --at <time>` - search the state of the graph at a point in time.
+    """
+
+    @property
+    def name(self) -> str:
+        return "history"
+
+    def info(self) -> str:
+        return "Show the recorded changes of the graph."
+
+    def parse(self, arg: Optional[str] = None, ctx: CLIContext = EmptyContext, **kwargs: Any) -> CLISource:
+        parser = NoExitArgumentParser()
+        parser.add_argument("node_id", nargs="?")
+        parser.add_argument("--change")
+        parser.add_argument("--after", type=time_or_duration_ago)
+        parser.add_argument("--before", type=time_or_duration_ago)
+        parser.add_argument("--limit", type=int, default=100)
+        parsed = parser.parse_args(arg.split() if arg else [])
+        db = self.dependencies.db_access.get_graph_db(ctx.env["graph"])
+        after = if_set(parsed.after, utc_str)
+        before = if_set(parsed.before, utc_str)
+
+        async def history() -> Tuple[Optional[int], AsyncIterator[Json]]:
+            context = await db.search_history(parsed.node_id, parsed.change, after, before, parsed.limit)
+            cursor = context.cursor
+
+            async def iterate_and_close() -> AsyncIterator[Json]:
+                try:
+                    async for e in cursor:
+                        yield e
+                finally:
+                    cursor.close()
+
+            return cursor.count(), iterate_and_close()
+
+        return CLISource(history)
+
+
+class IndexesCommand(CLICommand, PreserveOutputFormat):
+    """
+    ```shell
+    indexes [--apply]
+    ```
+
+    Show all properties that are filtered in searches, how often they are used and
+    how often an index could be used to answer the filter (hit rate).
+    Properties that are used often and are not covered by an index are recommended to be indexed.
+
+    Indexes are only created or dropped, if --apply is given or resotocore is started with `--index-advisor-auto`.
+    All indexes maintained this way are named with the prefix `advised_`.
+    The number of advised indexes is limited by `--index-advisor-budget`.
+
+    ## Options
+
+    - `--apply` [Optional]: create all recommended indexes and drop all advised indexes that are not recommended.
+
+    ## Examples
+
+    ```shell
+    # Show all filtered properties
+    > indexes
+    path: reported.instance_status
+    usage: 42
+    hit_rate: 0.0
+    indexed: false
+    recommended: true
+    sparse: true
+    kinds:
+      aws_ec2_instance: 42
+
+    # Create and drop advised indexes
+    > indexes --apply
+    created:
+    - advised_reported_instance_status
+    dropped: []
+    ```
+    """
+
+    @property
+    def name(self) -> str:
+        return "indexes"
+
+    def info(self) -> str:
+        return "Show property usage in searches and maintain advised indexes."
+
+    def parse(self, arg: Optional[str] = None, ctx: CLIContext = EmptyContext, **kwargs: Any) -> CLISource:
+        parser = NoExitArgumentParser()
+        parser.add_argument("--apply", action="store_true", default=False)
+        parsed = parser.parse_args(arg.split() if arg else [])
+        db = self.dependencies.db_access.get_graph_db(ctx.env["graph"])
+
+        async def apply() -> AsyncIterator[JsonElement]:
+            create, drop = await db.advised_index_changes(apply=True)
+            yield {"created": [rec.name for rec in create], "dropped": [idx["name"] for idx in drop]}
+
+        async def usage() -> Tuple[int, Stream]:
+            # make sure the list of existing indexes is up to date
+            await db.advised_index_changes()
+            advisor = db.index_advisor
+            recommended = {rec.path: rec for rec in advisor.recommendations()}
+            result = [
+                {
+                    "path": usage.path,
+                    "usage": usage.count,
+                    "hit_rate": round(usage.hit_rate, 2),
+                    "indexed": usage.path in advisor.indexed,
+                    "recommended": usage.path in recommended,
+                    "sparse": not usage.matches_null,
+                    "kinds": usage.kinds,
+                }
+                for usage in sorted(advisor.usage.values(), key=lambda u: u.count, reverse=True)
+            ]
+            return len(result), stream.iterate(result)
+
+        return CLISource.single(apply) if parsed.apply else CLISource(usage)
+
+
+class KillCommand(CLICommand, PreserveOutputFormat):
+    """
+    ```shell
+    kill [--list] [<query_id> ...]
+    ```
+
+    Kill queries that are running in the database.
+    Every search is executed as database query with a search tag in the form `/* search:<tag> */`.
+    Searches are killed automatically, if the client disconnects or the deadline defined
+    by `search_timeout` is exceeded. This command allows to kill running queries explicitly.
+
+    ## Options
+
+    - `--list` [Optional]: list all queries that are currently running.
+
+    ## Parameters
+
+    - `query_id` [Optional]: the id of the query to kill.
+
+    ## Examples
+
+    ```shell
+    # List all running queries
+    > kill --list
+    id: '2839284'
+    query: '/* search:e6c7a4ea-5b2a-11ec */ LET filter0 = (FOR m0 in resoto FILTER ...'
+    started: '2022-03-01T12:23:52Z'
+    run_time: 123.32
+    state: executing
+    stream: false
+
+    # Kill the query with id 2839284
+    > kill 2839284
+    Query 2839284 killed.
+
+    # Killing a query that is not running any longer
+    > kill 2839284
+    No running query with id 2839284.
+    ```
+    """
+
+    @property
+    def name(self) -> str:
+        return "kill"
+
+    def info(self) -> str:
+        return "List and kill running queries."
+
+    def parse(self, arg: Optional[str] = None, ctx: CLIContext = EmptyContext, **kwargs: Any) -> CLISource:
+        parser = NoExitArgumentParser()
+        parser.add_argument("--list", action="store_true", default=False)
+        parser.add_argument("query_ids", nargs="*")
+        parsed = parser.parse_args(arg.split() if arg else [])
+        if not parsed.list and not parsed.query_ids:
+            raise CLIParseError("kill: either define the query ids to kill or use --list.")
+        db_access = self.dependencies.db_access
+
+        async def running_queries() -> Tuple[int, Stream]:
+            queries = await db_access.running_queries()
+            return len(queries), stream.iterate(queries)
+
+        async def kill_queries() -> AsyncIterator[str]:
+            for query_id in parsed.query_ids:
+                if await db_access.kill_query(query_id):
+                    yield f"Query {query_id} killed."
+                else:
+                    yield f"No running query with id {query_id}."
+
+        if parsed.list:
+            return CLISource(running_queries)
+        else:
+            return CLISource.with_count(kill_queries, len(parsed.query_ids))
+
+
 class SetDesiredStateBase(CLICommand, ABC):
     @abstractmethod
     def patch(self, arg: Optional[str], ctx: CLIContext) -> Json:
@@ -1666,7 +2050,7 @@ class ProtectCommand(SetMetadataStateBase):
         return {"protected": True}
 
 
-class FormatCommand(CLICommand, OutputTransformer):
+class FormatCommand(CLICommand, OutputTransformer, NoSideEffect):
     """
     ```
     format [--json][--ndjson][--text][--cytoscape][--graphml][--dot] [format string]
@@ -1751,7 +2135,7 @@ class FormatCommand(CLICommand, OutputTransformer):
                     raise AttributeError("A format renderer can not be combined together with a format string!")
                 return render_format(next(iter(format_to_use)), in_stream)
             elif formatting_string:
-                return stream.map(in_stream, ctx.formatter(arg)) if arg else in_stream
+                return self.map_offloaded(in_stream, ctx.formatter(arg)) if arg else in_stream
             else:
                 return in_stream
 
@@ -1768,7 +2152,7 @@ def list_single_arg_parse() -> Parser:
 list_arg_parse = list_single_arg_parse.sep_by(comma_p, min=1)
 
 
-class DumpCommand(CLICommand, OutputTransformer):
+class DumpCommand(CLICommand, OutputTransformer, NoSideEffect):
     """
     ```
     dump
@@ -1838,7 +2222,7 @@ class DumpCommand(CLICommand, OutputTransformer):
         return CLIFlow(identity)
 
 
-class ListCommand(CLICommand, OutputTransformer):
+class ListCommand(CLICommand, OutputTransformer, NoSideEffect):
     """
     ```
     list [property [as <name>]] [,property ...]
@@ -2125,7 +2509,9 @@ class ListCommand(CLICommand, OutputTransformer):
             elif parsed.markdown:
                 return markdown_stream(in_stream)
             else:
-                return stream.map(in_stream, lambda elem: fmt_json(elem) if isinstance(elem, dict) else str(elem))
+                return self.map_offloaded(
+                    in_stream, lambda elem: fmt_json(elem) if isinstance(elem, dict) else str(elem)
+                )
 
         return CLIFlow(fmt)
 
@@ -2137,7 +2523,8 @@ class JobsCommand(CLICommand, PreserveOutputFormat):
     jobs show <id>
     jobs add [--id <id>] [--schedule <cron_expression>] [--wait-for-event <event_name>] <command_line>
     jobs update <id> [--schedule <cron_expression>] [--wait-for-event <event_name> :] <command_line>
-    jobs delete <id>
+    jobs delete <id> [<id> ...]
+    jobs import
     jobs activate <id>
     jobs deactivate <id>
     jobs run <id>
@@ -2148,7 +2535,9 @@ class JobsCommand(CLICommand, PreserveOutputFormat):
     - `jobs show <id>`: show the current definition of the job defined by given job identifier.
     - `jobs add ...`: add a job to the task handler with provided identifier, trigger and command line to execute.
     - `jobs update <id> ...` : update trigger and or command line of an existing job with provided identifier.
-    - `jobs delete <id>`: delete the job with the provided identifier.
+    - `jobs delete <id> [<id> ...]`: delete the jobs with the provided identifiers.
+    - `jobs import`: add all jobs of the incoming stream at once. Every element is either a string with
+      the arguments of `jobs add` or a json object in the format of `jobs list`.
     - `jobs activate <id>`: activate the triggers of a job.
     - `jobs deactivate <id>`: deactivate the triggers of a job. The job will not get started in case the trigger fires.
     - `jobs run <id>`: run the job as if the trigger would be triggered.
@@ -2245,6 +2634,16 @@ class JobsCommand(CLICommand, PreserveOutputFormat):
     # delete a job
     > jobs delete say-hello
     Job say-hello deleted.
+
+    # delete several jobs at once
+    > jobs delete early_hi wait_for_collect_done
+    Job early_hi deleted.
+    Job wait_for_collect_done deleted.
+
+    # add several jobs at once
+    > json [{"id": "hi", "command": "echo hi", "trigger": {"message_type": "foo"}}, "--id bye echo bye"] | jobs import
+    Job hi added.
+    Job bye added.
     ```
     """
 
@@ -2259,11 +2658,11 @@ class JobsCommand(CLICommand, PreserveOutputFormat):
     def is_jobs_update(command: ParsedCommand) -> bool:
         if command.cmd == "jobs":
             args = re.split("\\s+", command.args, maxsplit=1) if command.args else []
-            return len(args) == 2 and args[0] in ("add", "update")
+            return (len(args) == 2 and args[0] in ("add", "update")) or (len(args) == 1 and args[0] == "import")
         else:
             return False
 
-    def parse(self, arg: Optional[str] = None, ctx: CLIContext = EmptyContext, **kwargs: Any) -> CLISource:
+    def parse(self, arg: Optional[str] = None, ctx: CLIContext = EmptyContext, **kwargs: Any) -> CLIAction:
         def job_to_json(job: Job) -> Json:
             wait = {"wait": {"message_type": job.wait[0].message_type}} if job.wait else {}
             trigger = {"trigger": to_js(job.trigger, strip_nulls=True)} if job.trigger else {}
@@ -2285,7 +2684,7 @@ class JobsCommand(CLICommand, PreserveOutputFormat):
             else:
                 yield f"No job with this id: {job_id}"
 
-        async def put_job(arg_str: str) -> AsyncIterator[str]:
+        async def parse_job(arg_str: str) -> Job:
             arg_parser = NoExitArgumentParser()
             arg_parser.add_argument("--id", dest="id", default=rnd_str())
             arg_parser.add_argument("--schedule", dest="schedule", type=lambda r: TimeTrigger(strip_quotes(r)))
@@ -2308,12 +2707,51 @@ class JobsCommand(CLICommand, PreserveOutputFormat):
                 job = Job(uid, ExecuteCommand(command), timeout, trigger, environment=ctx.env)
             else:
                 job = Job(uid, ExecuteCommand(command), timeout, environment=ctx.env)
+            return job
+
+        async def job_from_json(js: Json) -> Job:
+            command = js.get("command")
+            if not isinstance(command, str):
+                raise AttributeError(f"Job definition requires a command: {js}")
+            # only here to make sure the command can be executed
+            await self.dependencies.cli.evaluate_cli_command(command, ctx)
+            trigger_js = js.get("trigger") or {}
+            wait_js = js.get("wait") or {}
+            trigger: Optional[Union[TimeTrigger, EventTrigger]] = None
+            if "cron_expression" in trigger_js:
+                trigger = TimeTrigger(trigger_js["cron_expression"])
+            elif "message_type" in trigger_js:
+                trigger = EventTrigger(trigger_js["message_type"])
+            timeout = timedelta(hours=1)
+            wait = (EventTrigger(wait_js["message_type"]), timeout) if "message_type" in wait_js else None
+            uid = js.get("id") or rnd_str()
+            active = js.get("active", True)
+            return Job(uid, ExecuteCommand(command), timeout, trigger, wait, ctx.env, active=active)
+
+        async def put_job(arg_str: str) -> AsyncIterator[str]:
+            job = await parse_job(arg_str)
             await self.dependencies.task_handler.add_job(job)
             yield f"Job {job.id} added."
 
-        async def delete_job(job_id: str) -> AsyncIterator[str]:
-            job = await self.dependencies.task_handler.delete_job(job_id)
-            yield f"Job {job_id} deleted." if job else f"No job with this id: {job_id}"
+        async def import_jobs(in_stream: Stream) -> AsyncIterator[str]:
+            jobs: List[Job] = []
+            async with in_stream.stream() as streamer:
+                async for elem in streamer:
+                    if isinstance(elem, str):
+                        jobs.append(await parse_job(elem))
+                    elif isinstance(elem, dict):
+                        jobs.append(await job_from_json(elem))
+                    else:
+                        raise AttributeError(f"Can not import job from: {elem}")
+            # all jobs are stored with one database request
+            await self.dependencies.task_handler.add_jobs(jobs)
+            for job in jobs:
+                yield f"Job {job.id} added."
+
+        async def delete_jobs(ids: List[str]) -> AsyncIterator[str]:
+            deleted = {job.id for job in await self.dependencies.task_handler.delete_jobs(ids)}
+            for job_id in ids:
+                yield f"Job {job_id} deleted." if job_id in deleted else f"No job with this id: {job_id}"
 
         async def run_job(job_id: str) -> AsyncIterator[str]:
             task = await self.dependencies.task_handler.start_task_by_descriptor_id(job_id)
@@ -2347,7 +2785,8 @@ class JobsCommand(CLICommand, PreserveOutputFormat):
         if arg and len(args) == 2 and args[0] in ("add", "update"):
             return CLISource.single(partial(put_job, args[1].strip()))
         elif arg and len(args) == 2 and args[0] == "delete":
-            return CLISource.single(partial(delete_job, args[1].strip()))
+            job_ids = re.split("\\s+", args[1].strip())
+            return CLISource.with_count(partial(delete_jobs, job_ids), len(job_ids))
         elif arg and len(args) == 2 and args[0] == "show":
             return CLISource.single(partial(show_job, args[1].strip()))
         elif arg and len(args) == 2 and args[0] == "run":
@@ -2360,6 +2799,8 @@ class JobsCommand(CLICommand, PreserveOutputFormat):
             raise CLIParseError(f"Does not understand action {args[0]}. Allowed: add, update, delete.")
         elif arg and len(args) == 1 and args[0] == "running":
             return CLISource(running_jobs)
+        elif arg and len(args) == 1 and args[0] == "import":
+            return CLIFlow(import_jobs)
         elif arg and len(args) == 1 and args[0] == "list":
             return CLISource(list_jobs)
         else:
@@ -3541,10 +3982,13 @@ def all_commands(d: CLIDependencies) -> List[CLICommand]:
         FlattenCommand(d),
         FormatCommand(d),
         HeadCommand(d),
+        HistoryCommand(d),
         HttpCommand(d),
+        IndexesCommand(d),
         JobsCommand(d),
         JqCommand(d),
         JsonCommand(d),
+        KillCommand(d),
         KindsCommand(d),
         ListCommand(d),
         TemplatesCommand(d),
@@ -3585,5 +4029,6 @@ def aliases() -> Dict[str, str]:
         "job": "jobs",
         "lists": "list",
         "template": "templates",
+        "index": "indexes",
         "workflow": "workflows",
     }
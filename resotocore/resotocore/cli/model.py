@@ -16,7 +16,7 @@ from rich.jupyter import JupyterMixin
 from parsy import test_char, string
 
 from resotocore.analytics import AnalyticsEventSender
-from resotocore.cli import JsGen, T, Sink
+from resotocore.cli import JsGen, T, Sink, offload_map
 from resotocore.config import ConfigHandler
 from resotocore.db.db_access import DbAccess
 from resotocore.error import CLIParseError
@@ -310,6 +310,15 @@ class CLICommand(ABC):
     def parse(self, arg: Optional[str] = None, ctx: CLIContext = EmptyContext, **kwargs: Any) -> CLIAction:
         pass
 
+    def map_offloaded(self, in_stream: JsGen, fn: Callable[[Any], Any]) -> JsGen:
+        """
+        Map all elements of the stream with a cpu bound function outside the event loop.
+        """
+        args = self.dependencies.lookup.get("args")
+        chunk_size = getattr(args, "cli_transform_chunk_size", 0)
+        parallelism = getattr(args, "cli_transform_parallelism", 1)
+        return offload_map(in_stream, fn, chunk_size, parallelism)
+
 
 class InternalPart(ABC):
     """
@@ -336,6 +345,13 @@ class NoTerminalOutput(ABC):
     """
 
 
+class NoSideEffect(ABC):
+    """
+    Mark all commands that only read data and do not change any state.
+    Command lines that only consist of such commands can be executed concurrently.
+    """
+
+
 @dataclass
 class ParsedCommand:
     cmd: str
@@ -393,6 +409,10 @@ class ParsedCommandLine:
     def commands(self) -> List[CLICommand]:
         return [part.command for part in self.executable_commands]
 
+    @property
+    def side_effect_free(self) -> bool:
+        return all(isinstance(cmd, NoSideEffect) for cmd in self.commands)
+
     @property
     def produces(self) -> MediaType:
         # the last command in the chain defines the resulting media type
@@ -1,6 +1,9 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
+from typing import Dict, List, Optional
+
+from resotocore.types import Json
 
 
 @dataclass
@@ -30,3 +33,85 @@ class EstimatedSearchCost:
     full_collection_scan: bool
     # The rating of this query
     rating: EstimatedQueryCostRating
+
+
+@dataclass
+class SearchProfileNode:
+    # id of the node in the execution plan
+    id: int
+    # type of the execution node, e.g. IndexNode or EnumerateCollectionNode
+    type: str
+    # name of the collection this node operates on (if any)
+    collection: Optional[str] = None
+    # names of the indexes used by this node
+    indexes: List[str] = field(default_factory=list)
+    # number of times this node has been called
+    calls: int = 0
+    # number of items returned by this node
+    items: int = 0
+    # accumulated runtime of this node and all its dependencies in seconds
+    runtime: float = 0
+
+
+@dataclass
+class SearchProfile:
+    # All durations are measured in seconds.
+    # Time to compile the search into a database query.
+    compile: float = 0
+    # Time spent waiting for the database: execution and fetching of all batches including the network.
+    fetch: float = 0
+    # Time spent to transform database documents into the resulting json.
+    transform: float = 0
+    # Time spent to serialize the resulting json.
+    serialize: float = 0
+    # Overall time of the search.
+    total: float = 0
+    # Execution time reported by the database.
+    db_execution: float = 0
+    # Duration of the different execution phases as reported by the database.
+    db_phases: Dict[str, float] = field(default_factory=dict)
+    # Number of items returned by the database.
+    items: int = 0
+    # Number of documents scanned via full collection scan.
+    scanned_full: int = 0
+    # Number of documents scanned via index.
+    scanned_index: int = 0
+    # Number of documents filtered out.
+    filtered: int = 0
+    # Maximum memory used by the database to execute this query in bytes.
+    peak_memory_usage: int = 0
+    # Statistics of all nodes of the execution plan.
+    nodes: List[SearchProfileNode] = field(default_factory=list)
+
+    def add_plan(self, plan: Json) -> None:
+        for node in plan.get("nodes", []):
+            indexes = [idx.get("name", idx.get("id")) for idx in node.get("indexes", [])]
+            if "index" in node:
+                indexes.append(node["index"].get("name", node["index"].get("id")))
+            self.nodes.append(SearchProfileNode(node["id"], node["type"], node.get("collection"), indexes))
+
+    def add_db_statistics(self, stats: Optional[Json], phases: Optional[Json]) -> None:
+        def stat(*names: str) -> int:
+            # python-arango renames some statistics: accept the original and the renamed version
+            return next((stats[name] for name in names if name in stats), 0)  # type: ignore
+
+        if stats:
+            self.scanned_full = stat("scannedFull", "scanned_full")
+            self.scanned_index = stat("scannedIndex", "scanned_index")
+            self.filtered = stat("filtered")
+            self.peak_memory_usage = stat("peakMemoryUsage")
+            self.db_execution = stat("executionTime", "execution_time")
+            by_id = {node.id: node for node in self.nodes}
+            for ns in stats.get("nodes", []):
+                node = by_id.get(ns["id"])
+                if node is None:
+                    node = SearchProfileNode(ns["id"], "unknown")
+                    self.nodes.append(node)
+                node.calls = ns.get("calls", 0)
+                node.items = ns.get("items", 0)
+                node.runtime = ns.get("runtime", 0)
+            # the last node of the plan returns the result
+            if self.nodes:
+                self.items = self.nodes[-1].items
+        if phases:
+            self.db_phases = dict(phases)
@@ -13,7 +13,7 @@ from resotocore.db.arangodb_functions import as_arangodb_function
 from resotocore.db.model import QueryModel
 from resotocore.model.graph_access import EdgeType, Section, Direction
 from resotocore.model.model import SyntheticProperty, ResolvedProperty
-from resotocore.model.resolve_in_graph import GraphResolver
+from resotocore.model.resolve_in_graph import GraphResolver, NodePath
 from resotocore.query.model import (
     Predicate,
     IsTerm,
@@ -44,7 +44,8 @@ from resotocore.util import first, set_value_in_path, exist
 log = logging.getLogger(__name__)
 
 allowed_first_merge_part = Part(AllTerm())
-unset_props = json.dumps(["flat"])
+ancestor_ids = ".".join(NodePath.ancestor_ids)
+unset_props = json.dumps(["flat", ancestor_ids])
 # This list of delimiter is also used in the arango delimiter index.
 # In case the definition is changed, also the index needs to change!
 fulltext_delimiter = [" ", "_", "-", "@", ":", "/", "."]
@@ -387,6 +388,22 @@ def query_string(
                 graph_cursor = in_c
                 outer_for = f"FOR {in_c} in {in_crsr} "
 
+            if not with_edges and edge_type == EdgeType.default and start <= 1 and until >= Navigation.Max:
+                # all ancestors of a node are materialized: use an index join instead of a graph traversal
+                if direction == Direction.inbound:
+                    ancestors = f"NOT_NULL({graph_cursor}.{ancestor_ids}, [])"
+                    keys = f"APPEND([{graph_cursor}._key], {ancestors})" if start == 0 else ancestors
+                    walk = f'FOR {out_crsr} IN DOCUMENT("{db.vertex_name}", {keys}) '
+                else:
+                    origin = f"{graph_cursor}._key == {out_crsr}._key OR " if start == 0 else ""
+                    # the expansion operator is required, so the array index on ancestor_ids[*] is used
+                    walk = (
+                        f"FOR {out_crsr} IN {db.vertex_name} "
+                        f"FILTER {origin}{graph_cursor}._key IN {out_crsr}.{ancestor_ids}[*] "
+                    )
+                query_part += f"LET {out} =({outer_for}{walk}RETURN DISTINCT {out_crsr}) "
+                return out
+
             query_part += (
                 f"LET {out} =({outer_for}"
                 f"FOR {out_crsr}{link_str} IN {start}..{until} {dir_bound} {graph_cursor} "
@@ -436,15 +453,12 @@ def query_string(
         # filter out resolved ancestors: all remaining ancestors need to be looked up in hierarchy
         to_resolve = [(nr, p_as) for nr, p_as in ancestors if nr not in GraphResolver.resolved_ancestors]
         if to_resolve:
-            merge_stop_at = next_bind_var_name()
             merge_ancestor_nodes = next_bind_var_name()
-            bind_vars[merge_stop_at] = to_resolve[0][0]
             bind_vars[merge_ancestor_nodes] = [tr[0] for tr in to_resolve]
+            # the materialized ancestor ids are ordered by distance: the first match is the nearest ancestor
             m_parts.append(
                 "LET ancestor_nodes = ("
-                + f"FOR p IN 1..1000 INBOUND node {db.edge_collection(EdgeType.default)} "
-                + f"PRUNE @{merge_stop_at} in p.kinds "
-                + "OPTIONS {order: 'bfs', uniqueVertices: 'global'} "
+                + f'FOR p IN DOCUMENT("{db.vertex_name}", NOT_NULL(node.{ancestor_ids}, [])) '
                 + f"FILTER p.kinds any in @{merge_ancestor_nodes} RETURN p)"
             )
             for tr, _ in to_resolve:
@@ -531,7 +545,7 @@ def query_string(
 
 
 async def query_cost(graph_db: Any, model: QueryModel, with_edges: bool) -> EstimatedSearchCost:
-    q_string, bind = to_query(graph_db, model, with_edges=with_edges)
+    q_string, bind = await graph_db.to_query(model, with_edges=with_edges)
     nr_nodes = await graph_db.db.count(graph_db.vertex_name)
     plan = await graph_db.db.explain(query=q_string, bind_vars=bind)
     full_collection_scan = exist(lambda node: node["type"] == "EnumerateCollectionNode", plan["nodes"])
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import re
 from contextlib import asynccontextmanager
 from numbers import Number
+from time import perf_counter
 from typing import (
     Optional,
     MutableMapping,
@@ -27,6 +29,7 @@ from arango.graph import Graph
 from arango.typings import Json, Jsons
 
 from resotocore.async_extensions import run_async
+from resotocore.db import SearchProfile
 from resotocore.error import QueryTookToLongError
 from resotocore.metrics import timed
 from resotocore.util import identity
@@ -35,13 +38,21 @@ log = logging.getLogger(__name__)
 
 
 class AsyncCursor(AsyncIterator[Json]):
-    def __init__(self, cursor: Cursor, trafo: Optional[Callable[[Json], Optional[Json]]]):
+    def __init__(
+        self,
+        cursor: Cursor,
+        trafo: Optional[Callable[[Json], Optional[Json]]],
+        profile: Optional[SearchProfile] = None,
+    ):
         self.cursor = cursor
         self.visited_node: Set[str] = set()
         self.visited_edge: Set[str] = set()
         self.deferred_edges: List[Json] = []
         self.cursor_exhausted = False
+        self.profile = profile
         self.trafo = trafo if trafo else identity
+        if trafo and profile:
+            self.trafo = self.timed_trafo(trafo, profile)
         self.vt_len: Optional[int] = None
         self.on_hold: Optional[Json] = None
         self.get_next: Callable[[], Awaitable[Optional[Json]]] = self.next_filtered if trafo else self.next_from_db
@@ -60,7 +71,7 @@ class AsyncCursor(AsyncIterator[Json]):
             try:
                 while True:
                     element = await self.get_next()
-                    if element:
+                    if element is not None:
                         return element
             except StopAsyncIteration:
                 # iterator exhausted: all elements have been processed. Now yield all deferred edges.
@@ -119,14 +130,36 @@ class AsyncCursor(AsyncIterator[Json]):
         try:
             if self.cursor.empty():
                 if not self.cursor.has_more():
+                    if self.profile:
+                        self.profile.add_db_statistics(self.cursor.statistics(), self.cursor.profile())
                     raise StopAsyncIteration
-                # next batch is fetched in separate thread
-                await run_async(self.cursor.fetch)
+                start = perf_counter()
+                if asyncio.iscoroutinefunction(self.cursor.fetch):
+                    # native async cursor: fetch the next batch in the event loop
+                    await self.cursor.fetch()
+                else:
+                    # next batch is fetched in separate thread
+                    await run_async(self.cursor.fetch)
+                if self.profile:
+                    self.profile.fetch += perf_counter() - start
             res = self.cursor.pop()
             return res
         except CursorNextError as ex:
             raise QueryTookToLongError("Cursor does not exist any longer, since the query ran for too long.") from ex
 
+    @staticmethod
+    def timed_trafo(
+        trafo: Callable[[Json], Optional[Json]], profile: SearchProfile
+    ) -> Callable[[Json], Optional[Json]]:
+        def timed(js: Json) -> Optional[Json]:
+            start = perf_counter()
+            try:
+                return trafo(js)
+            finally:
+                profile.transform += perf_counter() - start
+
+        return timed
+
     async def next_deferred_edge(self) -> Json:
         try:
             while True:
@@ -141,10 +174,12 @@ class AsyncCursorContext(AsyncContextManager[AsyncCursor]):
     def __init__(self, cursor: Cursor, trafo: Optional[Callable[[Json], Optional[Json]]]):
         self._cursor = cursor
         self._trafo = trafo
+        # collect profiling information while iterating the cursor
+        self.profile: Optional[SearchProfile] = None
 
     @property
     def cursor(self) -> AsyncCursor:
-        return AsyncCursor(self._cursor, self._trafo)
+        return AsyncCursor(self._cursor, self._trafo, self.profile)
 
     async def __aenter__(self) -> AsyncCursor:
         return self.cursor
@@ -172,7 +207,7 @@ class AsyncArangoDBBase:
         cache: Optional[bool] = None,
         memory_limit: int = 0,
         fail_on_warning: Optional[bool] = None,
-        profile: Optional[bool] = None,
+        profile: Optional[Union[bool, int]] = None,
         max_transaction_size: Optional[int] = None,
         max_warning_count: Optional[int] = None,
         intermediate_commit_count: Optional[int] = None,
@@ -221,7 +256,7 @@ class AsyncArangoDBBase:
         cache: Optional[bool] = None,
         memory_limit: int = 0,
         fail_on_warning: Optional[bool] = None,
-        profile: Optional[bool] = None,
+        profile: Optional[Union[bool, int]] = None,
         max_transaction_size: Optional[int] = None,
         max_warning_count: Optional[int] = None,
         intermediate_commit_count: Optional[int] = None,
@@ -266,6 +301,14 @@ class AsyncArangoDBBase:
     ) -> Union[Json, Jsons]:
         return await run_async(self.db.aql.explain, query, all_plans, max_plans, opt_rules, bind_vars)
 
+    @timed("arango", "queries")
+    async def queries(self) -> Jsons:
+        return await run_async(self.db.aql.queries)
+
+    @timed("arango", "kill")
+    async def kill(self, query_id: str) -> bool:
+        return await run_async(self.db.aql.kill, query_id)  # type: ignore
+
     @timed("arango", "execute_transaction")
     async def execute_transaction(
         self,
@@ -573,6 +616,9 @@ class AsyncArangoDB(AsyncArangoDBBase):
             raise ex
         await atx.commit_transaction()
 
+    async def close(self) -> None:
+        pass
+
 
 class AsyncArangoTransactionDB(AsyncArangoDBBase):
     def __init__(self, db: TransactionDatabase):
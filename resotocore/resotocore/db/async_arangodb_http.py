@@ -0,0 +1,744 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from argparse import Namespace
+from collections import deque
+from contextlib import asynccontextmanager
+from copy import copy
+from numbers import Number
+from typing import Optional, Dict, Any, Sequence, Callable, Union, List, MutableMapping, AsyncIterator, Tuple, Set
+
+from aiohttp import ClientSession, TCPConnector, BasicAuth, ClientTimeout
+from arango import (
+    ArangoServerError,
+    AQLQueryExecuteError,
+    AQLQueryExplainError,
+    CursorNextError,
+    DocumentGetError,
+    DocumentRevisionError,
+    DocumentInsertError,
+    DocumentUpdateError,
+    DocumentDeleteError,
+    DocumentCountError,
+    CollectionTruncateError,
+    TransactionInitError,
+    TransactionCommitError,
+    TransactionAbortError,
+    TransactionExecuteError,
+)
+from arango.database import StandardDatabase
+from arango.request import Request
+from arango.response import Response
+from arango.typings import Json, Jsons
+
+from resotocore.db.async_arangodb import AsyncArangoDB, AsyncCursorContext, AsyncArangoTransactionDB
+from resotocore.metrics import timed
+
+log = logging.getLogger(__name__)
+
+
+class ArangoHttpConnection:
+    """
+    Talks to the ArangoDB HTTP API directly from the event loop using aiohttp.
+    All requests share one keep-alive connection pool of configurable size.
+    Note: aiohttp speaks HTTP/1.1 only - there is no HTTP/2 multiplexing or pipelining.
+    Concurrency is achieved via the number of pooled connections.
+    """
+
+    def __init__(
+        self,
+        server: str,
+        database: str,
+        username: str,
+        password: str,
+        timeout: int = 900,
+        verify: bool = True,
+        pool_size: int = 100,
+        keep_alive: int = 60,
+    ):
+        self.base_url = f"{server.rstrip('/')}/_db/{database}"
+        self.auth = BasicAuth(username, password)
+        self.timeout = timeout
+        self.verify = verify
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.headers: Dict[str, str] = {}
+        self._session: Optional[ClientSession] = None
+        # references to fire and forget tasks (e.g. cursor deletion)
+        self._background: Set[asyncio.Task[Any]] = set()
+
+    @staticmethod
+    def from_args(args: Namespace) -> ArangoHttpConnection:
+        return ArangoHttpConnection(
+            args.graphdb_server,
+            args.graphdb_database,
+            args.graphdb_username,
+            args.graphdb_password,
+            args.graphdb_request_timeout,
+            not args.graphdb_no_ssl_verify,
+            args.graphdb_http_pool_size,
+        )
+
+    def session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            log.info(f"Create arangodb connection pool with size={self.pool_size} to {self.base_url}")
+            connector = TCPConnector(
+                limit=self.pool_size, keepalive_timeout=self.keep_alive, ssl=None if self.verify else False
+            )
+            self._session = ClientSession(
+                connector=connector, auth=self.auth, timeout=ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    def transaction(self, transaction_id: str) -> ArangoHttpConnection:
+        # the transaction shares the connection pool and marks every request with the transaction id
+        self.session()
+        tx = copy(self)
+        tx.headers = {**self.headers, "x-arango-trx-id": transaction_id}
+        return tx
+
+    async def request(
+        self,
+        method: str,
+        endpoint: str,
+        params: Optional[Dict[str, Any]] = None,
+        data: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Tuple[Request, Response]:
+        request = Request(method, endpoint, {**self.headers, **(headers or {})}, params, data)
+        body = None if data is None else json.dumps(data)
+        async with self.session().request(
+            method, self.base_url + endpoint, params=request.params, data=body, headers=request.headers
+        ) as resp:
+            raw = await resp.text()
+            response = Response(method, str(resp.url), dict(resp.headers), resp.status, resp.reason or "", raw)
+        try:
+            response.body = json.loads(raw) if raw else None
+        except ValueError:
+            # e.g. a proxy in front of the database answers with an html page
+            log.warning(f"{method} {endpoint}: response is not valid json: {raw[:200]}")
+            response.body = None
+            response.error_message = raw or response.status_text
+            response.is_success = False
+            return request, response
+        if isinstance(response.body, dict):
+            response.error_code = response.body.get("errorNum")
+            response.error_message = response.body.get("errorMessage")
+        response.is_success = 200 <= response.status_code < 300 and response.error_code is None
+        return request, response
+
+    def in_background(self, method: str, endpoint: str) -> None:
+        task = asyncio.get_event_loop().create_task(self.request(method, endpoint))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class HttpCursor:
+    """
+    Cursor on top of the ArangoDB cursor API.
+    The batches are fetched asynchronously via fetch() while the elements of a batch can be consumed synchronously.
+    Results with more than one batch have to be iterated via AsyncCursor, which fetches batch by batch.
+    It provides the same methods as the python-arango Cursor used in this code base.
+    """
+
+    def __init__(self, connection: ArangoHttpConnection, body: Json):
+        self.connection = connection
+        self._id: Optional[str] = body.get("id")
+        self._count: Optional[int] = body.get("count")
+        self._extra: Json = body.get("extra", {})
+        self._has_more: bool = False
+        self._batch: deque[Any] = deque()
+        self._update(body)
+
+    def _update(self, body: Json) -> None:
+        self._has_more = body.get("hasMore", False)
+        self._batch.extend(body.get("result", []))
+
+    def __iter__(self) -> HttpCursor:
+        return self
+
+    def __next__(self) -> Any:
+        if not self._batch:
+            if self._has_more:
+                raise RuntimeError("The next batch has not been fetched: iterate the cursor via AsyncCursor.")
+            raise StopIteration
+        return self._batch.popleft()
+
+    def __enter__(self) -> HttpCursor:
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close(ignore_missing=True)
+
+    def next(self) -> Any:
+        return self.__next__()
+
+    def pop(self) -> Any:
+        return self._batch.popleft()
+
+    def empty(self) -> bool:
+        return len(self._batch) == 0
+
+    def has_more(self) -> bool:
+        return self._has_more
+
+    def count(self) -> Optional[int]:
+        return self._count
+
+    def batch(self) -> deque[Any]:
+        return self._batch
+
+    def statistics(self) -> Optional[Json]:
+        return self._extra.get("stats")
+
+    def profile(self) -> Optional[Json]:
+        return self._extra.get("profile")
+
+    def warnings(self) -> Optional[Jsons]:
+        return self._extra.get("warnings")
+
+    async def fetch(self) -> None:
+        request, response = await self.connection.request("put", f"/_api/cursor/{self._id}")
+        if not response.is_success:
+            raise CursorNextError(response, request)
+        self._update(response.body)
+
+    def close(self, ignore_missing: bool = False) -> Optional[bool]:
+        # only cursors with pending batches are held by the server
+        if self._id is not None and self._has_more:
+            self._has_more = False
+            self.connection.in_background("delete", f"/_api/cursor/{self._id}")
+            return True
+        return None
+
+
+def cursor_request(
+    query: str,
+    count: bool = False,
+    batch_size: Optional[int] = None,
+    ttl: Optional[Number] = None,
+    bind_vars: Optional[Dict[str, Any]] = None,
+    full_count: Optional[bool] = None,
+    max_plans: Optional[int] = None,
+    optimizer_rules: Optional[Sequence[str]] = None,
+    cache: Optional[bool] = None,
+    memory_limit: int = 0,
+    fail_on_warning: Optional[bool] = None,
+    profile: Optional[Union[bool, int]] = None,
+    max_transaction_size: Optional[int] = None,
+    max_warning_count: Optional[int] = None,
+    intermediate_commit_count: Optional[int] = None,
+    intermediate_commit_size: Optional[int] = None,
+    satellite_sync_wait: Optional[int] = None,
+    stream: Optional[bool] = None,
+    skip_inaccessible_cols: Optional[bool] = None,
+    max_runtime: Optional[Number] = None,
+) -> Json:
+    data: Json = {"query": query, "count": count, "memoryLimit": memory_limit}
+    optional = {"batchSize": batch_size, "ttl": ttl, "bindVars": bind_vars, "cache": cache}
+    data.update({k: v for k, v in optional.items() if v is not None})
+    options = {
+        "fullCount": full_count,
+        "maxPlans": max_plans,
+        "optimizer": {"rules": optimizer_rules} if optimizer_rules is not None else None,
+        "failOnWarning": fail_on_warning,
+        "profile": profile,
+        "maxTransactionSize": max_transaction_size,
+        "maxWarningCount": max_warning_count,
+        "intermediateCommitCount": intermediate_commit_count,
+        "intermediateCommitSize": intermediate_commit_size,
+        "satelliteSyncWait": satellite_sync_wait,
+        "stream": stream,
+        "skipInaccessibleCollections": skip_inaccessible_cols,
+        "maxRuntime": max_runtime,
+    }
+    data["options"] = {k: v for k, v in options.items() if v is not None}
+    return data
+
+
+def document_id(collection: str, document: Union[str, Json]) -> str:
+    key = document if isinstance(document, str) else document.get("_key") or document["_id"]
+    return key if "/" in key else f"{collection}/{key}"
+
+
+def revision_header(document: Union[str, Json], rev: Optional[str], check_rev: bool) -> Dict[str, str]:
+    rev = rev or (document.get("_rev") if isinstance(document, dict) else None)
+    return {"If-Match": rev} if check_rev and rev is not None else {}
+
+
+def bulk_result(
+    request: Request, response: Response, error: Callable[[Response, Request], ArangoServerError]
+) -> List[Union[Json, ArangoServerError]]:
+    results: List[Union[Json, ArangoServerError]] = []
+    for body in response.body:
+        if "_id" in body:
+            if "_oldRev" in body:
+                body["_old_rev"] = body.pop("_oldRev")
+            results.append(body)
+        else:
+            sub = Response(response.method, response.url, response.headers, response.status_code, "", json.dumps(body))
+            sub.body = body
+            sub.error_code = body["errorNum"]
+            sub.error_message = body["errorMessage"]
+            sub.is_success = False
+            results.append(DocumentRevisionError(sub, request) if sub.error_code == 1200 else error(sub, request))
+    return results
+
+
+class AsyncArangoHttpAccess:
+    """
+    Implements the hot path of AsyncArangoDBBase natively via the HTTP API.
+    All other (administrative) methods are inherited and executed via python-arango in a thread pool.
+    """
+
+    connection: ArangoHttpConnection
+
+    @timed("arango", "aql")
+    async def aql_cursor(
+        self,
+        query: str,
+        trafo: Optional[Callable[[Json], Optional[Json]]] = None,
+        count: bool = False,
+        batch_size: Optional[int] = None,
+        ttl: Optional[Number] = None,
+        bind_vars: Optional[Dict[str, Any]] = None,
+        full_count: Optional[bool] = None,
+        max_plans: Optional[int] = None,
+        optimizer_rules: Optional[Sequence[str]] = None,
+        cache: Optional[bool] = None,
+        memory_limit: int = 0,
+        fail_on_warning: Optional[bool] = None,
+        profile: Optional[Union[bool, int]] = None,
+        max_transaction_size: Optional[int] = None,
+        max_warning_count: Optional[int] = None,
+        intermediate_commit_count: Optional[int] = None,
+        intermediate_commit_size: Optional[int] = None,
+        satellite_sync_wait: Optional[int] = None,
+        stream: Optional[bool] = None,
+        skip_inaccessible_cols: Optional[bool] = None,
+        max_runtime: Optional[Number] = None,
+    ) -> AsyncCursorContext:
+        data = cursor_request(
+            query,
+            count,
+            batch_size,
+            ttl,
+            bind_vars,
+            full_count,
+            max_plans,
+            optimizer_rules,
+            cache,
+            memory_limit,
+            fail_on_warning,
+            profile,
+            max_transaction_size,
+            max_warning_count,
+            intermediate_commit_count,
+            intermediate_commit_size,
+            satellite_sync_wait,
+            stream,
+            skip_inaccessible_cols,
+            max_runtime,
+        )
+        return AsyncCursorContext(await self._cursor(data), trafo)
+
+    @timed("arango", "aql")
+    async def aql(
+        self,
+        query: str,
+        count: bool = False,
+        batch_size: Optional[int] = None,
+        ttl: Optional[Number] = None,
+        bind_vars: Optional[Dict[str, Any]] = None,
+        full_count: Optional[bool] = None,
+        max_plans: Optional[int] = None,
+        optimizer_rules: Optional[Sequence[str]] = None,
+        cache: Optional[bool] = None,
+        memory_limit: int = 0,
+        fail_on_warning: Optional[bool] = None,
+        profile: Optional[Union[bool, int]] = None,
+        max_transaction_size: Optional[int] = None,
+        max_warning_count: Optional[int] = None,
+        intermediate_commit_count: Optional[int] = None,
+        intermediate_commit_size: Optional[int] = None,
+        satellite_sync_wait: Optional[int] = None,
+        stream: Optional[bool] = None,
+        skip_inaccessible_cols: Optional[bool] = None,
+        max_runtime: Optional[Number] = None,
+    ) -> HttpCursor:
+        data = cursor_request(
+            query,
+            count,
+            batch_size,
+            ttl,
+            bind_vars,
+            full_count,
+            max_plans,
+            optimizer_rules,
+            cache,
+            memory_limit,
+            fail_on_warning,
+            profile,
+            max_transaction_size,
+            max_warning_count,
+            intermediate_commit_count,
+            intermediate_commit_size,
+            satellite_sync_wait,
+            stream,
+            skip_inaccessible_cols,
+            max_runtime,
+        )
+        # only the first batch is fetched: the remaining batches are fetched while iterating via AsyncCursor
+        return await self._cursor(data)
+
+    async def _cursor(self, data: Json) -> HttpCursor:
+        request, response = await self.connection.request("post", "/_api/cursor", data=data)
+        if not response.is_success:
+            raise AQLQueryExecuteError(response, request)
+        return HttpCursor(self.connection, response.body)
+
+    @timed("arango", "explain")
+    async def explain(
+        self,
+        query: str,
+        all_plans: bool = False,
+        max_plans: Optional[int] = None,
+        opt_rules: Optional[Sequence[str]] = None,
+        bind_vars: Optional[MutableMapping[str, str]] = None,
+    ) -> Union[Json, Jsons]:
+        options: Json = {"allPlans": all_plans}
+        if max_plans is not None:
+            options["maxNumberOfPlans"] = max_plans
+        if opt_rules is not None:
+            options["optimizer"] = {"rules": opt_rules}
+        data: Json = {"query": query, "options": options}
+        if bind_vars is not None:
+            data["bindVars"] = bind_vars
+        request, response = await self.connection.request("post", "/_api/explain", data=data)
+        if not response.is_success:
+            raise AQLQueryExplainError(response, request)
+        return response.body["plan"] if "plan" in response.body else response.body["plans"]
+
+    @timed("arango", "execute_transaction")
+    async def execute_transaction(
+        self,
+        command: str,
+        params: Optional[Json] = None,
+        read: Optional[Sequence[str]] = None,
+        write: Optional[Sequence[str]] = None,
+        sync: Optional[bool] = None,
+        timeout: Optional[Number] = None,
+        max_size: Optional[int] = None,
+        allow_implicit: Optional[bool] = None,
+        intermediate_commit_count: Optional[int] = None,
+        intermediate_commit_size: Optional[int] = None,
+    ) -> Any:
+        collections = {k: v for k, v in {"read": read, "write": write}.items() if v is not None}
+        data: Json = {"action": command, "collections": collections}
+        optional = {
+            "params": params,
+            "waitForSync": sync,
+            "lockTimeout": timeout,
+            "maxTransactionSize": max_size,
+            "allowImplicit": allow_implicit,
+            "intermediateCommitCount": intermediate_commit_count,
+            "intermediateCommitSize": intermediate_commit_size,
+        }
+        data.update({k: v for k, v in optional.items() if v is not None})
+        request, response = await self.connection.request("post", "/_api/transaction", data=data)
+        if not response.is_success:
+            raise TransactionExecuteError(response, request)
+        return response.body.get("result")
+
+    @timed("arango", "get")
+    async def get(
+        self,
+        collection: str,
+        document: Union[str, Json],
+        rev: Optional[str] = None,
+        check_rev: bool = True,
+    ) -> Optional[Json]:
+        headers = revision_header(document, rev, check_rev)
+        request, response = await self.connection.request(
+            "get", f"/_api/document/{document_id(collection, document)}", headers=headers
+        )
+        if response.error_code == 1202:
+            return None
+        elif response.status_code == 412:
+            raise DocumentRevisionError(response, request)
+        elif not response.is_success:
+            raise DocumentGetError(response, request)
+        return response.body
+
+    @timed("arango", "insert")
+    async def insert(
+        self,
+        collection: str,
+        document: Json,
+        return_new: bool = False,
+        sync: Optional[bool] = None,
+        silent: bool = False,
+        overwrite: bool = False,
+        return_old: bool = False,
+        overwrite_mode: Optional[str] = None,
+        keep_none: Optional[bool] = None,
+        merge: Optional[bool] = None,
+    ) -> Union[bool, Json]:
+        params = {
+            "returnNew": return_new,
+            "silent": silent,
+            "overwrite": overwrite,
+            "returnOld": return_old,
+            "overwriteMode": overwrite_mode,
+            "keepNull": keep_none,
+            "mergeObjects": merge,
+            "waitForSync": sync,
+        }
+        request, response = await self.connection.request(
+            "post",
+            f"/_api/document/{collection}",
+            params={k: v for k, v in params.items() if v is not None},
+            data=document,
+        )
+        if not response.is_success:
+            raise DocumentInsertError(response, request)
+        if silent:
+            return True
+        result: Json = response.body
+        if "_oldRev" in result:
+            result["_old_rev"] = result.pop("_oldRev")
+        return result
+
+    @timed("arango", "update")
+    async def update(
+        self,
+        collection: str,
+        document: Json,
+        check_rev: bool = True,
+        merge: bool = True,
+        keep_none: bool = True,
+        return_new: bool = False,
+        return_old: bool = False,
+        sync: Optional[bool] = None,
+        silent: bool = False,
+    ) -> Json:
+        params = {
+            "keepNull": keep_none,
+            "mergeObjects": merge,
+            "returnNew": return_new,
+            "returnOld": return_old,
+            "ignoreRevs": not check_rev,
+            "silent": silent,
+            "waitForSync": sync,
+        }
+        request, response = await self.connection.request(
+            "patch",
+            f"/_api/document/{document_id(collection, document)}",
+            params={k: v for k, v in params.items() if v is not None},
+            data=document,
+        )
+        if response.status_code == 412:
+            raise DocumentRevisionError(response, request)
+        elif not response.is_success:
+            raise DocumentUpdateError(response, request)
+        if silent:
+            return True
+        result: Json = response.body
+        result["_old_rev"] = result.pop("_oldRev", None)
+        return result
+
+    @timed("arango", "delete")
+    async def delete(
+        self,
+        collection: str,
+        document: Union[str, Json],
+        rev: Optional[str] = None,
+        check_rev: bool = True,
+        ignore_missing: bool = False,
+        return_old: bool = False,
+        sync: Optional[bool] = None,
+        silent: bool = False,
+    ) -> Union[bool, Json]:
+        params = {
+            "returnOld": return_old,
+            "ignoreRevs": not check_rev,
+            "silent": silent,
+            "waitForSync": sync,
+        }
+        request, response = await self.connection.request(
+            "delete",
+            f"/_api/document/{document_id(collection, document)}",
+            params={k: v for k, v in params.items() if v is not None},
+            headers=revision_header(document, rev, check_rev),
+        )
+        if response.error_code == 1202 and ignore_missing:
+            return False
+        elif response.status_code == 412:
+            raise DocumentRevisionError(response, request)
+        elif not response.is_success:
+            raise DocumentDeleteError(response, request)
+        return True if silent else response.body
+
+    @timed("arango", "all")
+    async def all(self, collection: str, skip: Optional[int] = None, limit: Optional[int] = None) -> HttpCursor:
+        bind = {"@collection": collection, "skip": skip or 0, "limit": limit if limit is not None else 2**53}
+        return await self.aql("FOR doc IN @@collection LIMIT @skip, @limit RETURN doc", bind_vars=bind)
+
+    @timed("arango", "keys")
+    async def keys(self, collection: str) -> HttpCursor:
+        return await self.aql("FOR doc IN @@collection RETURN doc._key", bind_vars={"@collection": collection})
+
+    async def count(self, collection: str) -> int:
+        request, response = await self.connection.request("get", f"/_api/collection/{collection}/count")
+        if not response.is_success:
+            raise DocumentCountError(response, request)
+        return response.body["count"]  # type: ignore
+
+    @timed("arango", "insert_many")
+    async def insert_many(
+        self,
+        collection: str,
+        documents: Sequence[Json],
+        return_new: bool = False,
+        sync: Optional[bool] = None,
+        silent: bool = False,
+        overwrite: bool = False,
+        return_old: bool = False,
+    ) -> Union[bool, List[Union[Json, ArangoServerError]]]:
+        params = {"returnNew": return_new, "silent": silent, "overwrite": overwrite, "returnOld": return_old}
+        if sync is not None:
+            params["waitForSync"] = sync
+        request, response = await self.connection.request(
+            "post", f"/_api/document/{collection}", params=params, data=documents
+        )
+        if not response.is_success:
+            raise DocumentInsertError(response, request)
+        return True if silent else bulk_result(request, response, DocumentInsertError)
+
+    @timed("arango", "update_many")
+    async def update_many(
+        self,
+        collection: str,
+        documents: Sequence[Json],
+        check_rev: bool = True,
+        merge: bool = True,
+        keep_none: bool = True,
+        return_new: bool = False,
+        return_old: bool = False,
+        sync: Optional[bool] = None,
+        silent: bool = False,
+    ) -> Union[bool, List[Union[Json, ArangoServerError]]]:
+        params = {
+            "keepNull": keep_none,
+            "mergeObjects": merge,
+            "returnNew": return_new,
+            "returnOld": return_old,
+            "ignoreRevs": not check_rev,
+            "silent": silent,
+        }
+        if sync is not None:
+            params["waitForSync"] = sync
+        request, response = await self.connection.request(
+            "patch", f"/_api/document/{collection}", params=params, data=documents
+        )
+        if not response.is_success:
+            raise DocumentUpdateError(response, request)
+        return True if silent else bulk_result(request, response, DocumentUpdateError)
+
+    @timed("arango", "delete_many")
+    async def delete_many(
+        self,
+        collection: str,
+        documents: Sequence[Json],
+        return_old: bool = False,
+        check_rev: bool = True,
+        sync: Optional[bool] = None,
+        silent: bool = False,
+    ) -> Union[bool, List[Union[Json, ArangoServerError]]]:
+        params = {"returnOld": return_old, "ignoreRevs": not check_rev, "silent": silent}
+        if sync is not None:
+            params["waitForSync"] = sync
+        request, response = await self.connection.request(
+            "delete", f"/_api/document/{collection}", params=params, data=documents
+        )
+        if not response.is_success:
+            raise DocumentDeleteError(response, request)
+        return True if silent else bulk_result(request, response, DocumentDeleteError)
+
+    async def truncate(self, collection: str) -> bool:
+        request, response = await self.connection.request("put", f"/_api/collection/{collection}/truncate")
+        if not response.is_success:
+            raise CollectionTruncateError(response, request)
+        return True
+
+
+class AsyncArangoHttpDB(AsyncArangoHttpAccess, AsyncArangoDB):
+    def __init__(self, db: StandardDatabase, connection: ArangoHttpConnection):
+        super().__init__(db)
+        self.connection = connection
+
+    @asynccontextmanager
+    async def begin_transaction(
+        self,
+        read: Union[str, Sequence[str], None] = None,
+        write: Union[str, Sequence[str], None] = None,
+        exclusive: Union[str, Sequence[str], None] = None,
+        sync: Optional[bool] = None,
+        allow_implicit: Optional[bool] = None,
+        lock_timeout: Optional[int] = None,
+        max_size: Optional[int] = None,
+    ) -> AsyncIterator[AsyncArangoTransactionDB]:
+        collections = {k: v for k, v in {"read": read, "write": write, "exclusive": exclusive}.items() if v is not None}
+        data: Json = {"collections": collections}
+        optional = {
+            "waitForSync": sync,
+            "allowImplicit": allow_implicit,
+            "lockTimeout": lock_timeout,
+            "maxTransactionSize": max_size,
+        }
+        data.update({k: v for k, v in optional.items() if v is not None})
+        request, response = await self.connection.request("post", "/_api/transaction/begin", data=data)
+        if not response.is_success:
+            raise TransactionInitError(response, request)
+        tx_id = response.body["result"]["id"]
+        atx = AsyncArangoHttpTransactionDB(self.db, self.connection.transaction(tx_id), tx_id)
+        try:
+            yield atx
+        except Exception as ex:
+            await atx.abort_transaction()
+            raise ex
+        await atx.commit_transaction()
+
+    async def close(self) -> None:
+        await self.connection.close()
+
+
+class AsyncArangoHttpTransactionDB(AsyncArangoHttpAccess, AsyncArangoTransactionDB):
+    """
+    Stream transaction: all natively implemented methods are executed inside the transaction.
+    Inherited administrative methods run outside the transaction.
+    """
+
+    def __init__(self, db: StandardDatabase, connection: ArangoHttpConnection, transaction_id: str):
+        super().__init__(db)
+        self.connection = connection
+        self.transaction_id = transaction_id
+
+    async def commit_transaction(self) -> bool:
+        request, response = await self.connection.request("put", f"/_api/transaction/{self.transaction_id}")
+        if not response.is_success:
+            raise TransactionCommitError(response, request)
+        return True
+
+    async def abort_transaction(self) -> bool:
+        request, response = await self.connection.request("delete", f"/_api/transaction/{self.transaction_id}")
+        if not response.is_success:
+            raise TransactionAbortError(response, request)
+        return True
@@ -1,11 +1,14 @@
+import asyncio
 import logging
 from abc import ABC
 from argparse import Namespace
+from collections import defaultdict
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone, timedelta
 from time import sleep
-from typing import Dict, List, Tuple
+from typing import Dict, List, Tuple, Optional, Set, AsyncIterator
 
-from arango import ArangoServerError, ArangoClient
+from arango import ArangoServerError, ArangoClient, AQLQueryKillError
 from arango.database import StandardDatabase
 from dateutil.parser import parse
 from requests.exceptions import ConnectionError as ArangoConnectionError
@@ -13,24 +16,32 @@ from requests.exceptions import ConnectionError as ArangoConnectionError
 from resotocore.analytics import AnalyticsEventSender
 from resotocore.db import SystemData
 from resotocore.db.arangodb_extensions import ArangoHTTPClient
-from resotocore.db.async_arangodb import AsyncArangoDB
+from resotocore.db.async_arangodb import AsyncArangoDB, AsyncCursorContext
 from resotocore.db.configdb import config_entity_db, config_validation_entity_db
 from resotocore.db.entitydb import EventEntityDb
-from resotocore.db.graphdb import ArangoGraphDB, GraphDB, EventGraphDB
+from resotocore.db.graphdb import ArangoGraphDB, GraphDB, EventGraphDB, ReadOnlyGraphDB
+from resotocore.db.index_advisor import IndexAdvisorConfig
 from resotocore.db.jobdb import job_db
+from resotocore.db.leasedb import lease_db
 from resotocore.db.modeldb import ModelDb, model_db
 from resotocore.db.runningtaskdb import running_task_db
 from resotocore.db.subscriberdb import subscriber_db
 from resotocore.db.templatedb import template_entity_db
-from resotocore.error import NoSuchGraph, RequiredDependencyMissingError
+from resotocore.error import NoSuchGraph, RequiredDependencyMissingError, HistoryNotAvailable
 from resotocore.model.adjust_node import AdjustNode
 from resotocore.model.typed_model import from_js, to_js
-from resotocore.util import Periodic, utc, shutdown_process, uuid_str
+from resotocore.types import Json
+from resotocore.util import Periodic, utc, shutdown_process, uuid_str, utc_str
 
 log = logging.getLogger(__name__)
 
 
 class DbAccess(ABC):
+    # graph snapshots are stored as graphs with name: <graph>_snapshot_<version>
+    snapshot_infix = "_snapshot_"
+    # the state of a graph at a point in time is stored as graph with name: <graph>_at_<seq of the last change>
+    history_infix = "_at_"
+
     def __init__(
         self,
         arango_database: StandardDatabase,
@@ -44,11 +55,21 @@ class DbAccess(ABC):
         config_validation_entity: str = "config_validation",
         configs_model: str = "configs_model",
         template_entity: str = "templates",
+        lease_name: str = "leases",
+        snapshot_registry: str = "graph_snapshots",
         update_outdated: timedelta = timedelta(hours=4),
+        async_db: Optional[AsyncArangoDB] = None,
+        index_advisor: IndexAdvisorConfig = IndexAdvisorConfig(),
+        graph_snapshots: int = 0,
+        snapshot_grace_period: timedelta = timedelta(minutes=10),
+        graph_history: bool = False,
+        history_retention: timedelta = timedelta(days=30),
+        history_compact_after: timedelta = timedelta(days=2),
+        max_history_graphs: int = 3,
     ):
         self.event_sender = event_sender
         self.database = arango_database
-        self.db = AsyncArangoDB(arango_database)
+        self.db = async_db or AsyncArangoDB(arango_database)
         self.adjust_node = adjust_node
         self.model_db = EventEntityDb(model_db(self.db, model_name), event_sender, model_name)
         self.subscribers_db = EventEntityDb(subscriber_db(self.db, subscriber_name), event_sender, subscriber_name)
@@ -58,9 +79,34 @@ class DbAccess(ABC):
         self.config_validation_entity_db = config_validation_entity_db(self.db, config_validation_entity)
         self.configs_model_db = model_db(self.db, configs_model)
         self.template_entity_db = template_entity_db(self.db, template_entity)
+        self.lease_db = lease_db(self.db, lease_name)
         self.graph_dbs: Dict[str, GraphDB] = {}
         self.update_outdated = update_outdated
         self.cleaner = Periodic("outdated_updates_cleaner", self.check_outdated_updates, timedelta(seconds=60))
+        self.index_advisor = index_advisor
+        self.index_updater = Periodic("advised_index_updater", self.update_advised_indexes, timedelta(hours=1))
+        # number of snapshots to retain per graph. 0 disables snapshots.
+        self.graph_snapshots = graph_snapshots
+        # graph name -> published snapshot versions in ascending order
+        self.snapshot_versions: Dict[str, List[int]] = {}
+        # all snapshots and the last allocated version per graph are registered in this collection
+        self.snapshot_registry = snapshot_registry
+        # an outdated snapshot is deleted only after this period: searches on the snapshot can finish
+        self.snapshot_grace_period = snapshot_grace_period
+        self.snapshot_tasks: Dict[str, asyncio.Task[None]] = {}
+        self.snapshot_pending: Set[str] = set()
+        # snapshots might be published by another resotocore process
+        self.snapshot_refresher = Periodic("snapshot_refresher", self.maintain_snapshots, timedelta(seconds=30))
+        # record the changes of every merge, so the state of a graph at a point in time can be reconstructed
+        self.graph_history = graph_history
+        self.history_retention = history_retention
+        self.history_compact_after = history_compact_after
+        # reconstructed graphs by name, least recently used first: only max_history_graphs unused graphs are kept
+        self.history_graphs: Dict[str, asyncio.Task[GraphDB]] = {}
+        # number of users by reconstructed graph name: a used graph is not evicted
+        self.history_readers: Dict[str, int] = defaultdict(int)
+        self.max_history_graphs = max_history_graphs
+        self.history_maintenance = Periodic("history_maintenance", self.maintain_history, timedelta(hours=1))
 
     async def start(self) -> None:
         await self.model_db.create_update_schema()
@@ -71,14 +117,33 @@ class DbAccess(ABC):
         await self.config_validation_entity_db.create_update_schema()
         await self.configs_model_db.create_update_schema()
         await self.template_entity_db.create_update_schema()
+        await self.lease_db.create_update_schema()
+        if not await self.db.has_collection(self.snapshot_registry):
+            await self.db.create_collection(self.snapshot_registry)
         for graph in self.database.graphs():
+            if self.history_infix in graph["name"]:
+                # reconstructed graphs are not reused between restarts
+                await self.delete_graph(graph["name"])
+                continue
             log.info(f'Found graph: {graph["name"]}')
             db = self.get_graph_db(graph["name"])
             await db.create_update_schema()
+        await self.refresh_snapshots()
         await self.cleaner.start()
+        await self.snapshot_refresher.start()
+        if self.graph_history:
+            await self.history_maintenance.start()
+        if self.index_advisor.auto:
+            await self.index_updater.start()
 
     async def stop(self) -> None:
         await self.cleaner.stop()
+        await self.index_updater.stop()
+        await self.snapshot_refresher.stop()
+        await self.history_maintenance.stop()
+        for task in self.snapshot_tasks.values():
+            task.cancel()
+        await self.db.close()
 
     async def create_graph(self, name: str) -> GraphDB:
         db = self.get_graph_db(name, no_check=True)
@@ -91,6 +156,7 @@ class DbAccess(ABC):
             db.delete_graph(name, drop_collections=True, ignore_missing=True)
             db.delete_collection(f"{name}_in_progress", ignore_missing=True)
             db.delete_view(f"search_{name}", ignore_missing=True)
+            db.delete_collection(f"{name}_history", ignore_missing=True)
             # remove all temp collection names
             for coll in db.collections():
                 if coll["name"].startswith(f"{name}_temp_"):
@@ -98,22 +164,297 @@ class DbAccess(ABC):
             self.graph_dbs.pop(name, None)
 
     async def list_graphs(self) -> List[str]:
-        return [a["name"] for a in self.database.graphs() if not a["name"].endswith("_hs")]
+        return [
+            a["name"]
+            for a in self.database.graphs()
+            if not a["name"].endswith("_hs")
+            and self.snapshot_infix not in a["name"]
+            and self.history_infix not in a["name"]
+        ]
 
     def get_graph_db(self, name: str, no_check: bool = False) -> GraphDB:
+        """
+        Get the graph with given name.
+        A snapshot of the graph can be selected via graph@version or graph@latest.
+        Snapshots are read-only.
+        """
+        if "@" in name:
+            name = self.snapshot_name(*name.split("@", 1))
         if name in self.graph_dbs:
             return self.graph_dbs[name]
         else:
             if not no_check and not self.database.has_graph(name):
                 raise NoSuchGraph(name)
-            graph_db = ArangoGraphDB(self.db, name, self.adjust_node)
-            event_db = EventGraphDB(graph_db, self.event_sender)
+            read_only = self.snapshot_infix in name or self.history_infix in name
+            keep_history = self.graph_history and not read_only
+            graph_db = ArangoGraphDB(self.db, name, self.adjust_node, self.index_advisor, keep_history)
+            event_db = (ReadOnlyGraphDB if read_only else EventGraphDB)(graph_db, self.event_sender)
             self.graph_dbs[name] = event_db
             return event_db
 
+    def snapshot_name(self, graph: str, version: str) -> str:
+        versions = self.snapshot_versions.get(graph, [])
+        if version == "latest" and versions:
+            return f"{graph}{self.snapshot_infix}{versions[-1]}"
+        elif version.isdigit() and int(version) in versions:
+            return f"{graph}{self.snapshot_infix}{int(version)}"
+        else:
+            raise NoSuchGraph(f"{graph}@{version}")
+
+    async def snapshot_entries(self) -> List[Json]:
+        async with AsyncCursorContext(await self.db.all(self.snapshot_registry), None) as cursor:
+            # the registry also holds the last allocated version of every graph
+            return [doc async for doc in cursor if "version" in doc]
+
+    async def refresh_snapshots(self) -> None:
+        versions: Dict[str, List[int]] = {}
+        for doc in await self.snapshot_entries():
+            if doc.get("published") and not doc.get("retired_at"):
+                versions.setdefault(doc["graph"], []).append(doc["version"])
+        self.snapshot_versions = {name: sorted(vs) for name, vs in versions.items()}
+
+    async def maintain_snapshots(self) -> None:
+        await self.refresh_snapshots()
+        await self.delete_retired_snapshots()
+
+    def snapshot_graphs(self, graph: str) -> Dict[int, str]:
+        """
+        All snapshot graphs of given graph by version, including snapshots that are not (yet) published.
+        """
+        result: Dict[int, str] = {}
+        for db_graph in self.database.graphs():
+            name, _, version = db_graph["name"].rpartition(self.snapshot_infix)
+            if name == graph and version.isdigit():
+                result[int(version)] = db_graph["name"]
+        return result
+
+    async def next_snapshot_version(self, graph: str) -> int:
+        """
+        Allocate the next snapshot version of the graph in the registry.
+        Processes that publish snapshots of the same graph at the same time get distinct versions.
+        """
+        # snapshot graphs that exist already are never reused
+        existing = max(self.snapshot_graphs(graph).keys(), default=0)
+        bind = {"key": f"{graph}_version", "graph": graph, "existing": existing}
+        attempt = 0
+        while True:
+            try:
+                with await self.db.aql(self.__next_snapshot_version(), bind_vars=bind) as cursor:
+                    return int(next(cursor))
+            except ArangoServerError as ex:
+                # another process allocated a version at the same time: try again
+                attempt += 1
+                if attempt >= 10:
+                    raise
+                log.debug(f"Could not allocate snapshot version of graph {graph}: {ex}. Retry.")
+                await asyncio.sleep(0.1)
+
+    async def publish_snapshot(self, graph: str) -> int:
+        """
+        Copy the current state of the graph into a new immutable snapshot.
+        The snapshot is registered and becomes visible via graph@latest, once the copy is complete.
+        Only the configured number of snapshots is retained: older ones are retired.
+        :return: the version of the published snapshot.
+        """
+        version = await self.next_snapshot_version(graph)
+        name = f"{graph}{self.snapshot_infix}{version}"
+        await self.db.insert(self.snapshot_registry, {"_key": name, "graph": graph, "version": version})
+        source = ArangoGraphDB(self.db, graph, self.adjust_node)
+        target = ArangoGraphDB(self.db, name, self.adjust_node)
+        await target.create_update_schema()
+        await source.copy_to(target)
+        await self.db.update(self.snapshot_registry, {"_key": name, "published": True})
+        log.info(f"Published snapshot {name} of graph {graph}.")
+        await self.refresh_snapshots()
+        await self.retire_snapshots(graph)
+        return version
+
+    async def retire_snapshots(self, graph: str) -> None:
+        """
+        Retire all snapshots older than the retained ones, including leftovers of copies that never completed.
+        A retired snapshot is not visible any longer and is deleted after the grace period.
+        """
+        retained = self.snapshot_versions.get(graph, [])[-self.graph_snapshots :]  # noqa: E203
+        if not retained:
+            return
+        now = utc_str(utc())
+        registered = {doc["_key"]: doc for doc in await self.snapshot_entries() if doc["graph"] == graph}
+        # a copy might have been interrupted before it was registered
+        names = {**{doc["version"]: key for key, doc in registered.items()}, **self.snapshot_graphs(graph)}
+        for version, name in names.items():
+            doc = registered.get(name)
+            if version >= retained[0] or (doc and doc.get("retired_at")):
+                continue
+            elif doc:
+                await self.db.update(self.snapshot_registry, {"_key": name, "retired_at": now})
+            else:
+                retired = {"_key": name, "graph": graph, "version": version, "retired_at": now}
+                await self.db.insert(self.snapshot_registry, retired)
+        self.snapshot_versions[graph] = retained
+
+    async def delete_retired_snapshots(self) -> None:
+        deadline = utc_str(utc() - self.snapshot_grace_period)
+        for doc in await self.snapshot_entries():
+            retired_at = doc.get("retired_at")
+            if retired_at and retired_at <= deadline:
+                log.info(f"Delete retired snapshot {doc['_key']}.")
+                await self.delete_graph(doc["_key"])
+                await self.db.delete(self.snapshot_registry, doc["_key"], ignore_missing=True)
+
+    async def graph_at(self, graph: str, at: datetime) -> GraphDB:
+        """
+        Get the state of the graph at the given point in time.
+        The state is reconstructed from the current state of the graph and its recorded history.
+        The resulting graph is read-only.
+        Note: the graph might be evicted as soon as it is not used. Use use_graph_at to prevent this.
+        """
+        async with self.use_graph_at(graph, at) as db:
+            return db
+
+    @asynccontextmanager
+    async def use_graph_at(self, graph: str, at: datetime) -> AsyncIterator[GraphDB]:
+        """
+        Use the state of the graph at the given point in time: the graph is not evicted, while it is used.
+        Changes older than history_compact_after are compacted per day:
+        for such a point in time, the state at the end of the day is used.
+        """
+        if not self.graph_history or "@" in graph:
+            raise HistoryNotAvailable(graph)
+        now = utc()
+        if at < now - self.history_retention:
+            raise HistoryNotAvailable(graph, f"history is only retained for {self.history_retention}")
+        if at < now - self.history_compact_after:
+            end_of_day = at.astimezone(timezone.utc).replace(hour=23, minute=59, second=59, microsecond=999999)
+            at = min(end_of_day, now)
+        # a graph with this name needs to exist
+        self.get_graph_db(graph)
+        source = ArangoGraphDB(self.db, graph, self.adjust_node, keep_history=True)
+        # all points in time between two changes share the same state: the graph is named after the last change
+        at_ns = (at - datetime.fromtimestamp(0, timezone.utc)) // timedelta(microseconds=1) * 1000
+        seq = await source.history_seq_at(at_ns)
+        name = f"{graph}{self.history_infix}{seq}"
+        self.history_readers[name] += 1
+        try:
+            yield await self.__reconstructed(source, name, seq)
+        finally:
+            self.history_readers[name] -= 1
+            if self.history_readers[name] <= 0:
+                self.history_readers.pop(name, None)
+            await self.__evict_history_graphs()
+
+    async def __reconstructed(self, source: ArangoGraphDB, name: str, seq: int) -> GraphDB:
+        async def reconstruct() -> GraphDB:
+            target = ArangoGraphDB(self.db, name, self.adjust_node)
+            try:
+                await target.create_update_schema()
+                await source.copy_to(target)
+                await source.revert_history(target, seq)
+            except BaseException:
+                # failed or cancelled: do not leave a partially reconstructed graph behind
+                await self.delete_graph(name)
+                raise
+            log.info(f"Reconstructed graph {source.name} after change {seq} as {name}.")
+            return self.get_graph_db(name)
+
+        task = self.history_graphs.pop(name, None) or asyncio.create_task(reconstruct())
+        # the graph is the most recently used one
+        self.history_graphs[name] = task
+        try:
+            # the reconstruction is shared by all users: a cancelled user does not cancel the reconstruction
+            return await asyncio.shield(task)
+        except Exception:
+            # do not keep a failed reconstruction
+            if self.history_graphs.get(name) is task:
+                self.history_graphs.pop(name, None)
+            raise
+
+    async def __evict_history_graphs(self) -> None:
+        unused = [name for name in self.history_graphs if name not in self.history_readers]
+        for name in unused[: len(self.history_graphs) - self.max_history_graphs]:
+            task = self.history_graphs.pop(name)
+            if task.done():
+                await self.delete_graph(name)
+            else:
+                # the reconstruction deletes the partially reconstructed graph
+                task.cancel()
+
+    async def maintain_history(self) -> None:
+        now = utc()
+        for graph in await self.list_graphs():
+            db = ArangoGraphDB(self.db, graph, self.adjust_node, keep_history=True)
+            if not await self.db.has_collection(db.history):
+                continue
+            try:
+                deleted = await db.delete_history(utc_str(now - self.history_retention))
+                compacted = await db.compact_history(utc_str(now - self.history_compact_after))
+                log.info(f"History of graph {graph}: {deleted} entries deleted, {compacted} entries compacted.")
+            except Exception as ex:
+                log.warning(f"Could not maintain the history of graph {graph}: {ex}")
+
+    def publish_snapshot_in_background(self, graph: str) -> None:
+        """
+        Publish a snapshot of the graph, if snapshots are enabled.
+        There is at most one snapshot in progress per graph: requests during a copy are coalesced
+        and lead to one additional snapshot after the current one is done.
+        """
+        if self.graph_snapshots <= 0 or self.snapshot_infix in graph:
+            return
+        running = self.snapshot_tasks.get(graph)
+        if running is not None and not running.done():
+            self.snapshot_pending.add(graph)
+            return
+
+        async def publish() -> None:
+            while True:
+                self.snapshot_pending.discard(graph)
+                try:
+                    await self.publish_snapshot(graph)
+                except Exception as ex:
+                    log.warning(f"Could not publish snapshot of graph {graph}: {ex}")
+                if graph not in self.snapshot_pending:
+                    break
+
+        self.snapshot_tasks[graph] = asyncio.create_task(publish())
+
     def get_model_db(self) -> ModelDb:
         return self.model_db
 
+    def __next_snapshot_version(self) -> str:
+        return f"""
+        UPSERT {{_key: @key}}
+        INSERT {{_key: @key, graph: @graph, last_version: @existing + 1}}
+        UPDATE {{last_version: MAX([OLD.last_version, @existing]) + 1}}
+        IN `{self.snapshot_registry}`
+        RETURN NEW.last_version
+        """
+
+    async def running_queries(self) -> List[Json]:
+        """
+        List all queries currently running in the database.
+        Searches are tagged with a comment: /* search:<tag> */
+        """
+        props = ["id", "query", "started", "run_time", "state", "stream"]
+        return [{p: query.get(p) for p in props} for query in await self.db.queries()]
+
+    async def kill_query(self, query_id: str) -> bool:
+        """
+        Kill the running query with given id.
+        :return: True if the query was killed, False if there is no running query with this id.
+        """
+        try:
+            return await self.db.kill(query_id)
+        except AQLQueryKillError as ex:
+            if ex.http_code == 404:
+                return False
+            raise
+
+    async def update_advised_indexes(self) -> None:
+        for db in self.graph_dbs.values():
+            try:
+                await db.advised_index_changes(apply=True)
+            except Exception as ex:
+                log.warning(f"Could not update advised indexes of graph {db.name}: {ex}")
+
     async def check_outdated_updates(self) -> None:
         now = datetime.now(timezone.utc)
         for db in self.graph_dbs.values():
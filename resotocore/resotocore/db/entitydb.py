@@ -7,7 +7,7 @@ from arango import DocumentUpdateError, DocumentRevisionError
 from jsons import JsonsError
 
 from resotocore.analytics import AnalyticsEventSender
-from resotocore.db.async_arangodb import AsyncArangoDB
+from resotocore.db.async_arangodb import AsyncArangoDB, AsyncCursorContext
 from resotocore.error import OptimisticLockingFailed
 from resotocore.model.typed_model import from_js, type_fqn, to_js
 from resotocore.types import Json
@@ -42,6 +42,10 @@ class EntityDb(ABC, Generic[T]):
     async def delete(self, key_or_object: Union[str, T]) -> None:
         pass
 
+    @abstractmethod
+    async def delete_many(self, keys: List[str]) -> None:
+        pass
+
     @abstractmethod
     async def create_update_schema(self) -> None:
         pass
@@ -59,13 +63,13 @@ class ArangoEntityDb(EntityDb[T], ABC):
         self.key_of = key_fn
 
     async def keys(self) -> AsyncGenerator[str, None]:
-        with await self.db.keys(self.collection_name) as cursor:
-            for element in cursor:
+        async with AsyncCursorContext(await self.db.keys(self.collection_name), None) as cursor:
+            async for element in cursor:
                 yield element
 
     async def all(self) -> AsyncGenerator[T, None]:
-        with await self.db.all(self.collection_name) as cursor:
-            for element in cursor:
+        async with AsyncCursorContext(await self.db.all(self.collection_name), None) as cursor:
+            async for element in cursor:
                 try:
                     yield from_js(element, self.t_type)
                 except JsonsError:
@@ -100,6 +104,10 @@ class ArangoEntityDb(EntityDb[T], ABC):
         key = key_or_object if isinstance(key_or_object, str) else self.key_of(key_or_object)
         await self.db.delete(self.collection_name, key, ignore_missing=True)
 
+    async def delete_many(self, keys: List[str]) -> None:
+        # missing documents are reported per document and are ignored
+        await self.db.delete_many(self.collection_name, [{"_key": key} for key in keys], check_rev=False)
+
     async def create_update_schema(self) -> None:
         name = self.collection_name
         db = self.db
@@ -144,6 +152,10 @@ class EventEntityDb(EntityDb[T]):
         await self.db.delete(key_or_object)
         await self.event_sender.core_event(f"{self.entity_name}-deleted")
 
+    async def delete_many(self, keys: List[str]) -> None:
+        await self.db.delete_many(keys)
+        await self.event_sender.core_event(f"{self.entity_name}-deleted-many", count=len(keys))
+
     async def create_update_schema(self) -> None:
         return await self.db.create_update_schema()
 
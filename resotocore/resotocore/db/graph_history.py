@@ -0,0 +1,163 @@
+from typing import Optional, List, Tuple, Any, Dict, Iterable
+
+from resotocore.model.graph_access import Section
+from resotocore.types import Json
+
+# Every merge of a graph can record the changes of nodes and edges as history entries.
+# A history entry stores the reverse patch of a change: the values of all changed properties before the change.
+# The current state of the graph is the base: the state at a given point in time is reconstructed,
+# by reverting all changes that happened after this point in time - latest change first.
+#
+# Node entries have this form:
+# - action: one of node_created, node_updated, node_deleted
+# - before: None, if the node did not exist before the change.
+#           Otherwise, a patch of the form path -> value with the value before the change.
+#           A path is either a top level property (e.g. kinds) or a property of a section (e.g. reported.name).
+#           A value of None means, that the property did not exist.
+# - full: true, if before is the complete document (the node was deleted) and not a patch.
+#
+# Edge entries have the action edge_created or edge_deleted and define edge_type, from and to.
+#
+# All entries define changed_at (the time of the change, in seconds) and seq.
+# seq is the time of the merge in nanoseconds since epoch and strictly increasing per merge:
+# all entries of one merge share the same seq, entries are ordered by seq.
+
+NodeCreated = "node_created"
+NodeUpdated = "node_updated"
+NodeDeleted = "node_deleted"
+EdgeCreated = "edge_created"
+EdgeDeleted = "edge_deleted"
+
+# properties maintained by the database, which are not part of the history
+db_properties = {"_id", "_rev"}
+
+
+def node_diff(old: Json, update: Json) -> Json:
+    """
+    Compute the reverse patch of an update.
+    Note: the update replaces the given top level properties and keeps all others.
+    :param old: the document before the update.
+    :param update: the top level properties that are replaced.
+    :return: the patch that reverts the update: path -> value before the update.
+    """
+    before: Json = {}
+    for key, value in update.items():
+        old_value = old.get(key)
+        if key in Section.all and isinstance(value, dict) and isinstance(old_value, dict):
+            for prop in value.keys() | old_value.keys():
+                if value.get(prop) != old_value.get(prop):
+                    before[f"{key}.{prop}"] = old_value.get(prop)
+        elif value != old_value:
+            before[key] = old_value
+    return before
+
+
+def without_db_properties(doc: Json) -> Json:
+    return {k: v for k, v in doc.items() if k not in db_properties}
+
+
+def without_key(doc: Json) -> Json:
+    return {k: v for k, v in doc.items() if k not in db_properties and k != "_key"}
+
+
+def combine_changes(earlier: Json, later: Json) -> Json:
+    """
+    Combine two consecutive changes of the same node into one change.
+    Reverting the combined change has the same effect as reverting the later and then the earlier change.
+    """
+    earlier_before: Optional[Json] = earlier.get("before")
+    later_before: Optional[Json] = later.get("before")
+    if earlier_before is None or earlier.get("full"):
+        before, full = earlier_before, bool(earlier.get("full"))
+    else:
+        # a top level property of the earlier change replaces all properties of the later change below it
+        kept = {p: v for p, v in (later_before or {}).items() if p.split(".", 1)[0] not in earlier_before}
+        before, full = {**kept, **earlier_before}, bool(later.get("full"))
+    exists = later["action"] != NodeDeleted
+    action = NodeCreated if before is None and exists else (NodeUpdated if exists else NodeDeleted)
+    return {**later, "action": action, "before": before, "full": full, "before_hash": earlier.get("before_hash")}
+
+
+def is_noop(change: Json) -> bool:
+    """
+    True, if the node neither existed before nor after the change.
+    """
+    return change.get("before") is None and change["action"] == NodeDeleted
+
+
+def revert_node(doc: Optional[Json], change: Json) -> Optional[Json]:
+    """
+    Revert the change on the given document.
+    :param doc: the document after the change or None, if the node does not exist.
+    :param change: the history entry of the change.
+    :return: the document before the change or None, if the node did not exist.
+    """
+    before: Optional[Json] = change.get("before")
+    if before is None:
+        return None
+    result: Json = {}
+    if doc is not None and not change.get("full"):
+        result = {k: dict(v) if isinstance(v, dict) else v for k, v in without_db_properties(doc).items()}
+    # top level properties first: properties of a section are applied on top
+    for path, value in sorted(before.items(), key=lambda kv: "." in kv[0]):
+        key, _, prop = path.partition(".")
+        if prop:
+            section = result.get(key)
+            if not isinstance(section, dict):
+                section = result[key] = {}
+            if value is None:
+                section.pop(prop, None)
+            else:
+                section[prop] = value
+        elif value is None:
+            result.pop(key, None)
+        else:
+            result[key] = value
+    return result
+
+
+def compact_changes(changes: List[Json]) -> List[Json]:
+    """
+    Compact all changes of one node or edge into at most one change.
+    :param changes: all changes of one node or one edge ordered by seq.
+    :return: the compacted change, or an empty list, if the changes cancel each other out.
+    """
+    if not changes:
+        return []
+    elif changes[0].get("edge_type"):
+        # edges are created and deleted alternately: an even number of changes cancels out
+        return [changes[-1]] if len(changes) % 2 else []
+    else:
+        combined = changes[0]
+        for change in changes[1:]:
+            combined = combine_changes(combined, change)
+        return [] if is_noop(combined) else [combined]
+
+
+def add_revert_change(nodes: Dict[str, Json], edges: Dict[Tuple[str, str], Json], change: Json) -> None:
+    """
+    Add the next change to revert to the combined changes.
+    :param nodes: the combined change by node id.
+    :param edges: the earliest change by edge type and edge id.
+    :param change: the change to add. Changes have to be added ordered by seq.
+    """
+    edge_type: Any = change.get("edge_type")
+    if edge_type:
+        # reverting the earliest change of an edge restores its state
+        edges.setdefault((edge_type, change["id"]), change)
+    else:
+        existing = nodes.get(change["id"])
+        nodes[change["id"]] = combine_changes(existing, change) if existing else change
+
+
+def revert_changes(changes: Iterable[Json]) -> Tuple[Dict[str, Json], Dict[Tuple[str, str], Json]]:
+    """
+    Combine all changes that need to be reverted, so every node and edge is reverted only once.
+    :param changes: all changes to revert ordered by seq.
+    :return: the combined change by node id and the earliest change by edge type and edge id.
+    """
+    nodes: Dict[str, Json] = {}
+    edges: Dict[Tuple[str, str], Json] = {}
+    for change in changes:
+        add_revert_change(nodes, edges, change)
+    return nodes, edges
@@ -6,9 +6,11 @@ from collections import defaultdict
 from datetime import timedelta
 from functools import partial
 from numbers import Number
-from typing import Optional, Callable, AsyncGenerator, Any, Iterable, Dict, List, Tuple, cast
+from time import perf_counter, time_ns
+from typing import Optional, Callable, AsyncGenerator, AsyncIterator, Any, Dict, List, Tuple, cast
 
-from arango import AnalyzerGetError
+from aiostream import stream
+from arango import AnalyzerGetError, AQLQueryExecuteError
 from arango.collection import VertexCollection, StandardCollection, EdgeCollection
 from arango.graph import Graph
 from arango.typings import Json
@@ -17,20 +19,41 @@ from networkx import MultiDiGraph
 from resotocore.analytics import CoreEvent, AnalyticsEventSender
 from resotocore.db import arango_query, EstimatedSearchCost
 from resotocore.db.arango_query import fulltext_delimiter
+from resotocore.async_extensions import run_async
 from resotocore.db.async_arangodb import (
     AsyncArangoDB,
     AsyncArangoTransactionDB,
     AsyncArangoDBBase,
     AsyncCursorContext,
 )
+from resotocore.db import graph_history
+from resotocore.db.graph_history import NodeCreated, NodeUpdated, NodeDeleted, EdgeCreated, EdgeDeleted
+from resotocore.db.index_advisor import IndexAdvisor, IndexAdvisorConfig, IndexRecommendation
 from resotocore.db.model import GraphUpdate, QueryModel
-from resotocore.error import InvalidBatchUpdate, ConflictingChangeInProgress, NoSuchChangeError, OptimisticLockingFailed
+from resotocore.error import (
+    InvalidBatchUpdate,
+    ConflictingChangeInProgress,
+    HistoryNotAvailable,
+    NoSuchChangeError,
+    OptimisticLockingFailed,
+    QueryTookToLongError,
+    ReadOnlyGraph,
+)
 from resotocore.model.adjust_node import AdjustNode
 from resotocore.model.graph_access import GraphAccess, GraphBuilder, EdgeType, Section
 from resotocore.model.model import Model, ComplexKind, TransformKind
 from resotocore.model.resolve_in_graph import NodePath, GraphResolver
 from resotocore.query.model import Query
-from resotocore.util import first, value_in_path_get, utc_str, uuid_str, value_in_path, json_hash, set_value_in_path
+from resotocore.util import (
+    first,
+    value_in_path_get,
+    utc_str,
+    uuid_str,
+    value_in_path,
+    json_hash,
+    set_value_in_path,
+    utc,
+)
 
 log = logging.getLogger(__name__)
 
@@ -110,13 +133,40 @@ class GraphDB(ABC):
         pass
 
     @abstractmethod
-    async def search_aggregation(self, query: QueryModel) -> AsyncCursorContext:
+    async def search_aggregation(self, query: QueryModel, timeout: Optional[timedelta] = None) -> AsyncCursorContext:
         pass
 
     @abstractmethod
     async def explain(self, query: QueryModel, with_edges: bool = False) -> EstimatedSearchCost:
         pass
 
+    @abstractmethod
+    async def search_history(
+        self,
+        node_id: Optional[str] = None,
+        change: Optional[str] = None,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncCursorContext:
+        """
+        Search the recorded changes of this graph, latest change first.
+        :param node_id: only changes of the node with this id.
+        :param change: only changes of the merge with this change id.
+        :param after: only changes after this timestamp.
+        :param before: only changes before this timestamp.
+        :param limit: the maximum number of changes to return.
+        """
+
+    @property
+    @abstractmethod
+    def index_advisor(self) -> IndexAdvisor:
+        pass
+
+    @abstractmethod
+    async def advised_index_changes(self, apply: bool = False) -> Tuple[List[IndexRecommendation], List[Json]]:
+        pass
+
     @abstractmethod
     async def wipe(self) -> None:
         pass
@@ -131,18 +181,35 @@ class GraphDB(ABC):
 
 
 class ArangoGraphDB(GraphDB):
-    def __init__(self, db: AsyncArangoDB, name: str, adjust_node: AdjustNode) -> None:
+    def __init__(
+        self,
+        db: AsyncArangoDB,
+        name: str,
+        adjust_node: AdjustNode,
+        index_advisor_config: IndexAdvisorConfig = IndexAdvisorConfig(),
+        keep_history: bool = False,
+    ) -> None:
         super().__init__()
         self._name = name
         self.node_adjuster = adjust_node
         self.vertex_name = name
         self.in_progress = f"{name}_in_progress"
+        self.history = f"{name}_history"
+        # record the changes of every merge in the history collection
+        self.keep_history = keep_history
+        # sequence number of the last recorded history entry
+        self.last_history_seq = 0
         self.db = db
+        self._index_advisor = IndexAdvisor(index_advisor_config)
 
     @property
     def name(self) -> str:
         return self._name
 
+    @property
+    def index_advisor(self) -> IndexAdvisor:
+        return self._index_advisor
+
     def edge_collection(self, edge_type: str) -> str:
         return f"{self.name}_{edge_type}"
 
@@ -155,10 +222,14 @@ class ArangoGraphDB(GraphDB):
         graph.add_node(node_id, data)
         graph.add_edge(under_node_id, node_id, EdgeType.default)
         access = GraphAccess(graph.graph, node_id, {under_node_id})
-        _, node_inserts, _, _ = self.prepare_nodes(access, [], model)
-        _, edge_inserts, _ = self.prepare_edges(access, [], EdgeType.default)
+        _, node_inserts, _, _ = await self.prepare_nodes(access, stream.empty(), model)
+        _, edge_inserts, _ = await self.prepare_edges(access, stream.empty(), EdgeType.default)
         assert len(node_inserts) == 1
         assert len(edge_inserts) == 1
+        # the new node inherits all ancestors of its parent
+        parent = await self.db.get(self.vertex_name, under_node_id)
+        if parent:
+            node_inserts[0]["ancestor_ids"] = [under_node_id, *parent.get("ancestor_ids", [])]
         edge_collection = self.edge_collection(EdgeType.default)
         async with self.db.begin_transaction(write=[self.vertex_name, edge_collection]) as tx:
             result: Json = await tx.insert(self.vertex_name, node_inserts[0], return_new=True)
@@ -293,8 +364,8 @@ class ArangoGraphDB(GraphDB):
     ) -> AsyncGenerator[Json, None]:
         bind_var = {"node_ids": node_ids}
         trafo = self.document_to_instance_fn(model)
-        with await db.aql(query=self.query_delete_desired_metadata_many(section), bind_vars=bind_var) as cursor:
-            for element in cursor:
+        async with await db.aql_cursor(self.query_delete_desired_metadata_many(section), bind_vars=bind_var) as cursor:
+            async for element in cursor:
                 yield trafo(element)
 
     async def update_nodes_section_with(
@@ -302,8 +373,8 @@ class ArangoGraphDB(GraphDB):
     ) -> AsyncGenerator[Json, None]:
         bind_var = {"patch": patch, "node_ids": node_ids}
         trafo = self.document_to_instance_fn(model)
-        with await db.aql(query=self.query_update_desired_metadata_many(section), bind_vars=bind_var) as cursor:
-            for element in cursor:
+        async with await db.aql_cursor(self.query_update_desired_metadata_many(section), bind_vars=bind_var) as cursor:
+            async for element in cursor:
                 yield trafo(element)
 
     async def delete_node(self, node_id: str) -> None:
@@ -330,13 +401,15 @@ class ArangoGraphDB(GraphDB):
     ) -> AsyncCursorContext:
         assert query.query.aggregate is None, "Given query is an aggregation function. Use the appropriate endpoint!"
         q_string, bind = await self.to_query(query)
-        return await self.db.aql_cursor(
-            query=q_string,
+        self.index_advisor.record(query)
+        return await self.search_cursor(
+            query,
+            q_string,
+            bind,
+            timeout,
             trafo=self.document_to_instance_fn(query.model, query.query),
             count=with_count,
-            bind_vars=bind,
             batch_size=10000,
-            ttl=cast(Number, int(timeout.total_seconds())) if timeout else None,
         )
 
     async def search_graph_gen(
@@ -344,13 +417,15 @@ class ArangoGraphDB(GraphDB):
     ) -> AsyncCursorContext:
         assert query.query.aggregate is None, "Given query is an aggregation function. Use the appropriate endpoint!"
         query_string, bind = await self.to_query(query, with_edges=True)
-        return await self.db.aql_cursor(
-            query=query_string,
+        self.index_advisor.record(query)
+        return await self.search_cursor(
+            query,
+            query_string,
+            bind,
+            timeout,
             trafo=self.document_to_instance_fn(query.model, query.query),
-            bind_vars=bind,
             count=with_count,
             batch_size=10000,
-            ttl=cast(Number, int(timeout.total_seconds())) if timeout else None,
         )
 
     async def search_graph(self, query: QueryModel) -> MultiDiGraph:
@@ -364,49 +439,142 @@ class ArangoGraphDB(GraphDB):
                     graph.add_node(item["id"], **item)
             return graph
 
-    async def search_aggregation(self, query: QueryModel) -> AsyncCursorContext:
+    async def search_aggregation(self, query: QueryModel, timeout: Optional[timedelta] = None) -> AsyncCursorContext:
         q_string, bind = await self.to_query(query)
         assert query.query.aggregate is not None, "Given query has no aggregation section"
-        return await self.db.aql_cursor(query=q_string, bind_vars=bind)
+        self.index_advisor.record(query)
+        return await self.search_cursor(query, q_string, bind, timeout)
+
+    async def search_cursor(
+        self, query: QueryModel, q_string: str, bind: Json, timeout: Optional[timedelta] = None, **kwargs: Any
+    ) -> AsyncCursorContext:
+        if timeout:
+            # the database kills the query, once the deadline is exceeded
+            kwargs["max_runtime"] = cast(Number, timeout.total_seconds())
+            kwargs["ttl"] = cast(Number, int(timeout.total_seconds()))
+        # the tag is used to find the query in the list of running queries
+        tag = uuid_str()
+        tagged = f"/* search:{tag} */ {q_string}"
+        profile = query.profile
+        try:
+            if profile is None:
+                return await self.db.aql_cursor(query=tagged, bind_vars=bind, **kwargs)
+            # the plan is only required to resolve node types and used indexes
+            profile.add_plan(await self.db.explain(query=q_string, bind_vars=bind))
+            start = perf_counter()
+            # profile level 2 reports execution statistics for every node of the plan
+            context = await self.db.aql_cursor(query=tagged, bind_vars=bind, profile=2, **kwargs)
+            profile.fetch += perf_counter() - start
+            context.profile = profile
+            return context
+        except asyncio.CancelledError:
+            # the caller is not interested in the result any longer (e.g. client disconnect).
+            # The query would run to completion on the server side, if it is not killed explicitly.
+            await self.kill_tagged_query(tag)
+            raise
+        except AQLQueryExecuteError as ex:
+            if ex.error_code == 1500:  # query killed
+                raise QueryTookToLongError("Search has been killed: it exceeded its deadline or was killed.") from ex
+            raise
+
+    async def kill_tagged_query(self, tag: str) -> None:
+        try:
+            for query in await self.db.queries():
+                if tag in query.get("query", ""):
+                    log.info(f"Kill running query {query['id']} with tag {tag}.")
+                    await self.db.kill(query["id"])
+        except Exception as ex:
+            log.warning(f"Could not kill query with tag {tag}: {ex}")
 
     async def explain(self, query: QueryModel, with_edges: bool = False) -> EstimatedSearchCost:
         return await arango_query.query_cost(self, query, with_edges)
 
+    async def advised_index_changes(self, apply: bool = False) -> Tuple[List[IndexRecommendation], List[Json]]:
+        nodes = self.db.collection(self.vertex_name)
+        create, drop = self.index_advisor.index_changes(await run_async(nodes.indexes))
+        if apply:
+            for idx in drop:
+                log.info(f"Drop advised index {idx['name']} on {self.vertex_name}.")
+                await run_async(nodes.delete_index, idx["name"])
+            for rec in create:
+                log.info(f"Create advised index {rec.name} on {self.vertex_name}: fields={rec.fields}.")
+                await run_async(
+                    nodes.add_persistent_index, rec.fields, sparse=rec.sparse, name=rec.name, in_background=True
+                )
+            self.index_advisor.sync_indexes(await run_async(nodes.indexes))
+            # start a new window: recent usage should outweigh old usage
+            self.index_advisor.decay()
+        return create, drop
+
     async def wipe(self) -> None:
         await self.db.truncate(self.vertex_name)
         for edge_type in EdgeType.all:
             await self.db.truncate(self.edge_collection(edge_type))
         await self.insert_genesis_data()
 
+    async def copy_to(self, target: "ArangoGraphDB") -> None:
+        """
+        Copy all nodes and edges of this graph into the target graph.
+        The copy is done in a single query: the target reflects one consistent state of this graph.
+        """
+        await self.db.aql(self.query_copy_graph(target), bind_vars={"prefix": f"{target.vertex_name}/"})
+
     @staticmethod
     def document_to_instance_fn(model: Model, query: Optional[Query] = None) -> Callable[[Json], Optional[Json]]:
-        def props(doc: Json, result: Json, definition: Iterable[str]) -> None:
-            for prop in definition:
-                if prop in doc and doc[prop]:
-                    result[prop] = doc[prop]
-
-        def synth_props(doc: Json, result: Json) -> None:
-            reported_in = doc[Section.reported]
-            kind = model.get(reported_in)
-            if isinstance(kind, ComplexKind):
-                reported_out = result[Section.reported]
-                for synth in kind.synthetic_props():
-                    if isinstance(synth.kind, TransformKind) and synth.prop.synthetic:
-                        source_value = value_in_path(reported_in, synth.prop.synthetic.path)
-                        if source_value:
-                            reported_out[synth.prop.name] = synth.kind.transform(source_value)
+        """
+        Create a function that renders a database document into the json representation of a node.
+        The renderer is specialized for the given model and query:
+        - synthetic properties are resolved once per kind and not for every document.
+        - merge results are only rendered, if the query defines merge queries.
+        """
+        # synthetic properties by kind name: (property name, function to read the source value, transform kind)
+        synthetic_by_kind: Dict[Optional[str], List[Tuple[str, Callable[[Json], Any], TransformKind]]] = {}
+        reported, desired, metadata = Section.reported, Section.desired, Section.metadata
+        content = Section.content_ordered
+        lookup = Section.lookup_sections_ordered
+
+        def value_fn(path: List[str]) -> Callable[[Json], Any]:
+            if len(path) == 1:
+                name = path[0]
+                return lambda js: js.get(name)
+            else:
+                return partial(value_in_path, path_or_name=path)
+
+        def synthetic_props(kind_name: Optional[str]) -> List[Tuple[str, Callable[[Json], Any], TransformKind]]:
+            synth = synthetic_by_kind.get(kind_name)
+            if synth is None:
+                kind = model.get(kind_name) if kind_name else None
+                synth = [
+                    (sp.prop.name, value_fn(sp.prop.synthetic.path), sp.kind)
+                    for sp in (kind.synthetic_props() if isinstance(kind, ComplexKind) else [])
+                    if isinstance(sp.kind, TransformKind) and sp.prop.synthetic
+                ]
+                synthetic_by_kind[kind_name] = synth
+            return synth
 
         def render_prop(doc: Json, lookup_props: bool) -> Json:
-            if Section.reported in doc or Section.desired in doc or Section.metadata in doc:
+            if reported in doc or desired in doc or metadata in doc:
                 # side note: the dictionary remembers insertion order
                 # this order is also used to render the output (e.g. yaml property order)
                 result = {"id": doc["_key"], "type": "node"}
                 if "_rev" in doc:
                     result["revision"] = doc["_rev"]
-                props(doc, result, Section.content)
+                for section in content:
+                    value = doc.get(section)
+                    if value:
+                        result[section] = value
                 if lookup_props:
-                    props(doc, result, Section.lookup_sections_ordered)
-                synth_props(doc, result)
+                    for section in lookup:
+                        value = doc.get(section)
+                        if value:
+                            result[section] = value
+                reported_js = doc.get(reported)
+                if reported_js:
+                    # the reported section is not copied: synthetic properties are added to the document directly
+                    for name, source_value_of, transform_kind in synthetic_props(reported_js.get("kind")):
+                        source_value = source_value_of(reported_js)
+                        if source_value:
+                            reported_js[name] = transform_kind.transform(source_value)
                 return result
             else:
                 return doc
@@ -423,17 +591,21 @@ class ArangoGraphDB(GraphDB):
                         set_value_in_path(rendered, mq.name, result)
             return result
 
+        def node(doc: Json) -> Optional[Json]:
+            return render_prop(doc, True)
+
+        if query is None or not query.merge_query_by_name:
+            return node
+        merge_query = query
+
         def merge_results(doc: Json) -> Optional[Json]:
-            rendered = render_prop(doc, True)
-            if query:
-                render_merge_results(doc, rendered, query)
-            return rendered
+            return render_merge_results(doc, render_prop(doc, True), merge_query)
 
         return merge_results
 
     async def list_in_progress_updates(self) -> List[Json]:
-        with await self.db.aql(self.query_active_updates()) as cursor:
-            return list(cursor)
+        async with await self.db.aql_cursor(self.query_active_updates()) as cursor:
+            return [update async for update in cursor]
 
     async def get_tmp_collection(self, change_id: str, create: bool = True) -> StandardCollection:
         id_part = str(uuid.uuid5(uuid.NAMESPACE_DNS, change_id)).replace("-", "")
@@ -460,6 +632,11 @@ class ArangoGraphDB(GraphDB):
             f"remove e.data in {self.edge_collection(a)}"
             for a in EdgeType.all
         ]
+        history_inserts = (
+            [f'for e in {temp_name} filter e.action=="history" insert e.data in {self.history}']
+            if self.keep_history
+            else []
+        )
         updates = "\n".join(
             map(
                 lambda aql: f"db._createStatement({{ query: `{aql}` }}).execute();",
@@ -472,6 +649,7 @@ class ArangoGraphDB(GraphDB):
                 ]
                 + edge_inserts
                 + edge_deletes
+                + history_inserts
                 + [
                     f'remove {{_key: "{change_key}"}} in {self.in_progress}',
                 ],
@@ -480,7 +658,9 @@ class ArangoGraphDB(GraphDB):
         await self.db.execute_transaction(
             f'function () {{\nvar db=require("@arangodb").db;\n{updates}\n}}',
             read=[temp_name],
-            write=[self.edge_collection(a) for a in EdgeType.all] + [self.vertex_name, self.in_progress],
+            write=[self.edge_collection(a) for a in EdgeType.all]
+            + [self.vertex_name, self.in_progress]
+            + ([self.history] if self.keep_history else []),
         )
         log.info(f"Move temp->proper data: change_id={change_id} done.")
 
@@ -524,8 +704,8 @@ class ArangoGraphDB(GraphDB):
         # adjuster has the option to manipulate the resulting json
         return self.node_adjuster.adjust(json)
 
-    def prepare_nodes(
-        self, access: GraphAccess, node_cursor: Iterable, model: Model  # type: ignore # pypy
+    async def prepare_nodes(
+        self, access: GraphAccess, node_cursor: AsyncIterator[Json], model: Model
     ) -> Tuple[GraphUpdate, List[Json], List[Json], List[Json]]:
         log.info(f"Prepare nodes for subgraph {access.root()}")
         info = GraphUpdate()
@@ -533,7 +713,7 @@ class ArangoGraphDB(GraphDB):
         resource_updates: List[Json] = []
         resource_deletes: List[Json] = []
 
-        optional_properties = [*Section.all_ordered, "refs", "kinds", "flat", "hash"]
+        optional_properties = [*Section.all_ordered, "refs", "kinds", "ancestor_ids", "flat", "hash"]
 
         def insert_node(node: Json) -> None:
             elem = self.adjust_node(model, node, access.at_json)
@@ -568,15 +748,15 @@ class ArangoGraphDB(GraphDB):
                 resource_updates.append(js)
                 info.nodes_updated += 1
 
-        for doc in node_cursor:
+        async for doc in node_cursor:
             update_or_delete_node(doc)
 
         for not_visited in access.not_visited_nodes():
             insert_node(not_visited)
         return info, resource_inserts, resource_updates, resource_deletes
 
-    def prepare_edges(
-        self, access: GraphAccess, edge_cursor: Iterable, edge_type: str  # type: ignore # pypy
+    async def prepare_edges(
+        self, access: GraphAccess, edge_cursor: AsyncIterator[Json], edge_type: str
     ) -> Tuple[GraphUpdate, List[Json], List[Json]]:
         log.info(f"Prepare edges of type {edge_type} for subgraph {access.root()}")
         info = GraphUpdate()
@@ -610,7 +790,7 @@ class ArangoGraphDB(GraphDB):
                 edges_deletes.append(edge)
                 info.edges_deleted += 1
 
-        for doc in edge_cursor:
+        async for doc in edge_cursor:
             update_edge(doc)
 
         for edge_from, edge_to in access.not_visited_edges(edge_type):
@@ -630,8 +810,8 @@ class ArangoGraphDB(GraphDB):
             # check all nodes for this subgraph
             query, bind = node_query
             log.debug(f"Query for nodes: {sub.root()}")
-            with await self.db.aql(query, bind_vars=bind, batch_size=50000) as node_cursor:
-                node_info, ni, nu, nd = self.prepare_nodes(sub, node_cursor, model)
+            async with await self.db.aql_cursor(query, bind_vars=bind, batch_size=50000) as node_cursor:
+                node_info, ni, nu, nd = await self.prepare_nodes(sub, node_cursor, model)
                 graph_info += node_info
 
             # check all edges in all relevant edge-collections
@@ -640,8 +820,8 @@ class ArangoGraphDB(GraphDB):
             for edge_type in EdgeType.all:
                 query, bind = edge_query(edge_type)
                 log.debug(f"Query for edges of type {edge_type}: {sub.root()}")
-                with await self.db.aql(query, bind_vars=bind, batch_size=50000) as ec:
-                    edge_info, gei, ged = self.prepare_edges(sub, ec, edge_type)
+                async with await self.db.aql_cursor(query, bind_vars=bind, batch_size=50000) as ec:
+                    edge_info, gei, ged = await self.prepare_edges(sub, ec, edge_type)
                     graph_info += edge_info
                     edge_inserts[edge_type] = gei
                     edge_deletes[edge_type] = ged
@@ -689,13 +869,229 @@ class ArangoGraphDB(GraphDB):
                     raise AttributeError(f"Kind of update root {root} is not a pre-resolved and can not be used!")
 
             log.debug(f"Update prepared: {info}. Going to persist the changes.")
+            history = await self.history_entries(change_id, nis, nus, nds, eis, eds) if self.keep_history else []
             await self.refresh_marked_update(change_id)
-            await self.persist_update(change_id, is_batch, info, nis, nus, nds, eis, eds)
+            await self.persist_update(change_id, is_batch, info, nis, nus, nds, eis, eds, history)
             return roots, info
         except Exception as ex:
             await self.delete_marked_update(change_id)
             raise ex
 
+    async def history_entries(
+        self,
+        change_id: str,
+        resource_inserts: List[Json],
+        resource_updates: List[Json],
+        resource_deletes: List[Json],
+        edge_inserts: Dict[str, List[Json]],
+        edge_deletes: Dict[str, List[Json]],
+    ) -> List[Json]:
+        """
+        Create the history entries for all changes of a merge.
+        Only the documents of updated and deleted nodes are loaded, to compute the reverse patch.
+        """
+        changed_at = utc_str(utc())
+        entry = {"change": change_id, "changed_at": changed_at}
+        changed_ids = [a["_key"] for a in resource_updates] + [a["_key"] for a in resource_deletes]
+        old: Dict[str, Json] = {}
+        if changed_ids:
+            async with await self.db.aql_cursor(
+                self.query_nodes_by_ids(), bind_vars={"ids": changed_ids}, batch_size=10000
+            ) as cr:
+                async for doc in cr:
+                    old[doc["_key"]] = doc
+        history: List[Json] = []
+        for node in resource_inserts:
+            created = {"id": node["_key"], "action": NodeCreated, "kinds": node.get("kinds"), "hash": node.get("hash")}
+            history.append({**entry, **created, "before": None, "before_hash": None, "full": False})
+        for node in resource_updates:
+            before = old.get(node["_key"], {})
+            history.append(
+                {
+                    **entry,
+                    "id": node["_key"],
+                    "action": NodeUpdated,
+                    "kinds": node.get("kinds"),
+                    "hash": node.get("hash"),
+                    "before": graph_history.node_diff(before, node),
+                    "before_hash": before.get("hash"),
+                    "full": False,
+                }
+            )
+        for node in resource_deletes:
+            before = graph_history.without_db_properties(old.get(node["_key"], node))
+            history.append(
+                {
+                    **entry,
+                    "id": node["_key"],
+                    "action": NodeDeleted,
+                    "kinds": before.get("kinds"),
+                    "hash": None,
+                    "before": before,
+                    "before_hash": before.get("hash"),
+                    "full": True,
+                }
+            )
+        for action, edges_by_type in ((EdgeCreated, edge_inserts), (EdgeDeleted, edge_deletes)):
+            for edge_type, edges in edges_by_type.items():
+                for edge in edges:
+                    from_id = edge["_from"].split("/")[1]  # vertex/id
+                    to_id = edge["_to"].split("/")[1]  # vertex/id
+                    edge_entry = {"id": edge["_key"], "action": action, "edge_type": edge_type}
+                    history.append({**entry, **edge_entry, "from": from_id, "to": to_id})
+        # changed_at has a resolution of seconds: the sequence number defines the order of all merges.
+        # All entries of a merge share one sequence number: a merge is always reverted as a whole.
+        # Every node and edge is changed at most once per merge, so the order within a merge does not matter.
+        seq = self.__next_history_seq()
+        for h in history:
+            h["seq"] = seq
+        return history
+
+    def __next_history_seq(self) -> int:
+        # time based, so the sequence is increasing across restarts and can be compared with a point in time
+        self.last_history_seq = max(time_ns(), self.last_history_seq + 1)
+        return self.last_history_seq
+
+    async def history_seq_at(self, at: int) -> int:
+        """
+        The sequence number of the latest merge at or before the given point in time.
+        :param at: the point in time in nanoseconds since epoch.
+        :return: the sequence number or 0, if there is no merge before this point in time.
+        """
+        query = f"FOR h IN `{self.history}` FILTER h.seq<=@at SORT h.seq DESC LIMIT 1 RETURN h.seq"
+        with await self.db.aql(query, bind_vars={"at": at}) as cursor:
+            return int(next(cursor, 0))
+
+    async def search_history(
+        self,
+        node_id: Optional[str] = None,
+        change: Optional[str] = None,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncCursorContext:
+        if not await self.db.has_collection(self.history):
+            raise HistoryNotAvailable(self.name)
+        filters = {"id": node_id, "change": change}
+        bind_vars: Json = {k: v for k, v in filters.items() if v is not None}
+        conditions = [f"h.{k}==@{k}" for k in bind_vars]
+        if after:
+            conditions.append("h.changed_at>@after")
+            bind_vars["after"] = after
+        if before:
+            conditions.append("h.changed_at<@before")
+            bind_vars["before"] = before
+        filter_term = f"FILTER {' AND '.join(conditions)}" if conditions else ""
+        limit_term = f"LIMIT {int(limit)}" if limit else ""
+        query = f"""
+        FOR h IN `{self.history}` {filter_term}
+        SORT h.seq DESC {limit_term}
+        RETURN UNSET(h, "_key", "_id", "_rev")
+        """
+        return await self.db.aql_cursor(query, bind_vars=bind_vars, batch_size=10000)
+
+    async def revert_history(self, target: "ArangoGraphDB", seq: int) -> None:
+        """
+        Revert all changes after the change with the given sequence number on the target graph.
+        The target graph needs to be a copy of this graph: it holds the state of this graph after the given change.
+        """
+        query = f"FOR h IN `{self.history}` FILTER h.seq>@seq SORT h.seq RETURN h"
+        nodes: Dict[str, Json] = {}
+        edges: Dict[Tuple[str, str], Json] = {}
+        async with await self.db.aql_cursor(query, bind_vars={"seq": seq}, batch_size=10000) as cursor:
+            async for change in cursor:
+                graph_history.add_revert_change(nodes, edges, change)
+        log.info(f"Revert {len(nodes)} nodes and {len(edges)} edges of graph {self.name} to change {seq}.")
+
+        node_ids = list(nodes.keys())
+        for start in range(0, len(node_ids), 10000):
+            ids = node_ids[start : start + 10000]  # noqa: E203
+            async with await self.db.aql_cursor(target.query_nodes_by_ids(), bind_vars={"ids": ids}) as cursor:
+                current = {doc["_key"]: doc async for doc in cursor}
+            replaced: List[Json] = []
+            deleted: List[Json] = []
+            for node_id in ids:
+                reverted = graph_history.revert_node(current.get(node_id), nodes[node_id])
+                if reverted is not None:
+                    replaced.append({**reverted, "_key": node_id})
+                elif node_id in current:
+                    deleted.append({"_key": node_id})
+            if replaced:
+                await self.db.insert_many(target.vertex_name, replaced, overwrite=True)
+            if deleted:
+                await self.db.delete_many(target.vertex_name, deleted)
+
+        edge_inserts: Dict[str, List[Json]] = defaultdict(list)
+        edge_deletes: Dict[str, List[Json]] = defaultdict(list)
+        for (edge_type, edge_key), change in edges.items():
+            if change["action"] == EdgeCreated:
+                edge_deletes[edge_type].append({"_key": edge_key})
+            else:
+                edge = {
+                    "_key": edge_key,
+                    "_from": f"{target.vertex_name}/{change['from']}",
+                    "_to": f"{target.vertex_name}/{change['to']}",
+                }
+                edge_inserts[edge_type].append(edge)
+        for edge_type, inserts in edge_inserts.items():
+            await self.db.insert_many(target.edge_collection(edge_type), inserts, overwrite=True)
+        for edge_type, deletes in edge_deletes.items():
+            # edges that do not exist in the target are ignored
+            await self.db.delete_many(target.edge_collection(edge_type), deletes)
+
+    async def compact_history(self, before: str, batch_size: int = 10000) -> int:
+        """
+        Compact all changes before the given timestamp: all changes of a node or edge on the same day
+        are combined into one change. The state of the graph can still be reconstructed for the end of every day.
+        The changes are replaced in batches: every batch is replaced in one transaction.
+        :return: the number of removed history entries.
+        """
+        query = f"""
+        FOR h IN `{self.history}` FILTER h.changed_at<@before
+        COLLECT id = h.id, edge_type = h.edge_type, day = SUBSTRING(h.changed_at, 0, 10) INTO group = h
+        FILTER LENGTH(group) > 1
+        RETURN group
+        """
+        removed = 0
+        inserts: List[Json] = []
+        deletes: List[Json] = []
+
+        async def replace_changes() -> None:
+            async with self.db.begin_transaction(write=[self.history]) as tx:
+                if inserts:
+                    await tx.insert_many(self.history, inserts)
+                await tx.delete_many(self.history, deletes)
+            inserts.clear()
+            deletes.clear()
+
+        async with await self.db.aql_cursor(query, bind_vars={"before": before}, batch_size=1000) as cursor:
+            async for group in cursor:
+                changes = sorted(group, key=lambda h: h["seq"])
+                compacted = graph_history.compact_changes(changes)
+                inserts.extend(graph_history.without_key(c) for c in compacted)
+                deletes.extend({"_key": c["_key"]} for c in changes)
+                removed += len(changes) - len(compacted)
+                if len(deletes) >= batch_size:
+                    await replace_changes()
+        if deletes:
+            await replace_changes()
+        return removed
+
+    async def delete_history(self, before: str) -> int:
+        """
+        Delete all changes before the given timestamp.
+        The state of the graph can not be reconstructed before this point in time any longer.
+        :return: the number of deleted history entries.
+        """
+        query = f"""
+        FOR h IN `{self.history}` FILTER h.changed_at<@before
+        REMOVE h IN `{self.history}`
+        COLLECT WITH COUNT INTO count
+        RETURN count
+        """
+        with await self.db.aql(query, bind_vars={"before": before}) as cursor:
+            return int(next(cursor, 0))
+
     async def persist_update(
         self,
         change_id: str,
@@ -706,7 +1102,10 @@ class ArangoGraphDB(GraphDB):
         resource_deletes: List[Json],
         edge_inserts: Dict[str, List[Json]],
         edge_deletes: Dict[str, List[Json]],
+        history: Optional[List[Json]] = None,
     ) -> None:
+        history = history or []
+
         async def execute_many_async(
             async_fn: Callable[[str, List[Json]], Any], name: str, array: List[Json], **kwargs: Any
         ) -> None:
@@ -731,7 +1130,9 @@ class ArangoGraphDB(GraphDB):
             log.debug(f"Persist the changes directly ({info.all_changes()} changes).")
             edge_collections = [self.edge_collection(a) for a in EdgeType.all]
             update_many_no_merge = partial(self.db.update_many, merge=False)
-            async with self.db.begin_transaction(write=edge_collections + [self.vertex_name, self.in_progress]) as tx:
+            history_collections = [self.history] if history else []
+            write = edge_collections + history_collections + [self.vertex_name, self.in_progress]
+            async with self.db.begin_transaction(write=write) as tx:
                 # note: all requests are done sequentially on purpose
                 # https://www.arangodb.com/docs/stable/http/transaction-stream-transaction.html#concurrent-requests
                 await execute_many_async(self.db.insert_many, self.vertex_name, resource_inserts, overwrite=True)
@@ -744,6 +1145,7 @@ class ArangoGraphDB(GraphDB):
                     )
                 for ed_d_type, ed_delete in edge_deletes.items():
                     await execute_many_async(self.db.delete_many, self.edge_collection(ed_d_type), ed_delete)
+                await execute_many_async(self.db.insert_many, self.history, history)
                 await self.delete_marked_update(change_id, tx)
 
         async def store_to_tmp_collection(temp: StandardCollection) -> None:
@@ -759,7 +1161,8 @@ class ArangoGraphDB(GraphDB):
                 trafo_many(self.db.insert_many, tmp, deletes, {"action": "edge_delete", "edge_type": tpe})
                 for tpe, deletes in edge_deletes.items()
             ]
-            await asyncio.gather(*([ri, ru, rd] + edge_i + edge_u))
+            hs = trafo_many(self.db.insert_many, tmp, history, {"action": "history"})
+            await asyncio.gather(*([ri, ru, rd, hs] + edge_i + edge_u))
 
         async def update_via_temp_collection() -> None:
             temp = await self.get_tmp_collection(change_id)
@@ -799,7 +1202,13 @@ class ArangoGraphDB(GraphDB):
         await self.delete_marked_update(batch_id)
 
     async def to_query(self, query_model: QueryModel, with_edges: bool = False) -> Tuple[str, Json]:
-        return arango_query.to_query(self, query_model, with_edges)
+        key = (self.name, with_edges)
+        if key not in query_model.compiled:
+            start = perf_counter()
+            query_model.compiled[key] = arango_query.to_query(self, query_model, with_edges)
+            if query_model.profile:
+                query_model.profile.compile += perf_counter() - start
+        return query_model.compiled[key]
 
     async def insert_genesis_data(self) -> None:
         root_data = {"kind": "graph_root", "name": "root"}
@@ -876,6 +1285,9 @@ class ArangoGraphDB(GraphDB):
                     sparse=False,
                     name="kinds_id_name_ctime",
                 )
+            # all ancestors of a node are materialized: used to find all descendants of a node.
+            if "ancestor_ids" not in node_idxes:
+                nodes.add_persistent_index(["ancestor_ids[*]"], sparse=False, name="ancestor_ids")
             progress_idxes = {idx["name"]: idx for idx in progress.indexes()}
             if "parent_nodes" not in progress_idxes:
                 progress.add_persistent_index(["parent_nodes[*]"], name="parent_nodes")
@@ -949,6 +1361,12 @@ class ArangoGraphDB(GraphDB):
             create_update_edge_indexes(edge_collection)
 
         await create_update_views(vertex)
+        if self.keep_history:
+            history = await create_collection(self.history)
+            history.add_persistent_index(["changed_at"], name="history_changed_at")
+            history.add_persistent_index(["seq"], name="history_seq")
+            history.add_persistent_index(["id", "seq"], name="history_id_seq")
+            history.add_persistent_index(["change"], name="history_change")
         await self.insert_genesis_data()
 
     @staticmethod
@@ -965,6 +1383,25 @@ class ArangoGraphDB(GraphDB):
       RETURN resource
       """
 
+    def query_copy_graph(self, target: "ArangoGraphDB") -> str:
+        replace = '{overwriteMode: "replace"}'
+        edges = "\n".join(
+            f"""
+        LET edges_{edge_type} = (
+            FOR e IN `{self.edge_collection(edge_type)}`
+            LET from = CONCAT(@prefix, PARSE_IDENTIFIER(e._from).key)
+            LET to = CONCAT(@prefix, PARSE_IDENTIFIER(e._to).key)
+            INSERT MERGE(e, {{_from: from, _to: to}}) INTO `{target.edge_collection(edge_type)}` OPTIONS {replace}
+            RETURN 1
+        )"""
+            for edge_type in sorted(EdgeType.all)
+        )
+        return f"""
+        LET nodes = (FOR n IN `{self.vertex_name}` INSERT n INTO `{target.vertex_name}` OPTIONS {replace} RETURN 1)
+        {edges}
+        RETURN LENGTH(nodes)
+        """
+
     def query_update_nodes(self, merge_node_kind: str) -> str:
         return f"""
         FOR a IN {self.vertex_name}
@@ -980,6 +1417,13 @@ class ArangoGraphDB(GraphDB):
         RETURN {{_key: a._key, _from: a._from, _to: a._to}}
         """
 
+    def query_nodes_by_ids(self) -> str:
+        return f"""
+        FOR a IN `{self.vertex_name}`
+        FILTER a._key IN @ids
+        RETURN a
+        """
+
     def query_update_nodes_by_ids(self) -> str:
         return f"""
         FOR a IN {self.vertex_name}
@@ -1158,10 +1602,10 @@ class EventGraphDB(GraphDB):
         await self.event_sender.core_event(CoreEvent.Query, context, **counters)
         return await self.real.search_graph_gen(query, with_count, timeout)
 
-    async def search_aggregation(self, query: QueryModel) -> AsyncCursorContext:
+    async def search_aggregation(self, query: QueryModel, timeout: Optional[timedelta] = None) -> AsyncCursorContext:
         counters, context = query.query.analytics()
         await self.event_sender.core_event(CoreEvent.Query, context, **counters)
-        return await self.real.search_aggregation(query)
+        return await self.real.search_aggregation(query, timeout)
 
     async def search_graph(self, query: QueryModel) -> MultiDiGraph:
         counters, context = query.query.analytics()
@@ -1171,6 +1615,23 @@ class EventGraphDB(GraphDB):
     async def explain(self, query: QueryModel, with_edges: bool = False) -> EstimatedSearchCost:
         return await self.real.explain(query)
 
+    async def search_history(
+        self,
+        node_id: Optional[str] = None,
+        change: Optional[str] = None,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncCursorContext:
+        return await self.real.search_history(node_id, change, after, before, limit)
+
+    @property
+    def index_advisor(self) -> IndexAdvisor:
+        return self.real.index_advisor
+
+    async def advised_index_changes(self, apply: bool = False) -> Tuple[List[IndexRecommendation], List[Json]]:
+        return await self.real.advised_index_changes(apply)
+
     async def wipe(self) -> None:
         result = await self.real.wipe()
         await self.event_sender.core_event(CoreEvent.GraphDBWiped, {"graph": self.graph_name})
@@ -1181,3 +1642,47 @@ class EventGraphDB(GraphDB):
 
     async def create_update_schema(self) -> None:
         await self.real.create_update_schema()
+
+
+class ReadOnlyGraphDB(EventGraphDB):
+    """
+    Read-only view on a graph snapshot: all searches are delegated, all changes are rejected.
+    """
+
+    async def create_node(self, model: Model, node_id: str, data: Json, under_node_id: str) -> Json:
+        raise ReadOnlyGraph(self.graph_name)
+
+    async def update_node(
+        self, model: Model, node_id: str, patch_or_replace: Json, replace: bool, section: Optional[str]
+    ) -> Json:
+        raise ReadOnlyGraph(self.graph_name)
+
+    async def delete_node(self, node_id: str) -> None:
+        raise ReadOnlyGraph(self.graph_name)
+
+    def update_nodes(self, model: Model, patches_by_id: Dict[str, Json], **kwargs: Any) -> AsyncGenerator[Json, None]:
+        raise ReadOnlyGraph(self.graph_name)
+
+    def update_nodes_desired(
+        self, model: Model, patch: Json, node_ids: List[str], **kwargs: Any
+    ) -> AsyncGenerator[Json, None]:
+        raise ReadOnlyGraph(self.graph_name)
+
+    def update_nodes_metadata(
+        self, model: Model, patch: Json, node_ids: List[str], **kwargs: Any
+    ) -> AsyncGenerator[Json, None]:
+        raise ReadOnlyGraph(self.graph_name)
+
+    async def merge_graph(
+        self, graph_to_merge: MultiDiGraph, model: Model, maybe_change_id: Optional[str] = None, is_batch: bool = False
+    ) -> Tuple[List[str], GraphUpdate]:
+        raise ReadOnlyGraph(self.graph_name)
+
+    async def commit_batch_update(self, batch_id: str) -> None:
+        raise ReadOnlyGraph(self.graph_name)
+
+    async def abort_update(self, batch_id: str) -> None:
+        raise ReadOnlyGraph(self.graph_name)
+
+    async def wipe(self) -> None:
+        raise ReadOnlyGraph(self.graph_name)
@@ -0,0 +1,181 @@
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Iterable, Tuple
+
+from resotocore.db.model import QueryModel
+from resotocore.model.graph_access import Section
+from resotocore.query.model import Term, Predicate, IsTerm, CombinedTerm, MergeTerm
+from resotocore.types import Json
+from resotocore.util import utc
+
+# Operations, that can be answered by a persistent index.
+# Note: < and <= are combined with a != null check, so a sparse index can be used.
+index_ops = {"==", "in", "<", "<=", ">", ">="}
+
+
+@dataclass
+class PropertyUsage:
+    # path of the property in the document
+    path: str
+    # number of queries that filter on this property
+    count: int = 0
+    # number of queries that filter on this property, while an index on this property existed
+    hits: int = 0
+    # true, if the property has been filtered for null: a sparse index can not be used
+    matches_null: bool = False
+    # number of usages by kind, if the filter was restricted to kinds
+    kinds: Dict[str, int] = field(default_factory=dict)
+    last_used: Optional[datetime] = None
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.count if self.count else 0
+
+
+@dataclass
+class IndexRecommendation:
+    path: str
+    sparse: bool
+    usage: int
+
+    @property
+    def name(self) -> str:
+        return IndexAdvisor.index_name(self.path)
+
+    @property
+    def fields(self) -> List[str]:
+        return [self.path]
+
+
+@dataclass
+class IndexAdvisorConfig:
+    # create and drop advised indexes periodically
+    auto: bool = False
+    # maximum number of advised indexes per graph
+    budget: int = 5
+    # minimum number of queries that need to filter on a property, before an index is recommended
+    min_usage: int = 10
+
+
+class IndexAdvisor:
+    """
+    Record all properties that are filtered directly on the graph collection.
+    Properties that are used often and are not covered by an existing index are recommended to be indexed.
+    At most config.budget indexes are maintained by the advisor: all of them are named with the prefix `advised_`.
+    """
+
+    prefix = "advised_"
+
+    def __init__(self, config: IndexAdvisorConfig = IndexAdvisorConfig()):
+        self.config = config
+        self.usage: Dict[str, PropertyUsage] = {}
+        # paths that are the first field of an existing index
+        self.indexed: Set[str] = set()
+        # paths that are the first field of an advised index
+        self.advised: Set[str] = set()
+        # paths that are the first field of an index not maintained by the advisor
+        self.covered: Set[str] = set()
+
+    def record(self, query_model: QueryModel) -> None:
+        query = query_model.query
+        # parts are stored in reverse order: the last part is the only part that filters the collection directly
+        term = query.parts[-1].term
+        term = term.pre_filter if isinstance(term, MergeTerm) else term
+        predicates, kinds = self.__filter_terms(term)
+        now = utc()
+        for predicate in predicates:
+            path = self.__index_path(query_model, predicate)
+            if path is None or predicate.op not in index_ops:
+                continue
+            usage = self.usage.get(path)
+            if usage is None:
+                usage = PropertyUsage(path)
+                self.usage[path] = usage
+            usage.count += 1
+            usage.last_used = now
+            if path in self.indexed:
+                usage.hits += 1
+            if predicate.value is None:
+                usage.matches_null = True
+            for kind in kinds:
+                usage.kinds[kind] = usage.kinds.get(kind, 0) + 1
+
+    def sync_indexes(self, indexes: Iterable[Json]) -> None:
+        """
+        Update the set of indexed paths from the list of indexes of the collection.
+        """
+        persistent = [idx for idx in indexes if idx.get("type") == "persistent" and idx.get("fields")]
+        self.indexed = {idx["fields"][0] for idx in persistent}
+        self.advised = {idx["fields"][0] for idx in persistent if idx.get("name", "").startswith(self.prefix)}
+        self.covered = {idx["fields"][0] for idx in persistent if not idx.get("name", "").startswith(self.prefix)}
+
+    def recommendations(self) -> List[IndexRecommendation]:
+        """
+        All properties, that should be indexed. Properties already covered by an advised index are included.
+        """
+        candidates = [
+            usage
+            for usage in self.usage.values()
+            if usage.count >= self.config.min_usage and usage.path not in self.covered
+        ]
+        candidates.sort(key=lambda u: u.count, reverse=True)
+        return [IndexRecommendation(u.path, not u.matches_null, u.count) for u in candidates[: self.config.budget]]
+
+    def index_changes(self, indexes: List[Json]) -> Tuple[List[IndexRecommendation], List[Json]]:
+        """
+        Compute the changes to the advised indexes, based on the existing indexes of the collection.
+        :return: the indexes to create and the existing indexes to drop.
+        """
+        self.sync_indexes(indexes)
+        advised = {idx["name"]: idx for idx in indexes if idx.get("name", "").startswith(self.prefix)}
+        recommended = {rec.name: rec for rec in self.recommendations()}
+        create = [rec for name, rec in recommended.items() if name not in advised]
+        drop = [idx for name, idx in advised.items() if name not in recommended]
+        return create, drop
+
+    def decay(self) -> None:
+        """
+        Halve all usage counters, so that recent usage outweighs old usage.
+        """
+        for path, usage in list(self.usage.items()):
+            usage.count //= 2
+            usage.hits //= 2
+            usage.kinds = {k: v // 2 for k, v in usage.kinds.items() if v > 1}
+            if usage.count == 0:
+                self.usage.pop(path, None)
+
+    @staticmethod
+    def index_name(path: str) -> str:
+        return IndexAdvisor.prefix + re.sub("[^A-Za-z0-9_]", "_", path)
+
+    @staticmethod
+    def __filter_terms(term: Term) -> Tuple[List[Predicate], List[str]]:
+        predicates: List[Predicate] = []
+        kinds: List[str] = []
+
+        def walk(t: Term) -> None:
+            if isinstance(t, Predicate):
+                predicates.append(t)
+            elif isinstance(t, IsTerm):
+                kinds.extend(t.kinds)
+            elif isinstance(t, CombinedTerm) and t.op == "and":
+                walk(t.left)
+                walk(t.right)
+            # negated terms and or branches can not be answered by a single index
+
+        walk(term)
+        return predicates, kinds
+
+    @staticmethod
+    def __index_path(query_model: QueryModel, predicate: Predicate) -> Optional[str]:
+        path = predicate.name
+        # merged properties are not part of the document
+        if any(path.startswith(name + ".") for name in query_model.query.merge_names):
+            return None
+        resolved = query_model.model.property_by_path(Section.without_section(path.replace("[*]", "[]")))
+        synth = resolved.prop.synthetic
+        if synth:
+            before, after = path.rsplit(resolved.prop.name, 1)
+            path = f'{before}{".".join(synth.path)}{after}'
+        return f"{path}[*]" if "filter" in predicate.args else path
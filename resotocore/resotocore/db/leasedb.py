@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Optional
+
+from arango.exceptions import ArangoServerError
+
+from resotocore.db.async_arangodb import AsyncArangoDB
+from resotocore.types import Json
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Lease:
+    # name of the lease
+    name: str
+    # the current holder of the lease
+    holder: str
+    # time in epoch milliseconds (clock of the database server), when the lease expires
+    expires: int
+    # arbitrary data of the holder
+    data: Json = field(default_factory=dict)
+
+
+class LeaseDb(ABC):
+    """
+    A lease is held by at most one holder at a time.
+    It is given to a new holder only after the current holder released it or did not renew it in time.
+    """
+
+    @abstractmethod
+    async def acquire(self, name: str, holder: str, ttl: timedelta, data: Optional[Json] = None) -> Optional[Lease]:
+        """
+        Acquire or renew the lease.
+        :param name: the name of the lease.
+        :param holder: the identifier of the holder that wants to acquire the lease.
+        :param ttl: the lease expires after this duration, if it is not renewed.
+        :param data: data of the holder that is stored with the lease.
+        :return: the current lease, which is held either by this holder or by another one.
+        """
+
+    @abstractmethod
+    async def release(self, name: str, holder: str) -> None:
+        pass
+
+    @abstractmethod
+    async def get(self, name: str) -> Optional[Lease]:
+        pass
+
+    @abstractmethod
+    async def create_update_schema(self) -> None:
+        pass
+
+
+class ArangoLeaseDb(LeaseDb):
+    def __init__(self, db: AsyncArangoDB, collection_name: str):
+        self.db = db
+        self.collection_name = collection_name
+
+    async def acquire(self, name: str, holder: str, ttl: timedelta, data: Optional[Json] = None) -> Optional[Lease]:
+        bind = {"name": name, "holder": holder, "ttl": int(ttl.total_seconds() * 1000), "data": data or {}}
+        try:
+            with await self.db.aql(self.__acquire(), bind_vars=bind) as cursor:
+                return self.__lease(next(cursor, None))
+        except ArangoServerError as ex:
+            # two holders tried to acquire the lease at the same time: one of them wins
+            log.debug(f"Lease {name} could not be acquired by {holder}: {ex}")
+            return await self.get(name)
+
+    async def release(self, name: str, holder: str) -> None:
+        await self.db.aql(self.__release(), bind_vars={"name": name, "holder": holder})
+
+    async def get(self, name: str) -> Optional[Lease]:
+        with await self.db.aql(self.__get(), bind_vars={"name": name}) as cursor:
+            return self.__lease(next(cursor, None))
+
+    async def create_update_schema(self) -> None:
+        if not await self.db.has_collection(self.collection_name):
+            await self.db.create_collection(self.collection_name)
+
+    @staticmethod
+    def __lease(doc: Optional[Json]) -> Optional[Lease]:
+        return Lease(doc["_key"], doc["holder"], doc["expires"], doc.get("data") or {}) if doc else None
+
+    def __acquire(self) -> str:
+        # all timestamps are taken from the database server: the clocks of the holders do not matter
+        return f"""
+        LET now = DATE_NOW()
+        LET lease = {{holder: @holder, expires: now + @ttl, data: @data}}
+        UPSERT {{_key: @name}}
+        INSERT MERGE({{_key: @name}}, lease)
+        UPDATE (OLD.holder == @holder OR OLD.expires < now) ? lease : {{}}
+        IN `{self.collection_name}`
+        OPTIONS {{ mergeObjects: false }}
+        RETURN NEW
+        """
+
+    def __release(self) -> str:
+        return f"""
+        FOR doc IN `{self.collection_name}`
+        FILTER doc._key == @name AND doc.holder == @holder
+        UPDATE doc WITH {{expires: 0}} IN `{self.collection_name}`
+        """
+
+    def __get(self) -> str:
+        return f"""
+        FOR doc IN `{self.collection_name}`
+        FILTER doc._key == @name AND doc.expires >= DATE_NOW()
+        RETURN doc
+        """
+
+
+def lease_db(db: AsyncArangoDB, collection: str) -> LeaseDb:
+    return ArangoLeaseDb(db, collection)
@@ -1,15 +1,22 @@
 from __future__ import annotations
 from abc import ABC
-from typing import Any
+from typing import Any, Dict, Tuple, Optional
 
+from arango.typings import Json
+
+from resotocore.db import SearchProfile
 from resotocore.model.model import Model
 from resotocore.query.model import Query
 
 
 class QueryModel(ABC):
-    def __init__(self, query: Query, model: Model):
+    def __init__(self, query: Query, model: Model, profile: Optional[SearchProfile] = None):
         self.query = query
         self.model = model
+        # compiled database query by (graph name, with_edges): a query is compiled once for validation and execution
+        self.compiled: Dict[Tuple[str, bool], Tuple[str, Json]] = {}
+        # if defined, the search is executed with profiling enabled and all timings are collected here
+        self.profile = profile
 
 
 class GraphUpdate(ABC):
@@ -1,15 +1,20 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 from abc import abstractmethod
-from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Sequence, Optional
+from asyncio import Task
+from collections import defaultdict
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta
+from time import time_ns
+from typing import Sequence, Optional, Dict, List, AsyncGenerator, Union
 
+from resotocore.async_extensions import run_async
 from resotocore.db.async_arangodb import AsyncArangoDB
 from resotocore.db.entitydb import EntityDb, ArangoEntityDb
 from resotocore.message_bus import Message
-from resotocore.model.typed_model import to_js
+from resotocore.model.typed_model import to_js, from_js
 from resotocore.task.task_description import RunningTask
 from resotocore.types import Json
 from resotocore.util import utc
@@ -35,6 +40,8 @@ class RunningTaskData:
     task_started_at: datetime = field(default_factory=utc)
     # the timestamp when the step has been started
     step_started_at: datetime = field(default_factory=utc)
+    # sequence number of the last state log entry, that is contained in this data
+    log_seq: int = field(default=0)
 
     @staticmethod
     def data(wi: RunningTask) -> RunningTaskData:
@@ -59,45 +66,197 @@ class RunningTaskDb(EntityDb[RunningTaskData]):
     async def insert(self, task: RunningTask) -> RunningTaskData:
         pass
 
+    @abstractmethod
+    async def flush(self) -> None:
+        """
+        Write all pending state updates.
+        """
+
 
 class ArangoRunningTaskDb(ArangoEntityDb[RunningTaskData], RunningTaskDb):
-    def __init__(self, db: AsyncArangoDB, collection: str):
+    """
+    The data of a running task is stored as snapshot document.
+    Every state update is appended to a log collection, instead of rewriting the snapshot document.
+    The state of a task is the snapshot with all log entries of the task applied in order.
+    After compact_after log entries, the log of a task is folded into its snapshot.
+    State updates without a received message are not critical: they are written delayed and in batches.
+    """
+
+    def __init__(
+        self,
+        db: AsyncArangoDB,
+        collection: str,
+        compact_after: int = 100,
+        write_behind: timedelta = timedelta(seconds=1),
+    ):
         super().__init__(db, collection, RunningTaskData, lambda k: k.id)
+        self.log_collection_name = f"{collection}_log"
+        self.compact_after = compact_after
+        self.write_behind = write_behind
+        # number of log entries by task id written since the last compaction
+        self.log_size: Dict[str, int] = defaultdict(int)
+        # log entries without message, that have not been written yet: only the latest entry of a task is kept
+        self.pending: Dict[str, Json] = {}
+        self.flush_task: Optional[Task[None]] = None
+        # held while pending entries are written: a task is not deleted while its entries are in flight
+        self.flush_lock = asyncio.Lock()
+        self.last_seq = 0
 
     async def update_state(self, wi: RunningTask, message: Optional[Message]) -> None:
-        bind = {
-            "id": f"{self.collection_name}/{wi.id}",
+        entry = {
+            "task_id": wi.id,
+            "seq": self.__next_seq(),
             "current_state_name": wi.current_state.name,
             "current_state_snapshot": wi.current_state.export_state(),
         }
         if message:
-            bind["message"] = to_js(message)
-            aql = self.__update_state_with_message()
+            entry["message"] = to_js(message)
+            # a pending update of this task is superseded by this entry
+            self.pending.pop(wi.id, None)
+            await self.db.insert(self.log_collection_name, entry)
+            await self.__appended([wi.id])
         else:
-            aql = self.__update_state()
-
-        await self.db.aql(aql, bind_vars=bind)
+            self.pending[wi.id] = entry
+            if self.flush_task is None or self.flush_task.done():
+                self.flush_task = asyncio.create_task(self.__flush_later())
 
     async def insert(self, task: RunningTask) -> RunningTaskData:
         return await self.update(RunningTaskData.data(task))
 
-    def __update_state(self) -> str:
+    async def flush(self) -> None:
+        async with self.flush_lock:
+            if not self.pending:
+                return
+            entries = dict(self.pending)
+            # entries stay pending until they are written: a failed write is retried with the next flush
+            await self.db.insert_many(self.log_collection_name, list(entries.values()))
+            for task_id, entry in entries.items():
+                # an entry superseded during the write is still pending
+                if self.pending.get(task_id) is entry:
+                    del self.pending[task_id]
+        # compaction reads the state, which flushes again: done outside the lock
+        await self.__appended(list(entries))
+
+    async def compact(self, task_id: str) -> None:
+        """
+        Fold all log entries of the task into its snapshot and delete the folded entries.
+        The snapshot remembers the last folded entry: entries that survive a crash are not applied twice.
+        """
+        self.log_size.pop(task_id, None)
+        data = await self.get(task_id)
+        if data:
+            await self.update(data)
+            bind = {"task_id": task_id, "seq": data.log_seq}
+            await self.db.aql(self.__remove_log_entries(), bind_vars=bind)
+
+    async def all(self) -> AsyncGenerator[RunningTaskData, None]:
+        await self.flush()
+        entries: Dict[str, List[Json]] = defaultdict(list)
+        async with await self.db.aql_cursor(f"FOR e IN `{self.log_collection_name}` SORT e.seq RETURN e") as cursor:
+            async for entry in cursor:
+                entries[entry["task_id"]].append(entry)
+        async for data in super().all():
+            yield self.__apply_log(data, entries.get(data.id, []))
+
+    async def get(self, key: str) -> Optional[RunningTaskData]:
+        await self.flush()
+        data = await super().get(key)
+        if data:
+            async with await self.db.aql_cursor(self.__log_entries(), bind_vars={"task_id": key}) as cursor:
+                return self.__apply_log(data, [entry async for entry in cursor])
+        return None
+
+    async def delete(self, key_or_object: Union[str, RunningTaskData]) -> None:
+        key = key_or_object if isinstance(key_or_object, str) else self.key_of(key_or_object)
+        # wait for an in-flight flush: its entries would be written after the log has been removed
+        async with self.flush_lock:
+            self.pending.pop(key, None)
+            self.log_size.pop(key, None)
+            await super().delete(key)
+            await self.db.aql(self.__remove_log_entries(), bind_vars={"task_id": key, "seq": None})
+
+    async def delete_many(self, keys: List[str]) -> None:
+        # the log entries of every task need to be removed as well
+        for key in keys:
+            await self.delete(key)
+
+    async def create_update_schema(self) -> None:
+        await super().create_update_schema()
+        name = self.log_collection_name
+        if not await self.db.has_collection(name):
+            await self.db.create_collection(name)
+        log_collection = self.db.collection(name)
+        if "task_seq" not in {idx["name"] for idx in await run_async(log_collection.indexes)}:
+            await run_async(log_collection.add_persistent_index, ["task_id", "seq"], name="task_seq")
+        # sequence numbers of new entries have to be greater than all existing ones
+        with await self.db.aql(self.__max_seq()) as cursor:
+            self.last_seq = max(self.last_seq, next(cursor, None) or 0)
+
+    async def wipe(self) -> bool:
+        async with self.flush_lock:
+            self.pending.clear()
+            self.log_size.clear()
+            wiped = await super().wipe()
+            return await self.db.truncate(self.log_collection_name) and wiped
+
+    def __next_seq(self) -> int:
+        # time based, so the sequence is increasing across restarts
+        self.last_seq = max(time_ns(), self.last_seq + 1)
+        return self.last_seq
+
+    async def __appended(self, task_ids: List[str]) -> None:
+        for task_id in task_ids:
+            self.log_size[task_id] += 1
+            if self.log_size[task_id] >= self.compact_after:
+                await self.compact(task_id)
+
+    async def __flush_later(self) -> None:
+        await asyncio.sleep(self.write_behind.total_seconds())
+        try:
+            await self.flush()
+        except Exception as ex:
+            log.warning(f"Could not write state of running tasks. Retry in {self.write_behind}: {ex}")
+            # the entries are still pending: try again later
+            self.flush_task = asyncio.create_task(self.__flush_later())
+
+    @staticmethod
+    def __apply_log(data: RunningTaskData, entries: List[Json]) -> RunningTaskData:
+        # entries folded into the snapshot already are ignored
+        tail = [entry for entry in entries if entry["seq"] > data.log_seq]
+        if not tail:
+            return data
+        last = tail[-1]
+        messages = [from_js(entry["message"], Message) for entry in tail if entry.get("message")]
+        return replace(
+            data,
+            received_messages=[*data.received_messages, *messages],
+            current_state_name=last["current_state_name"],
+            current_state_snapshot=last["current_state_snapshot"],
+            log_seq=last["seq"],
+        )
+
+    def __log_entries(self) -> str:
+        return f"""
+        FOR e IN `{self.log_collection_name}`
+        FILTER e.task_id == @task_id
+        SORT e.seq
+        RETURN e
+        """
+
+    def __remove_log_entries(self) -> str:
+        # seq == null: remove all entries of the task
         return f"""
-        LET doc = Document(@id)
-        UPDATE doc WITH {{
-            current_state_name: @current_state_name,
-            current_state_snapshot: @current_state_snapshot
-        }} IN {self.collection_name}
+        FOR e IN `{self.log_collection_name}`
+        FILTER e.task_id == @task_id AND (@seq == null OR e.seq <= @seq)
+        REMOVE e IN `{self.log_collection_name}`
         """
 
-    def __update_state_with_message(self) -> str:
+    def __max_seq(self) -> str:
         return f"""
-        LET doc = Document(@id)
-        UPDATE doc WITH {{
-            current_state_name: @current_state_name,
-            current_state_snapshot: @current_state_snapshot,
-            received_messages: APPEND(doc.received_messages, @message)
-        }} IN {self.collection_name}
+        RETURN MAX(APPEND(
+            (FOR e IN `{self.log_collection_name}` RETURN e.seq),
+            (FOR d IN `{self.collection_name}` RETURN d.log_seq)
+        ))
         """
 
 
@@ -16,7 +16,9 @@ from resotolib.utils import iec_size_format
 
 from resotocore import async_extensions, version
 from resotocore.analytics import AnalyticsEventSender
+from resotocore.db.async_arangodb_http import AsyncArangoHttpDB, ArangoHttpConnection
 from resotocore.db.db_access import DbAccess
+from resotocore.db.index_advisor import IndexAdvisorConfig
 from resotocore.durations import parse_duration
 from resotocore.model.adjust_node import DirectAdjuster
 from resotocore.util import utc
@@ -135,6 +137,21 @@ def parse_args(args: Optional[List[str]] = None, namespace: Optional[str] = None
         dest="graphdb_request_timeout",
         help="Request timeout in seconds (default: 900)",
     )
+    parser.add_argument(
+        "--graphdb-client",
+        default="python-arango",
+        choices=["python-arango", "aiohttp"],
+        dest="graphdb_client",
+        help="Client used for queries and document access. "
+        "aiohttp talks to the database natively from the event loop (default: python-arango)",
+    )
+    parser.add_argument(
+        "--graphdb-http-pool-size",
+        type=int,
+        default=100,
+        dest="graphdb_http_pool_size",
+        help="Maximum number of keep-alive connections used by the aiohttp client (default: 100)",
+    )
     parser.add_argument(
         "--plantuml-server",
         default="http://plantuml.resoto.org:8080",
@@ -208,6 +225,117 @@ def parse_args(args: Optional[List[str]] = None, namespace: Optional[str] = None
         help="Use this graph section by default, if no section is specified."
         "Relative paths will be interpreted with respect to this section.",
     )
+    parser.add_argument(
+        "--cli-transform-chunk-size",
+        type=int,
+        default=1000,
+        dest="cli_transform_chunk_size",
+        help="Number of elements jq, format and list transform as one chunk outside the event loop. "
+        "Use 0 to transform all elements on the event loop. (default: 1000)",
+    )
+    parser.add_argument(
+        "--cli-transform-parallelism",
+        type=int,
+        default=4,
+        dest="cli_transform_parallelism",
+        help="Maximum number of chunks a single command transforms concurrently. (default: 4)",
+    )
+    parser.add_argument(
+        "--cli-line-parallelism",
+        type=int,
+        default=4,
+        dest="cli_line_parallelism",
+        help="Maximum number of command lines of a single request that are executed concurrently. "
+        "Only command lines without side effects are executed concurrently. (default: 4)",
+    )
+    parser.add_argument(
+        "--job-concurrency",
+        type=int,
+        default=4,
+        dest="job_concurrency",
+        help="Maximum number of job commands that are executed concurrently. (default: 4)",
+    )
+    parser.add_argument(
+        "--job-queue-size",
+        type=int,
+        default=100,
+        dest="job_queue_size",
+        help="Maximum number of job commands that wait for execution. (default: 100)",
+    )
+    parser.add_argument(
+        "--websocket-queue-size",
+        type=int,
+        default=1000,
+        dest="websocket_queue_size",
+        help="Maximum number of messages buffered for a websocket listener. "
+        "Older events are dropped, subscribers that can not keep up are disconnected. (default: 1000)",
+    )
+    parser.add_argument(
+        "--index-advisor-auto",
+        default=False,
+        action="store_true",
+        dest="index_advisor_auto",
+        help="Create and drop indexes on frequently filtered properties automatically.",
+    )
+    parser.add_argument(
+        "--index-advisor-budget",
+        type=int,
+        default=5,
+        dest="index_advisor_budget",
+        help="Maximum number of indexes per graph maintained by the index advisor. (default: 5)",
+    )
+    parser.add_argument(
+        "--index-advisor-min-usage",
+        type=int,
+        default=10,
+        dest="index_advisor_min_usage",
+        help="Minimum number of searches filtering a property, before an index is advised. (default: 10)",
+    )
+    parser.add_argument(
+        "--graph-snapshots",
+        type=int,
+        default=0,
+        dest="graph_snapshots",
+        help="Publish a read-only snapshot of a graph after every merge or batch commit and retain this number "
+        "of snapshots per graph. Snapshots are searched via graph@latest or graph@<version>. (default: 0 = off)",
+    )
+    parser.add_argument(
+        "--graph-history",
+        default=False,
+        action="store_true",
+        dest="graph_history",
+        help="Record the changes of every merge, so the state of a graph at a point in time can be searched.",
+    )
+    parser.add_argument(
+        "--graph-history-retention",
+        type=parse_duration,
+        default="30d",
+        dest="graph_history_retention",
+        help="Delete recorded changes after this duration. (default: 30d)",
+    )
+    parser.add_argument(
+        "--graph-history-compact-after",
+        type=parse_duration,
+        default="2d",
+        dest="graph_history_compact_after",
+        help="Combine all changes of a node on the same day after this duration. (default: 2d)",
+    )
+    parser.add_argument(
+        "--leader-election",
+        default=False,
+        action="store_true",
+        dest="leader_election",
+        help="Run several resotocore processes against the same database. "
+        "Only the elected leader runs workflows and jobs and handles subscriber and worker connections. "
+        "All other processes serve read requests and redirect all other requests to the leader.",
+    )
+    parser.add_argument(
+        "--advertise-url",
+        type=is_url("can not parse --advertise-url"),
+        dest="advertise_url",
+        help="The url this process is reachable under by clients. "
+        "Requests are redirected to this url, if this process is the leader. (default: derived from host and port)",
+    )
     parser.add_argument("--version", action="store_true", help="Print the version of resotocore and exit.")
     parser.add_argument(
         "--jobs",
@@ -280,4 +408,21 @@ def reset_process_start_method() -> None:
 
 def db_access(config: Namespace, db: StandardDatabase, event_sender: AnalyticsEventSender) -> DbAccess:
     adjuster = DirectAdjuster()
-    return DbAccess(db, event_sender, adjuster, update_outdated=config.graph_updates_abort_after)
+    async_db = (
+        AsyncArangoHttpDB(db, ArangoHttpConnection.from_args(config)) if config.graphdb_client == "aiohttp" else None
+    )
+    index_advisor = IndexAdvisorConfig(
+        config.index_advisor_auto, config.index_advisor_budget, config.index_advisor_min_usage
+    )
+    return DbAccess(
+        db,
+        event_sender,
+        adjuster,
+        update_outdated=config.graph_updates_abort_after,
+        async_db=async_db,
+        index_advisor=index_advisor,
+        graph_snapshots=config.graph_snapshots,
+        graph_history=config.graph_history,
+        history_retention=config.graph_history_retention,
+        history_compact_after=config.graph_history_compact_after,
+    )
@@ -26,6 +26,18 @@ class RequiredDependencyMissingError(ServerError):
     """
 
 
+class MessageQueueOverflow(CoreException):
+    """
+    A subscriber could not keep up with the emitted messages and has been disconnected.
+    """
+
+
+class JobQueueFull(CoreException):
+    """
+    The job execution pool has no capacity left to queue another command.
+    """
+
+
 class DatabaseError(CoreException):
     """
     Base for all database exceptions.
@@ -59,6 +71,18 @@ class NoSuchGraph(CoreException, NotFoundError):
         self.graph = graph
 
 
+class ReadOnlyGraph(CoreException, ClientError):
+    def __init__(self, graph: str):
+        super().__init__(f"Graph {graph} is a read-only snapshot and can not be changed.")
+        self.graph = graph
+
+
+class HistoryNotAvailable(CoreException, NotFoundError):
+    def __init__(self, graph: str, reason: str = "history is not enabled"):
+        super().__init__(f"No history available for graph {graph}: {reason}")
+        self.graph = graph
+
+
 class NoSuchChangeError(CoreException, NotFoundError):
     def __init__(self, change_id: str):
         super().__init__(f"No batch with given id {change_id}")
@@ -0,0 +1,91 @@
+import logging
+from datetime import timedelta
+from time import monotonic
+from typing import Callable, Awaitable, Optional
+
+from resotocore.db.leasedb import LeaseDb, Lease
+from resotocore.util import Periodic, uuid_str
+
+log = logging.getLogger(__name__)
+
+
+class LeaderElection:
+    """
+    Elect one leader among all resotocore processes that share the same database.
+    The leader holds a lease in the database and renews it periodically.
+    If the leader does not renew the lease in time, another process takes over.
+    The url of the leader is stored with the lease, so that requests can be redirected to the leader.
+    """
+
+    lease_name = "leader"
+
+    def __init__(
+        self,
+        lease_db: LeaseDb,
+        url: str,
+        on_elected: Callable[[], Awaitable[None]],
+        on_demoted: Callable[[], Awaitable[None]],
+        ttl: timedelta = timedelta(seconds=30),
+        holder_id: Optional[str] = None,
+    ):
+        self.lease_db = lease_db
+        self.url = url
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.ttl = ttl
+        self.holder_id = holder_id or uuid_str()
+        # the lease as seen by the last check
+        self.lease: Optional[Lease] = None
+        self.is_leader = False
+        # monotonic time until the lease is valid, based on the last renewal
+        self.valid_until = 0.0
+        self.renew_interval = ttl / 3
+        self.renewer = Periodic("leader_election", self.check_lease, self.renew_interval)
+
+    @property
+    def leader_url(self) -> Optional[str]:
+        """
+        The url of the current leader or None if there is no leader.
+        """
+        if self.is_leader:
+            return self.url
+        return self.lease.data.get("url") if self.lease else None
+
+    async def start(self) -> None:
+        await self.check_lease()
+        await self.renewer.start()
+
+    async def stop(self) -> None:
+        await self.renewer.stop()
+        if self.is_leader:
+            await self.__demote()
+            # give the lease back, so another process can take over immediately
+            await self.lease_db.release(self.lease_name, self.holder_id)
+
+    async def check_lease(self) -> None:
+        started = monotonic()
+        try:
+            self.lease = await self.lease_db.acquire(self.lease_name, self.holder_id, self.ttl, {"url": self.url})
+        except Exception as ex:
+            log.warning(f"Could not acquire or renew the leader lease: {ex}")
+            # keep the leadership, as long as the last renewal is valid until the next check.
+            # Otherwise the lease could expire and another process could be elected, before this process demotes.
+            if self.is_leader and monotonic() + self.renew_interval.total_seconds() >= self.valid_until:
+                await self.__demote()
+            return
+
+        elected = self.lease is not None and self.lease.holder == self.holder_id
+        if elected:
+            # the lease is renewed from the time of the request: be on the safe side
+            self.valid_until = started + self.ttl.total_seconds()
+            if not self.is_leader:
+                log.info(f"This process ({self.holder_id}) has been elected as leader.")
+                self.is_leader = True
+                await self.on_elected()
+        elif self.is_leader:
+            await self.__demote()
+
+    async def __demote(self) -> None:
+        log.info(f"This process ({self.holder_id}) is no longer leader.")
+        self.is_leader = False
+        await self.on_demoted()
@@ -1,14 +1,21 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 from abc import ABC
 from asyncio import Queue
-from contextlib import asynccontextmanager
-from typing import Any, Optional, Dict, List, AsyncGenerator
+from contextlib import asynccontextmanager, suppress
+from datetime import timedelta
+from enum import Enum
+from time import perf_counter
+from typing import Any, Optional, Dict, List, AsyncGenerator, Deque
 
+import jsons
 from frozendict import frozendict
 from jsons import set_deserializer, set_serializer
 
+from resotocore.error import MessageQueueOverflow
+from resotocore.metrics import MessageBusQueueSize, MessageBusDropped
 from resotocore.types import Json
 from resotocore.util import pop_keys
 
@@ -41,16 +48,31 @@ class Message(ABC):
     For all action, action_done and action_error messages, the data field contains references to the task.
     """
 
+    # serialized json string of this message: computed only once
+    _json_str: Optional[str] = None
+
     def __init__(self, message_type: str, data: Optional[Json]):
         self.message_type = message_type
         self.data = frozendict(data if data else {})
 
     def __eq__(self, other: Any) -> bool:
-        return self.__dict__ == other.__dict__ if isinstance(other, Message) else False
+        return self.__state() == other.__state() if isinstance(other, Message) else False
+
+    def __state(self) -> Json:
+        return {k: v for k, v in self.__dict__.items() if k != "_json_str"}
 
     def __hash__(self) -> int:
         return hash(self.message_type) + hash(self.data)
 
+    def json_str(self) -> str:
+        """
+        The json string of this message.
+        A message is immutable and usually sent to many subscribers: the string is computed only once.
+        """
+        if self._json_str is None:
+            self._json_str = jsons.dumps(self, strip_privates=True)
+        return self._json_str
+
     @staticmethod
     def from_json(json: Json, _: type = object, **__: object) -> Message:
         kind = json["kind"]
@@ -155,22 +177,136 @@ class ActionError(ActionMessage):
         self.error = error
 
 
+class OverflowPolicy(Enum):
+    """
+    This enumeration defines the behaviour of a bounded subscriber queue, that is full when a message is emitted:
+    - DropOldest: the oldest pending message is dropped.
+    - DropNewest: the emitted message is dropped.
+    - Coalesce: a pending message with the same message type is replaced, otherwise the oldest message is dropped.
+    - Disconnect: the subscriber is disconnected: the next read from the queue raises MessageQueueOverflow.
+    Default is: DropOldest
+    """
+
+    DropOldest = 1
+    DropNewest = 2
+    Coalesce = 3
+    Disconnect = 4
+
+    @staticmethod
+    def from_name(name: str) -> OverflowPolicy:
+        for policy in OverflowPolicy:
+            if policy.name.lower() == name.replace("-", "").replace("_", "").lower():
+                return policy
+        raise AttributeError(f"Unknown overflow policy: {name}")
+
+
+class MessageQueue(Queue[Message]):
+    """
+    Queue of messages of one subscriber.
+    Messages are offered to the queue without waiting: a slow subscriber never blocks the emitter.
+    If the queue is bounded and full, the overflow policy decides what happens.
+    """
+
+    # the underlying deque is created by Queue._init
+    _queue: Deque[Message]
+
+    def __init__(self, subscriber_id: str, maxsize: int = 0, overflow: OverflowPolicy = OverflowPolicy.DropOldest):
+        super().__init__(maxsize)
+        self.subscriber_id = subscriber_id
+        self.overflow = overflow
+        self.dropped = 0
+        self.disconnected = False
+        self.__dropped_metric = MessageBusDropped.labels(subscriber_id, overflow.name)
+
+    def offer(self, message: Message) -> bool:
+        """
+        Add the message to the queue without waiting.
+        :param message: the message to add.
+        :return: True if the message was added, otherwise False.
+        """
+        if self.disconnected:
+            return False
+        elif self.full():
+            if self.overflow == OverflowPolicy.DropNewest:
+                self.__drop()
+                return False
+            elif self.overflow == OverflowPolicy.Disconnect:
+                log.warning(
+                    f"Subscriber {self.subscriber_id} can not keep up with {self.qsize()} messages. Disconnect."
+                )
+                self.__drop()
+                self.disconnected = True
+                return False
+            elif self.overflow == OverflowPolicy.Coalesce:
+                self.__drop_pending(message.message_type)
+            else:
+                self.__drop_pending()
+        self.put_nowait(message)
+        return True
+
+    async def get(self) -> Message:
+        if self.disconnected:
+            raise MessageQueueOverflow(f"Subscriber {self.subscriber_id} has been disconnected: too many messages.")
+        return await super().get()
+
+    async def get_batch(self, max_size: int, wait: timedelta = timedelta(0)) -> List[Message]:
+        """
+        Wait for the next message and return it together with all messages that are available.
+        :param max_size: the maximum number of messages to return.
+        :param wait: after the first message is available, wait at most this duration to fill the batch.
+        :return: a batch of at least one and at most max_size messages.
+        """
+        batch = [await self.get()]
+        deadline = perf_counter() + wait.total_seconds()
+        while len(batch) < max_size:
+            if not self.empty():
+                batch.append(self.get_nowait())
+            else:
+                remaining = deadline - perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+        return batch
+
+    def __drop_pending(self, message_type: Optional[str] = None) -> None:
+        if message_type is not None:
+            for idx, pending in enumerate(self._queue):
+                if pending.message_type == message_type:
+                    del self._queue[idx]
+                    self.__drop()
+                    return
+        self.get_nowait()
+        self.__drop()
+
+    def __drop(self) -> None:
+        self.dropped += 1
+        self.__dropped_metric.inc()
+
+
 class MessageBus:
     """
     This class implements a simple event bus.
     Every subscriber is context managed and gets its own queue of events.
+    Emitting a message never waits for a subscriber.
     """
 
     def __init__(self) -> None:
         # key is the channel name, value is the list of queues
-        self.listeners: Dict[str, List[Queue[Message]]] = {}
+        self.listeners: Dict[str, List[MessageQueue]] = {}
         # key is the subscriber id, value is the list of queue names
         self.active_listener: Dict[str, List[str]] = {}
 
     @asynccontextmanager
     async def subscribe(
-        self, subscriber_id: str, channels: Optional[List[str]] = None, queue_size: int = 0
-    ) -> AsyncGenerator[Queue[Message], None]:
+        self,
+        subscriber_id: str,
+        channels: Optional[List[str]] = None,
+        queue_size: int = 0,
+        overflow: OverflowPolicy = OverflowPolicy.DropOldest,
+    ) -> AsyncGenerator[MessageQueue, None]:
         """
         Subscribe to a list of event channels.
         All events that match the channel will be written to this queue.
@@ -185,10 +321,11 @@ class MessageBus:
 
         :param subscriber_id: the id of the subscriber.
         :param channels: the list of channels to subscribe to. In case if empty list: all channels.
-        :param queue_size: the size of elements that can be buffered in the queue.
+        :param queue_size: the size of elements that can be buffered in the queue. 0 means unbounded.
+        :param overflow: defines what happens, if the queue is bounded and full.
         :return: the context managed queue.
         """
-        queue: Queue[Message] = Queue(queue_size)
+        queue = MessageQueue(subscriber_id, queue_size, overflow)
 
         def add_listener(name: str) -> None:
             if name not in self.listeners:
@@ -201,6 +338,12 @@ class MessageBus:
             if len(self.listeners[name]) == 0:
                 del self.listeners[name]
 
+        def remove_metrics() -> None:
+            with suppress(KeyError):
+                MessageBusQueueSize.remove(subscriber_id)  # type: ignore
+            with suppress(KeyError):
+                MessageBusDropped.remove(subscriber_id, overflow.name)  # type: ignore
+
         ch_list = channels if channels else ["*"]
         if len(ch_list) == 0:
             raise AttributeError("Need at least one channel to subscribe to!")
@@ -209,6 +352,7 @@ class MessageBus:
             self.active_listener[subscriber_id] = ch_list
             for channel in ch_list:
                 add_listener(channel)
+            MessageBusQueueSize.labels(subscriber_id).set_function(queue.qsize)  # type: ignore
             log.info(f"Listener {subscriber_id} added to following queues: {ch_list}")
             yield queue
         finally:
@@ -216,18 +360,18 @@ class MessageBus:
             for channel in ch_list:
                 remove_listener(channel)
             self.active_listener.pop(subscriber_id, None)
+            remove_metrics()
             await self.emit_event(CoreMessage.Disconnected, {"subscriber_id": subscriber_id, "channels": channels})
 
     async def emit_event(self, event_type: str, data: Json) -> None:
         return await self.emit(Event(event_type, data))
 
     async def emit(self, message: Message) -> None:
-        async def emit_by(name: str) -> None:
-            for listener in self.listeners.get(name, []):
-                await listener.put(message)
-
-        await emit_by(message.message_type)  # inform specific listener
-        await emit_by("*")  # inform "all" event listener
+        # messages are offered to the queues: this call never waits for a subscriber
+        for listener in self.listeners.get(message.message_type, []):  # inform specific listener
+            listener.offer(message)
+        for listener in self.listeners.get("*", []):  # inform "all" event listener
+            listener.offer(message)
 
 
 set_deserializer(Message.from_json, Message)
@@ -10,6 +10,13 @@ MethodDuration = Histogram("method_call_duration", "Duration of single method ca
 RequestCount = Counter("requests_total", "Total Request Count", ["method", "endpoint", "http_status"])
 RequestLatency = Histogram("request_latency_seconds", "Request latency", ["endpoint"])  # type: ignore
 RequestInProgress = Gauge("requests_in_progress_total", "Requests in progress", ["endpoint", "method"])  # type: ignore
+MessageBusQueueSize = Gauge("message_bus_queue_size", "Queued messages of a subscriber", ["subscriber"])  # type: ignore
+MessageBusDropped = Counter(
+    "message_bus_dropped_messages", "Messages dropped for a subscriber that can not keep up", ["subscriber", "overflow"]
+)
+JobsRunning = Gauge("jobs_running", "CLI commands of jobs that are currently executed")  # type: ignore
+JobsQueued = Gauge("jobs_queued", "CLI commands of jobs that wait for a free execution slot")  # type: ignore
+JobDuration = Histogram("job_duration_seconds", "Duration of a CLI command executed by a job")  # type: ignore
 
 # Create a type that is bound to the underlying wrapped function
 # This way all signature information is preserved!
@@ -20,7 +20,7 @@ log = logging.getLogger(__name__)
 # This version is used when the content hash of a node is computed.
 # All computed hashes will be invalidated, by incrementing the version.
 # This can be used, if computed values should be recomputed for all imported data.
-ContentHashVersion = 3
+ContentHashVersion = 4
 
 
 class Section:
@@ -171,6 +171,15 @@ class GraphBuilder:
             sha256.update(json.dumps(metadata, sort_keys=True).encode("utf-8"))
         return sha256.hexdigest()
 
+    @staticmethod
+    def ancestors_hash(content_hash: str, ancestor_ids: List[str]) -> str:
+        sha256 = hashlib.sha256()
+        sha256.update(content_hash.encode("utf-8"))
+        for ancestor_id in ancestor_ids:
+            sha256.update(ancestor_id.encode("utf-8"))
+            sha256.update(b"\0")
+        return sha256.hexdigest()
+
     @staticmethod
     def flatten(js: Json, kind: Kind) -> str:
         result = ""
@@ -276,6 +285,7 @@ class GraphAccess:
             log.info("Resolve attributes in graph")
             for node_id in self.nodes:
                 self.__resolve(node_id, self.nodes[node_id])
+            self.__resolve_ancestor_ids()
             self.__resolve_count_descendants()
             log.info("Resolve attributes finished.")
 
@@ -314,6 +324,16 @@ class GraphAccess:
                     total = reduce(lambda l, r: l + r, summary.values(), 0)
                     set_value_in_path(total, NodePath.descendant_count, node)
 
+    def __resolve_ancestor_ids(self) -> None:
+        # Materialize the ids of all ancestors, so ancestors can be looked up without graph traversal.
+        # Order is breadth first: nearest ancestors come first, the graph root comes last.
+        for node_id, node in self.g.nodes(data=True):
+            ancestor_ids = self.ancestor_ids(node_id, EdgeType.default)
+            set_value_in_path(ancestor_ids, NodePath.ancestor_ids, node)
+            # Only nodes with a changed hash are written: a node moved under another parent needs a new hash.
+            if "hash" in node:
+                node["hash"] = GraphBuilder.ancestors_hash(node["hash"], ancestor_ids)
+
     def __resolve(self, node_id: str, node: Json) -> Json:
         def with_ancestor(ancestor: Json, prop: ResolveProp) -> None:
             extracted = value_in_path(ancestor, prop.extract_path)
@@ -363,6 +383,21 @@ class GraphAccess:
             next_level = parents
         return None
 
+    def ancestor_ids(self, node_id: str, edge_type: str) -> List[str]:
+        visited: Set[str] = {node_id}
+        result: List[str] = []
+        next_level = [node_id]
+        while next_level:
+            parents: List[str] = []
+            for p_id in next_level:
+                for pred in self.predecessors(p_id, edge_type):
+                    if pred not in visited:
+                        visited.add(pred)
+                        parents.append(pred)
+            result.extend(parents)
+            next_level = parents
+        return result
+
     def is_acyclic_per_edge_type(self) -> bool:
         """
         Checks if the graph is acyclic with respect to a specific edge type.
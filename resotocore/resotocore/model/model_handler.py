@@ -51,6 +51,13 @@ class ModelHandlerDB(ModelHandler):
             self.__loaded_model = model
             return model
 
+    def invalidate(self) -> None:
+        """
+        Forget the loaded model: it is loaded from the database with the next access.
+        This is required, if the model can be changed by another process.
+        """
+        self.__loaded_model = None
+
     async def uml_image(
         self,
         show_packages: Optional[List[str]] = None,
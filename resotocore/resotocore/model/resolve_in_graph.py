@@ -10,6 +10,7 @@ from resotocore.util import value_in_path_get
 class NodePath:
     node_id = ["id"]
     kinds = ["kinds"]
+    ancestor_ids = ["ancestor_ids"]
     type = ["type"]
     revision = ["revision"]
     reported = ["reported"]
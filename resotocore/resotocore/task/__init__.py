@@ -21,6 +21,19 @@ class TaskHandler(ABC):
     async def delete_job(self, job_id: str) -> Optional[Job]:
         pass
 
+    @abstractmethod
+    async def add_jobs(self, jobs: List[Job]) -> None:
+        """
+        Add or update all given jobs at once.
+        """
+
+    @abstractmethod
+    async def delete_jobs(self, job_ids: List[str]) -> List[Job]:
+        """
+        Delete all jobs with given ids at once.
+        :return: the deleted jobs. Unknown ids are ignored.
+        """
+
     @abstractmethod
     async def parse_job_line(
         self, source: str, line: str, env: Optional[Dict[str, str]] = None, mutable: bool = True
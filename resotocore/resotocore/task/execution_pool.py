@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from datetime import timedelta
+from typing import List, Any
+
+from aiostream import stream
+
+from resotocore.cli.cli import CLI
+from resotocore.cli.model import CLIContext
+from resotocore.error import JobQueueFull
+from resotocore.metrics import JobsRunning, JobsQueued, JobDuration, perf_now
+
+log = logging.getLogger(__name__)
+
+
+class JobExecutionPool:
+    """
+    Executes the CLI commands of jobs and workflows.
+    At most `concurrency` commands are executed at the same time, all other commands wait in a queue.
+    Every command has a time limit, which includes the time in the queue: a command that takes longer is cancelled.
+    This limits the number of cron jobs, that compete with interactive API calls.
+    Note: the commands are still executed in process on the event loop, that also serves the API.
+    """
+
+    def __init__(self, cli: CLI, concurrency: int = 4, max_queued: int = 100):
+        self.cli = cli
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.slots = asyncio.Semaphore(concurrency)
+        self.queued = 0
+        self.running = 0
+
+    async def execute(self, command: str, ctx: CLIContext, timeout: timedelta) -> List[Any]:
+        """
+        Execute the command as soon as an execution slot is available.
+        :param command: the CLI command to execute.
+        :param ctx: the context of the command.
+        :param timeout: the time limit of this command including the time in the queue.
+        :return: all elements of the resulting stream.
+        :raises JobQueueFull: if too many commands are waiting already.
+        :raises TimeoutError: if the command could not be executed in time.
+        """
+        if self.queued >= self.max_queued:
+            raise JobQueueFull(f"Too many queued jobs ({self.queued}). Can not execute: {command}")
+        deadline = perf_now() + timeout.total_seconds()
+        self.queued += 1
+        JobsQueued.inc()  # type: ignore
+        try:
+            await self.__acquire_slot(timeout.total_seconds())
+        finally:
+            self.queued -= 1
+            JobsQueued.dec()  # type: ignore
+        self.running += 1
+        JobsRunning.inc()  # type: ignore
+        started = perf_now()
+        try:
+            log.info(f"Execute job command: {command}")
+            return await asyncio.wait_for(self.cli.execute_cli_command(command, stream.list, ctx), deadline - started)
+        finally:
+            JobDuration.observe(perf_now() - started)  # type: ignore
+            JobsRunning.dec()  # type: ignore
+            self.running -= 1
+            self.slots.release()
+
+    async def __acquire_slot(self, timeout: float) -> None:
+        # wait_for(acquire()) can lose a slot (Python < 3.11): the timeout might hit after the slot was acquired.
+        acquire = asyncio.ensure_future(self.slots.acquire())
+        try:
+            await asyncio.wait([acquire], timeout=timeout)
+        except BaseException:
+            # the caller is cancelled: give back a slot, that has been acquired in the meantime
+            if acquire.done() and not acquire.cancelled() and acquire.exception() is None:
+                self.slots.release()
+            else:
+                acquire.cancel()
+            raise
+        if not acquire.done():
+            # the acquisition is cancelled: a cancelled waiter does not take a slot
+            acquire.cancel()
+            raise asyncio.TimeoutError()
@@ -3,7 +3,7 @@ from __future__ import annotations
 import logging
 import uuid
 from abc import ABC
-from datetime import timedelta
+from datetime import timedelta, datetime
 from enum import Enum
 from typing import Optional, Any, Sequence, MutableSequence, Callable, Dict, List, Set, Tuple
 
@@ -521,6 +521,7 @@ class ExecuteCommandState(StepState):
         super().__init__(step, instance)
         self.execute = execute
         self.execution_done = False
+        self.execution_failed = False
 
     def commands_to_execute(self) -> Sequence[TaskCommand]:
         # override now: always use the time when the task has been triggered
@@ -530,7 +531,12 @@ class ExecuteCommandState(StepState):
     def handle_command_results(self, results: Dict[TaskCommand, Any]) -> None:
         found = first(lambda r: isinstance(r, ExecuteOnCLI) and r.command == self.execute.command, results.keys())
         if found:
-            log.info(f"Result of command {self.execute.command} is {results[found]}")
+            result = results[found]
+            if isinstance(result, Exception):
+                log.warning(f"Command {self.execute.command} failed: {type(result).__name__} {result}")
+                self.execution_failed = True
+            else:
+                log.info(f"Result of command {self.execute.command} is {result}")
             self.execution_done = True
 
     def current_step_done(self) -> bool:
@@ -640,6 +646,13 @@ class RunningTask:
     def is_active(self) -> bool:
         return not isinstance(self.current_state, EndState)
 
+    @property
+    def step_deadline(self) -> datetime:
+        """
+        The point in time when the current step times out.
+        """
+        return self.step_started_at + self.current_state.timeout()
+
     def handle_event(self, event: Event) -> Tuple[bool, Sequence[TaskCommand]]:
         if self.current_state.handle_event(event):
             return True, self.move_to_next_state()
@@ -675,7 +688,17 @@ class RunningTask:
             return []
 
     def handle_command_results(self, results: Dict[TaskCommand, Any]) -> Sequence[TaskCommand]:
-        self.current_state.handle_command_results(results)
+        """
+        A failed command is reported with the exception as result.
+        Whether or not a failed command leads to the end of this task is decided by the current step error behaviour.
+        """
+        state = self.current_state
+        state.handle_command_results(results)
+        failed = isinstance(state, ExecuteCommandState) and state.execution_failed
+        if failed and self.current_step.on_error == StepErrorBehaviour.Stop:
+            log.info(f"Task: {self.id}: Step {self.current_step.name} failed. Stop this task.")
+            self.end()
+            return []
         return self.move_to_next_state()
 
     def end(self) -> None:
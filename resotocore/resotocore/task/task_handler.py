@@ -5,6 +5,7 @@ import logging
 import re
 from argparse import Namespace
 from asyncio import Task, CancelledError
+from collections import defaultdict
 from contextlib import suppress
 from copy import copy
 from dataclasses import replace
@@ -13,7 +14,8 @@ from functools import reduce
 from io import TextIOWrapper
 from typing import Optional, Any, Callable, Union, Sequence, Dict, List, Tuple
 
-from aiostream import stream
+from apscheduler.job import Job as ScheduledJob
+from apscheduler.jobstores.base import JobLookupError
 
 from resotocore.analytics import AnalyticsEventSender, CoreEvent
 from resotocore.cli import strip_quotes
@@ -27,6 +29,7 @@ from resotocore.task import TaskHandler
 from resotocore.task.model import Subscriber
 from resotocore.task.scheduler import Scheduler
 from resotocore.task.start_workflow_on_first_subscriber import wait_and_start
+from resotocore.task.execution_pool import JobExecutionPool
 from resotocore.task.subscribers import SubscriptionHandler
 from resotocore.task.task_description import (
     Workflow,
@@ -45,7 +48,7 @@ from resotocore.task.task_description import (
     StepErrorBehaviour,
     RestartAgainStepAction,
 )
-from resotocore.util import first, Periodic, group_by, uuid_str, utc_str, utc
+from resotocore.util import first, Periodic, uuid_str, utc_str, utc, Deadlines
 
 log = logging.getLogger(__name__)
 
@@ -74,17 +77,27 @@ class TaskHandlerService(TaskHandler):
         self.cli = cli
         self.cli_context = CLIContext()
         self.args = args
+        # CLI commands of jobs are executed with limited concurrency
+        self.execution_pool = JobExecutionPool(cli, args.job_concurrency, args.job_queue_size)
         # note: the waiting queue is kept in memory and lost when the service is restarted.
         self.start_when_done: Dict[str, TaskDescription] = {}
 
         # Step1: define all workflows and jobs in code: later it will be persisted and read from database
         self.task_descriptions: Sequence[TaskDescription] = [*self.known_workflows(), *self.known_jobs()]
         self.tasks: Dict[str, RunningTask] = {}
+        # task id -> deadline of the current step: only tasks with expired deadlines are checked
+        self.deadlines: Deadlines[str] = Deadlines()
         self.message_bus_watcher: Optional[Task] = None  # type: ignore # pypy
         self.initial_start_workflow_task: Optional[Task] = None  # type: ignore # pypy
         self.timeout_watcher = Periodic("task_timeout_watcher", self.check_overdue_tasks, timedelta(seconds=10))
-        self.registered_event_trigger: List[Tuple[EventTrigger, TaskDescription]] = []
-        self.registered_event_trigger_by_message_type: Dict[str, List[Tuple[EventTrigger, TaskDescription]]] = {}
+        # descriptor id -> event triggers of this descriptor
+        self.registered_event_trigger: Dict[str, List[EventTrigger]] = {}
+        # message type -> descriptor id -> event triggers: only triggers of the message type are checked
+        self.registered_event_trigger_by_message_type: Dict[
+            str, Dict[str, List[Tuple[EventTrigger, TaskDescription]]]
+        ] = defaultdict(dict)
+        # descriptor id -> scheduled jobs of all time triggers
+        self.registered_time_trigger: Dict[str, List[ScheduledJob]] = {}
 
     # endregion
 
@@ -92,25 +105,33 @@ class TaskHandlerService(TaskHandler):
 
     async def update_trigger(self, desc: TaskDescription, register: bool = True) -> None:
         # safeguard: unregister all event trigger of this task
-        for existing in (tup for tup in self.registered_event_trigger if desc.id == tup[1].id):
-            self.registered_event_trigger.remove(existing)
+        for trigger in self.registered_event_trigger.pop(desc.id, []):
+            by_descriptor = self.registered_event_trigger_by_message_type[trigger.message_type]
+            by_descriptor.pop(desc.id, None)
+            if not by_descriptor:
+                del self.registered_event_trigger_by_message_type[trigger.message_type]
         # safeguard: unregister all schedule trigger of this task
-        for job in self.scheduler.list_jobs():
-            if str(job.id).startswith(desc.id):
+        for job in self.registered_time_trigger.pop(desc.id, []):
+            with suppress(JobLookupError):
                 job.remove()
         # add all triggers
         if register:
-            for trigger in desc.triggers:
-                if isinstance(trigger, EventTrigger):
-                    self.registered_event_trigger.append((trigger, desc))
-                if isinstance(trigger, TimeTrigger):
-                    uid = f"{desc.id}_{trigger.cron_expression}"
-                    name = f"Trigger for task {desc.id} on cron expression {trigger.cron_expression}"
-                    self.scheduler.cron(uid, name, trigger.cron_expression, self.time_triggered, desc, trigger)
-        # recompute the lookup table
-        self.registered_event_trigger_by_message_type = group_by(
-            lambda t: t[0].message_type, self.registered_event_trigger
-        )
+            event_trigger = [trigger for trigger in desc.triggers if isinstance(trigger, EventTrigger)]
+            if event_trigger:
+                self.registered_event_trigger[desc.id] = event_trigger
+                for trigger in event_trigger:
+                    by_descriptor = self.registered_event_trigger_by_message_type[trigger.message_type]
+                    by_descriptor.setdefault(desc.id, []).append((trigger, desc))
+            scheduled = []
+            for time_trigger in (trigger for trigger in desc.triggers if isinstance(trigger, TimeTrigger)):
+                cron_expression = time_trigger.cron_expression
+                uid = f"{desc.id}_{cron_expression}"
+                name = f"Trigger for task {desc.id} on cron expression {cron_expression}"
+                scheduled.append(
+                    self.scheduler.cron(uid, name, cron_expression, self.time_triggered, desc, time_trigger)
+                )
+            if scheduled:
+                self.registered_time_trigger[desc.id] = scheduled
 
     # task descriptors can hold placeholders (e.g. @NOW@)
     # which should be replaced, when the task is started (or restarted).
@@ -159,6 +180,7 @@ class TaskHandlerService(TaskHandler):
                 log.info(f"New task {desc.name} should replace existing run: {existing.id}.")
                 existing.end()
                 await self.store_running_task_state(existing)
+                self.watch_deadline(existing)
                 return await self.start_task_directly(desc, reason)
             elif desc.on_surpass == TaskSurpassBehaviour.Parallel:
                 log.info(f"New task {desc.name} will race with existing run {existing.id}.")
@@ -222,10 +244,16 @@ class TaskHandlerService(TaskHandler):
 
         # load job descriptions from database
         db_jobs = [job async for job in self.job_db.all()]
-        self.task_descriptions = [*self.task_descriptions, *jobs, *db_jobs]
+        # the service can be started again after stop: rebuild the list from scratch,
+        # so that jobs deleted in the meantime (e.g. by another leader) are not registered again
+        descriptions = {desc.id: desc for desc in [*self.known_workflows(), *self.known_jobs(), *jobs, *db_jobs]}
+        self.task_descriptions = list(descriptions.values())
 
         # load and restore all tasks
         self.tasks = {wi.id: wi for wi in await self.start_interrupted_tasks()}
+        self.deadlines = Deadlines()
+        for wi in self.tasks.values():
+            self.watch_deadline(wi)
 
         await self.timeout_watcher.start()
 
@@ -284,6 +312,9 @@ class TaskHandlerService(TaskHandler):
         if self.initial_start_workflow_task and not self.initial_start_workflow_task.done():
             self.initial_start_workflow_task.cancel()
 
+        # write all pending state updates of running tasks
+        await self.running_task_db.flush()
+
     # endregion
 
     # region job handler
@@ -305,18 +336,25 @@ class TaskHandlerService(TaskHandler):
         return [td for td in self.task_descriptions if isinstance(td, Workflow)]
 
     async def add_job(self, job: Job) -> None:
-        descriptions = list(self.task_descriptions)
-        existing = first(lambda td: td.id == job.id, descriptions)
-        if existing:
-            if not existing.mutable:
-                raise AttributeError(f"There is an existing job with this {job.id} which can not be deleted!")
-            log.info(f"Job with id {job.id} already exists. Update this job.")
-            descriptions.remove(existing)
-        # store in database
-        await self.job_db.update(job)
-        descriptions.append(job)
-        self.task_descriptions = descriptions
-        await self.update_trigger(job)
+        await self.add_jobs([job])
+
+    async def add_jobs(self, jobs: List[Job]) -> None:
+        descriptions = {td.id: td for td in self.task_descriptions}
+        for job in jobs:
+            existing = descriptions.get(job.id)
+            if existing:
+                if not existing.mutable:
+                    raise AttributeError(f"There is an existing job with this {job.id} which can not be deleted!")
+                log.info(f"Job with id {job.id} already exists. Update this job.")
+        # store all jobs in database with one request
+        await self.job_db.update_many(jobs)
+        for job in jobs:
+            # an updated job is moved to the end
+            descriptions.pop(job.id, None)
+            descriptions[job.id] = job
+        self.task_descriptions = list(descriptions.values())
+        for job in jobs:
+            await self.update_trigger(job)
 
     async def delete_running_task(self, task: RunningTask) -> None:
         # send analytics event
@@ -334,6 +372,7 @@ class TaskHandlerService(TaskHandler):
         task.descriptor_alive = False
         # remove tasks from list of running tasks
         self.tasks.pop(task.id, None)
+        self.deadlines.cancel(task.id)
         if task.update_task and not task.update_task.done():
             task.update_task.cancel()
 
@@ -344,20 +383,27 @@ class TaskHandlerService(TaskHandler):
             await self.running_task_db.delete(task.id)
 
     async def delete_job(self, job_id: str) -> Optional[Job]:
-        job: Job = first(lambda td: td.id == job_id and isinstance(td, Job), self.task_descriptions)  # type: ignore
-        if job:
+        deleted = await self.delete_jobs([job_id])
+        return deleted[0] if deleted else None
+
+    async def delete_jobs(self, job_ids: List[str]) -> List[Job]:
+        ids = set(job_ids)
+        jobs = [td for td in self.task_descriptions if td.id in ids and isinstance(td, Job)]
+        for job in jobs:
             if not job.mutable:
                 raise AttributeError(f"Can not delete job: {job.id} - it is defined in a system file!")
-            # delete all running tasks of this job
-            for task in list(filter(lambda x: x.descriptor.id == job.id, self.tasks.values())):
-                log.info(f"Job: {job_id}: delete running task: {task.id}")
+        if jobs:
+            deleted = {job.id for job in jobs}
+            # delete all running tasks of these jobs
+            for task in [task for task in self.tasks.values() if task.descriptor.id in deleted]:
+                log.info(f"Job: {task.descriptor.id}: delete running task: {task.id}")
                 await self.delete_running_task(task)
-            await self.job_db.delete(job_id)
-            descriptions = list(self.task_descriptions)
-            descriptions.remove(job)
-            self.task_descriptions = descriptions
-            await self.update_trigger(job, register=False)
-        return job
+            # delete all jobs in database with one request
+            await self.job_db.delete_many(list(deleted))
+            self.task_descriptions = [td for td in self.task_descriptions if td.id not in deleted]
+            for job in jobs:
+                await self.update_trigger(job, register=False)
+        return jobs
 
     # endregion
 
@@ -369,12 +415,12 @@ class TaskHandlerService(TaskHandler):
 
     async def check_for_task_to_start_on_message(self, msg: Message) -> None:
         # check if this event triggers any new task
-        for trigger, descriptor in self.registered_event_trigger_by_message_type.get(msg.message_type, []):
-            if msg.message_type == trigger.message_type:
-                comp = trigger.filter_data
-                if {key: msg.data.get(key) for key in comp} == comp if comp else True:
-                    log.info(f"Event {msg.message_type} triggers task: {descriptor.name}")
-                    await self.start_task(descriptor, "event")
+        by_descriptor = self.registered_event_trigger_by_message_type.get(msg.message_type, {})
+        for trigger, descriptor in [t for triggers in by_descriptor.values() for t in triggers]:
+            comp = trigger.filter_data
+            if {key: msg.data.get(key) for key in comp} == comp if comp else True:
+                log.info(f"Event {msg.message_type} triggers task: {descriptor.name}")
+                await self.start_task(descriptor, "event")
 
     async def handle_event(self, event: Event) -> None:
         # check if any running task want's to handle this event
@@ -421,10 +467,18 @@ class TaskHandlerService(TaskHandler):
                     await self.message_bus.emit(command.message)
                     results[command] = None
                 elif isinstance(command, ExecuteOnCLI):
-                    # TODO: instead of executing it in process, we should do an http call here to a worker core.
                     ctx = CLIContext({**command.env, **wi.descriptor.environment})
-                    result = await self.cli.execute_cli_command(command.command, stream.list, ctx)
-                    results[command] = result
+                    timeout = wi.current_step.timeout
+                    # the error is the result of a failed command: the step decides how to handle it
+                    try:
+                        # TODO: instead of executing it in process, we should do an http call here to a worker core.
+                        results[command] = await self.execution_pool.execute(command.command, ctx, timeout)
+                    except asyncio.TimeoutError as ex:
+                        log.warning(f"Task {wi.id}: {wi.descriptor.name} cancelled {command.command} after {timeout}.")
+                        results[command] = ex
+                    except Exception as ex:
+                        log.error(f"Task {wi.id}: {wi.descriptor.name} could not execute {command.command}: {ex}")
+                        results[command] = ex
                 else:
                     raise AttributeError(f"Does not understand this command: {wi.descriptor.name}:  {command}")
             # The descriptor might be removed in the mean time. If this is the case stop execution.
@@ -440,12 +494,15 @@ class TaskHandlerService(TaskHandler):
                 elif active_before_result and not wi.is_active:
                     # if this was the last result the task was waiting for, delete the task
                     await self.store_running_task_state(wi, origin_message)
+                self.watch_deadline(wi)
 
         async def execute_in_order(task: Task) -> None:  # type: ignore # pypy
             # make sure the last execution is finished, before the new execution starts
             await task
             await execute_commands()
 
+        # the state of the task might have changed
+        self.watch_deadline(wi)
         # start execution of commands in own task to not block the task handler
         # note: the task is awaited finally in the timeout handler or context handler shutdown
         wi.update_task = asyncio.create_task(execute_in_order(wi.update_task) if wi.update_task else execute_commands())
@@ -464,29 +521,43 @@ class TaskHandlerService(TaskHandler):
 
     # region periodic task checker
 
+    def watch_deadline(self, task: RunningTask) -> None:
+        """
+        Register the deadline of the current step of this task.
+        Tasks that are done are checked with the next run of the overdue checker.
+        """
+        if task.id in self.tasks:
+            self.deadlines.schedule(task.id, task.step_deadline if task.is_active else utc())
+
     async def check_overdue_tasks(self) -> None:
         """
         Called periodically by the system.
+        Only tasks with an expired deadline are checked.
         In case there is an overdue task, an action error is injected into the task.
         """
-        for task in list(self.tasks.values()):
+        for task_id in self.deadlines.expired():
+            task = self.tasks.get(task_id)
+            if task is None:
+                continue
             if task.is_active:  # task is still active
-                if task.current_state.check_timeout():
-                    if task.current_step.on_error == StepErrorBehaviour.Continue:
-                        current_step = task.current_step.name
-                        commands = task.move_to_next_state()
-                        log.warning(
-                            f"Task {task.id}: {task.descriptor.name} timed out in step "
-                            f"{current_step}. Moving on to step: {task.current_step.name}."
-                        )
-                        await self.execute_task_commands(task, commands)
-                    else:
-                        log.warning(
-                            f"Task {task.id}: {task.descriptor.name} timed out "
-                            f"in step {task.current_step.name}. Stop the task."
-                        )
-                        task.end()
-                        await self.store_running_task_state(task)
+                if not task.current_state.check_timeout():
+                    # the step has changed or the timeout of the step has been extended
+                    self.watch_deadline(task)
+                elif task.current_step.on_error == StepErrorBehaviour.Continue:
+                    current_step = task.current_step.name
+                    commands = task.move_to_next_state()
+                    log.warning(
+                        f"Task {task.id}: {task.descriptor.name} timed out in step "
+                        f"{current_step}. Moving on to step: {task.current_step.name}."
+                    )
+                    await self.execute_task_commands(task, commands)
+                else:
+                    log.warning(
+                        f"Task {task.id}: {task.descriptor.name} timed out "
+                        f"in step {task.current_step.name}. Stop the task."
+                    )
+                    task.end()
+                    await self.store_running_task_state(task)
             # check again for active (might have changed for overdue tasks)
             if not task.is_active:
                 if task.update_task:
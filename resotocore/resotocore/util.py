@@ -1,10 +1,15 @@
 from __future__ import annotations
 import asyncio
+import bisect
 import hashlib
+import heapq
 import json
 import logging
+import math
+import mmap
 import random
 import string
+import tempfile
 import uuid
 from asyncio import Task, Future
 from collections import defaultdict
@@ -26,10 +31,14 @@ from typing import (
     Iterator,
     Union,
     Sequence,
+    Set,
+    IO,
+    Generic,
 )
 
 import sys
 from dateutil.parser import isoparse
+from parsy import ParseError
 
 from resotocore.durations import parse_duration
 from resotocore.types import JsonElement, Json
@@ -54,6 +63,13 @@ def json_hash(js: Json) -> str:
     return sha256.hexdigest()
 
 
+def json_digest(js: JsonElement) -> bytes:
+    """
+    Fixed size 128 bit digest of a json element, which is ignorant of the order of properties.
+    """
+    return hashlib.blake2b(json.dumps(js, sort_keys=True).encode("utf-8"), digest_size=16).digest()
+
+
 def pop_keys(d: Dict[AnyT, AnyR], keys: List[AnyT]) -> Dict[AnyT, AnyR]:
     res = dict(d)
     for key in keys:
@@ -77,6 +93,12 @@ def utc_str(dt: datetime = utc()) -> str:
 
 
 def from_utc(date_string: str) -> datetime:
+    # fast path for the format used to store all timestamps: fromisoformat is much faster than isoparse
+    if date_string.endswith("Z"):
+        try:
+            return datetime.fromisoformat(date_string[:-1] + "+00:00")
+        except ValueError:
+            pass
     return isoparse(date_string)
 
 
@@ -84,6 +106,18 @@ def duration(d: str) -> timedelta:
     return parse_duration(d)
 
 
+def time_or_duration_ago(value: str) -> datetime:
+    """
+    Parse a point in time: either a timestamp (e.g. 2021-01-02T03:04:05Z) or a duration before now (e.g. 3d).
+    Timestamps without timezone are interpreted as UTC.
+    """
+    try:
+        return utc() - parse_duration(value)
+    except ParseError:
+        at = from_utc(value)
+        return at if at.tzinfo else at.replace(tzinfo=timezone.utc)
+
+
 def uuid_str(from_object: Optional[Any] = None) -> str:
     if from_object:
         return str(uuid.uuid5(uuid.NAMESPACE_DNS, from_object))
@@ -238,6 +272,78 @@ async def force_gen(gen: AsyncIterator[AnyT]) -> AsyncIterator[AnyT]:
         return gen
 
 
+async def gather_limited(awaitables: Iterable[Awaitable[AnyT]], parallelism: int) -> List[AnyT]:
+    """
+    Await all given awaitables, where at most parallelism of them are awaited at the same time.
+    The results are returned in the order of the awaitables.
+    If one of the awaitables fails, all others are cancelled and the error is raised.
+    """
+    semaphore = asyncio.Semaphore(max(1, parallelism))
+
+    async def limited(awaitable: Awaitable[AnyT]) -> AnyT:
+        async with semaphore:
+            return await awaitable
+
+    tasks = [asyncio.ensure_future(limited(awaitable)) for awaitable in awaitables]
+    try:
+        return list(await asyncio.gather(*tasks))
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        # wait for cancelled tasks to finish - no exceptions are raised from here
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class _Failed:
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+async def prefetch_ordered(
+    producers: Sequence[Callable[[], AsyncIterator[AnyT]]], parallelism: int, buffer_size: int
+) -> AsyncGenerator[AsyncIterator[AnyT], None]:
+    """
+    Yield the iterators of all producers in order, while up to parallelism producers are consumed ahead of time.
+    Every producer buffers at most buffer_size elements, until its iterator is consumed.
+    Note: the yielded iterator has to be consumed completely, before the next one is requested.
+    """
+    done = object()
+    queues: List[asyncio.Queue[Any]] = []
+    tasks: List[Task[None]] = []
+
+    async def fill(producer: Callable[[], AsyncIterator[AnyT]], queue: asyncio.Queue[Any]) -> None:
+        try:
+            async for elem in producer():
+                await queue.put(elem)
+            await queue.put(done)
+        except Exception as ex:
+            await queue.put(_Failed(ex))
+
+    async def drain(queue: asyncio.Queue[Any]) -> AsyncIterator[AnyT]:
+        while True:
+            elem = await queue.get()
+            if elem is done:
+                return
+            elif isinstance(elem, _Failed):
+                raise elem.error
+            yield elem
+
+    try:
+        for idx in range(len(producers)):
+            # start producers ahead of time - at most parallelism producers are running
+            while len(tasks) < min(len(producers), idx + max(1, parallelism)):
+                queue: asyncio.Queue[Any] = asyncio.Queue(maxsize=max(1, buffer_size))
+                queues.append(queue)
+                tasks.append(asyncio.create_task(fill(producers[len(tasks)], queue)))
+            yield drain(queues[idx])
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
 def set_future_result(future: Future, result: Any) -> None:  # type: ignore # pypy
     if not future.done():
         if isinstance(result, Exception):
@@ -285,6 +391,8 @@ class Periodic:
             self._task.cancel()
             with suppress(asyncio.CancelledError):
                 await self._task
+            # allow to start again
+            self._task = None
 
     async def _run(self) -> None:
         await asyncio.sleep(self.first_run.total_seconds())
@@ -299,6 +407,186 @@ class Periodic:
             await asyncio.sleep(self.frequency.total_seconds())
 
 
+class Deadlines(Generic[AnyT]):
+    """
+    Deadlines of keys, ordered by time in a heap.
+    Scheduling a key again replaces its deadline, cancelling a key removes it.
+    Outdated heap entries are not removed eagerly, but skipped when they are popped.
+    Retrieving the expired keys only touches the expired entries and not all scheduled keys.
+    """
+
+    def __init__(self) -> None:
+        self.heap: List[Tuple[datetime, int, AnyT]] = []
+        self.deadlines: Dict[AnyT, datetime] = {}
+        self.counter = 0  # tie breaker for equal deadlines: keys do not need to be comparable
+
+    def schedule(self, key: AnyT, deadline: datetime) -> None:
+        if self.deadlines.get(key) != deadline:
+            self.deadlines[key] = deadline
+            self.counter += 1
+            heapq.heappush(self.heap, (deadline, self.counter, key))
+
+    def cancel(self, key: AnyT) -> None:
+        self.deadlines.pop(key, None)
+
+    def next_deadline(self) -> Optional[datetime]:
+        self.__drop_outdated()
+        return self.heap[0][0] if self.heap else None
+
+    def expired(self, now: Optional[datetime] = None) -> List[AnyT]:
+        """
+        Remove and return all keys with a deadline before or at the given time.
+        """
+        now = now or utc()
+        result = []
+        self.__drop_outdated()
+        while self.heap and self.heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(self.heap)
+            self.deadlines.pop(key, None)
+            result.append(key)
+            self.__drop_outdated()
+        return result
+
+    def __drop_outdated(self) -> None:
+        heap = self.heap
+        while heap and self.deadlines.get(heap[0][2]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def __len__(self) -> int:
+        return len(self.deadlines)
+
+    def __contains__(self, key: AnyT) -> bool:
+        return key in self.deadlines
+
+
+class DigestSet:
+    """
+    Set of 128 bit digests with bounded memory usage.
+    Digests are held in memory until max_in_memory is reached.
+    The digests in memory are then written as sorted run to a temporary file on disk.
+    Only a sparse index with every block_size-th digest of a run is held in memory.
+    Lookups check the digests in memory and the one block of every run that can contain the digest.
+    Runs are merged into a single run, once there are more than max_runs.
+    """
+
+    size = 16
+    block_size = 64
+
+    def __init__(self, max_in_memory: int = 250000, max_runs: int = 8, temp_dir: Optional[str] = None):
+        self.max_in_memory = max(1, max_in_memory)
+        self.max_runs = max_runs
+        self.temp_dir = temp_dir
+        self.in_memory: Set[bytes] = set()
+        self.runs: List[Tuple[IO[bytes], mmap.mmap, List[bytes]]] = []
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, digest: bytes) -> bool:
+        return digest in self.in_memory or any(self.__in_run(mm, index, digest) for _, mm, index in self.runs)
+
+    def add(self, digest: bytes) -> bool:
+        """
+        Add the digest to this set.
+        :return: True if the digest has not been part of this set, otherwise False
+        """
+        if digest in self:
+            return False
+        self.in_memory.add(digest)
+        self.count += 1
+        if len(self.in_memory) >= self.max_in_memory:
+            self.__spill()
+        return True
+
+    def close(self) -> None:
+        for file, mm, _ in self.runs:
+            mm.close()
+            file.close()
+        self.runs = []
+        self.in_memory = set()
+
+    def __in_run(self, mm: mmap.mmap, index: List[bytes], digest: bytes) -> bool:
+        block = bisect.bisect_right(index, digest) - 1
+        if block < 0:
+            return False
+        start = block * self.block_size * self.size
+        data = mm[start : start + self.block_size * self.size]  # noqa: E203
+        pos = data.find(digest)
+        # only matches at digest boundaries count
+        while pos >= 0 and pos % self.size:
+            pos = data.find(digest, pos + 1)
+        return pos >= 0
+
+    def __add_run(self, digests: Iterable[bytes]) -> None:
+        # the file is deleted from disk, as soon as it is closed
+        file = tempfile.TemporaryFile(dir=self.temp_dir)
+        index: List[bytes] = []
+        for num, digest in enumerate(digests):
+            if num % self.block_size == 0:
+                index.append(digest)
+            file.write(digest)
+        file.flush()
+        self.runs.append((file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ), index))
+
+    def __spill(self) -> None:
+        log.debug(f"Spill {len(self.in_memory)} digests to disk")
+        self.__add_run(sorted(self.in_memory))
+        self.in_memory = set()
+        if len(self.runs) > self.max_runs:
+            runs = self.runs
+            self.runs = []
+
+            def run_digests(mm: mmap.mmap) -> Iterator[bytes]:
+                for pos in range(0, len(mm), self.size):
+                    yield mm[pos : pos + self.size]  # noqa: E203
+
+            self.__add_run(heapq.merge(*[run_digests(mm) for _, mm, _ in runs]))
+            for file, mm, _ in runs:
+                mm.close()
+                file.close()
+
+
+class BloomFilter:
+    """
+    Probabilistic set of 128 bit digests with fixed memory usage.
+    A digest that has been added is always reported as contained.
+    A digest that has not been added is reported as contained with the probability of error_rate,
+    as long as not more than capacity digests are added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def add(self, digest: bytes) -> bool:
+        """
+        Add the digest to this filter.
+        :return: True if the digest has not been part of this filter, False if it probably has been.
+        """
+        # derive all bit positions from the 2 halves of the digest (Kirsch-Mitzenmacher)
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        contained = True
+        for i in range(self.num_hashes):
+            pos = (h1 + i * h2) % self.num_bits
+            mask = 1 << (pos & 7)
+            if not self.bits[pos >> 3] & mask:
+                contained = False
+                self.bits[pos >> 3] |= mask
+        if not contained:
+            self.count += 1
+        return not contained
+
+    def close(self) -> None:
+        self.bits = bytearray()
+
+
 class AccessNone:
     def __init__(self, not_existent: Any = None):
         self.__not_existent = not_existent
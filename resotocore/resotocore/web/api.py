@@ -14,6 +14,7 @@ from dataclasses import replace
 from datetime import timedelta
 from pathlib import Path
 from random import SystemRandom
+from time import perf_counter
 from typing import AsyncGenerator, Any, Optional, Sequence, Union, List, Dict, AsyncIterator, Tuple, Callable, Awaitable
 
 import prometheus_client
@@ -50,10 +51,12 @@ from resotocore.cli.model import (
 )
 from resotocore.config import ConfigHandler, ConfigValidation, ConfigEntity
 from resotocore.console_renderer import ConsoleColorSystem, ConsoleRenderer
+from resotocore.db import SearchProfile
 from resotocore.db.db_access import DbAccess
 from resotocore.db.graphdb import GraphDB
 from resotocore.db.model import QueryModel
-from resotocore.message_bus import MessageBus, Message, ActionDone, Action, ActionError
+from resotocore.leader_election import LeaderElection
+from resotocore.message_bus import MessageBus, Message, ActionDone, Action, ActionError, OverflowPolicy
 from resotocore.model.db_updater import merge_graph_process
 from resotocore.model.graph_access import Section
 from resotocore.model.model import Kind
@@ -64,8 +67,8 @@ from resotocore.task.model import Subscription
 from resotocore.task.subscribers import SubscriptionHandler
 from resotocore.task.task_handler import TaskHandlerService
 from resotocore.types import Json, JsonElement
-from resotocore.util import uuid_str, force_gen, rnd_str, if_set, duration, count_iterator
-from resotocore.web import auth
+from resotocore.util import uuid_str, force_gen, rnd_str, if_set, duration, count_iterator, prefetch_ordered
+from resotocore.web import auth, RequestHandler
 from resotocore.web.certificate_handler import CertificateHandler
 from resotocore.web.content_renderer import result_binary_gen, single_result
 from resotocore.web.directives import (
@@ -110,6 +113,7 @@ class Api:
         cli: CLI,
         query_parser: QueryParser,
         args: Namespace,
+        leader_election: Optional[LeaderElection] = None,
     ):
         self.db = db
         self.model_handler = model_handler
@@ -123,6 +127,7 @@ class Api:
         self.cli = cli
         self.query_parser = query_parser
         self.args = args
+        self.leader_election = leader_election
         self.app = web.Application(
             # note on order: the middleware is passed in the order provided.
             middlewares=[
@@ -186,26 +191,26 @@ class Api:
                 web.patch("/graph/{graph_id}/node/{node_id}", self.update_node),
                 web.delete("/graph/{graph_id}/node/{node_id}", self.delete_node),
                 web.patch("/graph/{graph_id}/node/{node_id}/section/{section}", self.update_node),
-                # Subscriptions
-                web.get("/subscribers", self.list_all_subscriptions),
-                web.get("/subscribers/for/{event_type}", self.list_subscription_for_event),
+                # Subscriptions: subscribers are maintained and connected on the leader
+                web.get("/subscribers", self.on_leader(self.list_all_subscriptions)),
+                web.get("/subscribers/for/{event_type}", self.on_leader(self.list_subscription_for_event)),
                 # Subscription
-                web.get("/subscriber/{subscriber_id}", self.get_subscriber),
-                web.put("/subscriber/{subscriber_id}", self.update_subscriber),
-                web.delete("/subscriber/{subscriber_id}", self.delete_subscriber),
-                web.post("/subscriber/{subscriber_id}/{event_type}", self.add_subscription),
-                web.delete("/subscriber/{subscriber_id}/{event_type}", self.delete_subscription),
-                web.get("/subscriber/{subscriber_id}/handle", self.handle_subscribed),
+                web.get("/subscriber/{subscriber_id}", self.on_leader(self.get_subscriber)),
+                web.put("/subscriber/{subscriber_id}", self.on_leader(self.update_subscriber)),
+                web.delete("/subscriber/{subscriber_id}", self.on_leader(self.delete_subscriber)),
+                web.post("/subscriber/{subscriber_id}/{event_type}", self.on_leader(self.add_subscription)),
+                web.delete("/subscriber/{subscriber_id}/{event_type}", self.on_leader(self.delete_subscription)),
+                web.get("/subscriber/{subscriber_id}/handle", self.on_leader(self.handle_subscribed)),
                 # CLI
                 web.post("/cli/evaluate", self.evaluate),
                 web.post("/cli/execute", self.execute),
                 web.get("/cli/info", self.cli_info),
                 # Event operations
-                web.get("/events", self.handle_events),
+                web.get("/events", self.on_leader(self.handle_events)),
                 # Worker operations
-                web.get("/work/queue", self.handle_work_tasks),
-                web.get("/work/create", self.create_work),
-                web.get("/work/list", self.list_work),
+                web.get("/work/queue", self.on_leader(self.handle_work_tasks)),
+                web.get("/work/create", self.on_leader(self.create_work)),
+                web.get("/work/list", self.on_leader(self.list_work)),
                 # Serve static filed
                 web.get("", self.redirect_to_api_doc),
                 web.static("/static", static_path),
@@ -213,15 +218,15 @@ class Api:
                 web.get("/metrics", self.metrics),
                 # config operations
                 web.get("/configs", self.list_configs),
-                web.put("/config/{config_id}", self.put_config),
+                web.put("/config/{config_id}", self.on_leader(self.put_config)),
                 web.get("/config/{config_id}", self.get_config),
-                web.patch("/config/{config_id}", self.patch_config),
-                web.delete("/config/{config_id}", self.delete_config),
+                web.patch("/config/{config_id}", self.on_leader(self.patch_config)),
+                web.delete("/config/{config_id}", self.on_leader(self.delete_config)),
                 # config model operations
                 web.get("/configs/validation", self.list_config_models),
                 web.get("/configs/model", self.get_configs_model),
-                web.patch("/configs/model", self.update_configs_model),
-                web.put("/config/{config_id}/validation", self.put_config_validation),
+                web.patch("/configs/model", self.on_leader(self.update_configs_model)),
+                web.put("/config/{config_id}/validation", self.on_leader(self.put_config_validation)),
                 web.get("/config/{config_id}/validation", self.get_config_validation),
                 # ca operations
                 web.get("/ca/cert", self.certificate),
@@ -229,6 +234,8 @@ class Api:
                 # system operations
                 web.get("/system/ping", self.ping),
                 web.get("/system/ready", self.ready),
+                web.get("/system/queries", self.running_queries),
+                web.delete("/system/query/{query_id}", self.kill_query),
                 *ui_route,
                 *tsdb_route,
             ]
@@ -276,6 +283,16 @@ class Api:
     async def ready(_: Request) -> StreamResponse:
         return web.HTTPOk(text="ok")
 
+    async def running_queries(self, _: Request) -> StreamResponse:
+        return web.json_response(await self.db.running_queries())
+
+    async def kill_query(self, request: Request) -> StreamResponse:
+        query_id = request.match_info["query_id"]
+        if await self.db.kill_query(query_id):
+            return web.HTTPOk(text=f"Query {query_id} killed.")
+        else:
+            return web.HTTPNotFound(text=f"No running query with id {query_id}.")
+
     async def list_configs(self, request: Request) -> StreamResponse:
         return await self.stream_response_from_gen(request, self.config_handler.list_config_ids())
 
@@ -407,16 +424,45 @@ class Api:
             return web.HTTPTooManyRequests(text="Only one connection per subscriber is allowed!")
         elif subscriber and subscriber.subscriptions:
             pending = await self.workflow_handler.list_all_pending_actions_for(subscriber)
-            return await self.listen_to_events(request, subscriber_id, list(subscriber.subscriptions.keys()), pending)
+            # actions must not be dropped: a subscriber that can not keep up is disconnected.
+            # all pending actions are sent again, when the subscriber reconnects.
+            return await self.listen_to_events(
+                request, subscriber_id, list(subscriber.subscriptions.keys()), pending, OverflowPolicy.Disconnect
+            )
         else:
             return web.HTTPNotFound(text=f"No subscriber with this id: {subscriber_id} or no subscriptions")
 
+    def on_leader(self, handler: RequestHandler) -> RequestHandler:
+        """
+        Wrap a handler that can only be served by the leader.
+        """
+
+        async def leader_handler(request: Request) -> StreamResponse:
+            self.redirect_to_leader(request)
+            return await handler(request)
+
+        return leader_handler
+
+    def redirect_to_leader(self, request: Request) -> None:
+        """
+        Redirect the request to the leader, if leader election is enabled and this process is not the leader.
+        The redirect keeps the method and body of the request.
+        """
+        election = self.leader_election
+        if election is not None and not election.is_leader:
+            url = election.leader_url
+            if url is None:
+                raise web.HTTPServiceUnavailable(headers={"Retry-After": "5"}, text="No leader elected. Retry later.")
+            log.debug(f"Redirect {request.method} {request.rel_url} to leader {url}")
+            raise web.HTTPTemporaryRedirect(url.rstrip("/") + str(request.rel_url))
+
     async def redirect_to_api_doc(self, request: Request) -> StreamResponse:
         raise web.HTTPFound("api-doc")
 
     async def handle_events(self, request: Request) -> StreamResponse:
         show = request.query["show"].split(",") if "show" in request.query else ["*"]
-        return await self.listen_to_events(request, str(uuid.uuid1()), show)
+        overflow = OverflowPolicy.from_name(request.query.get("overflow", "drop-oldest"))
+        return await self.listen_to_events(request, str(uuid.uuid1()), show, overflow=overflow)
 
     async def listen_to_events(
         self,
@@ -424,11 +470,25 @@ class Api:
         listener_id: str,
         event_types: List[str],
         initial_messages: Optional[Sequence[Message]] = None,
+        overflow: OverflowPolicy = OverflowPolicy.DropOldest,
     ) -> web.WebSocketResponse:
-        ws = web.WebSocketResponse()
+        # batch: send all available messages as one frame, either as json array or as newline delimited json
+        batch = request.query.get("batch")
+        if batch not in (None, "array", "ndjson"):
+            raise AttributeError(f"Unknown batch format: {batch}. Use one of array, ndjson.")
+        batch_size = int(request.query.get("batch_size", "1000")) if batch else 1
+        batch_wait = duration(request.query.get("batch_wait", "0s"))
+        compress = request.query.get("compress", "true").lower() != "false"
+        ws = web.WebSocketResponse(compress=compress)
         await ws.prepare(request)
         wsid = uuid_str()
 
+        def frame(messages: Sequence[Message]) -> str:
+            if batch == "array":
+                return "[" + ",".join(msg.json_str() for msg in messages) + "]\n"
+            else:
+                return "".join(msg.json_str() + "\n" for msg in messages)
+
         async def receive() -> None:
             try:
                 async for msg in ws:
@@ -454,10 +514,10 @@ class Api:
 
         async def send() -> None:
             try:
-                async with self.message_bus.subscribe(listener_id, event_types) as events:
+                queue_size = self.args.websocket_queue_size
+                async with self.message_bus.subscribe(listener_id, event_types, queue_size, overflow) as events:
                     while True:
-                        event = await events.get()
-                        await ws.send_str(to_js_str(event) + "\n")
+                        await ws.send_str(frame(await events.get_batch(batch_size, batch_wait)))
             except Exception as ex:
                 # do not allow any exception - it will destroy the async fiber and cleanup
                 log.info(f"Send: message listener {listener_id}: {ex}. Hang up.")
@@ -465,8 +525,8 @@ class Api:
                 await self.clean_ws_handler(wsid)
 
         if initial_messages:
-            for msg in initial_messages:
-                await ws.send_str(to_js_str(msg) + "\n")
+            for idx in range(0, len(initial_messages), batch_size):
+                await ws.send_str(frame(initial_messages[idx : idx + batch_size]))  # noqa: E203
 
         to_wait = asyncio.gather(asyncio.create_task(receive()), asyncio.create_task(send()))
         self.websocket_handler[wsid] = (to_wait, ws)
@@ -640,6 +700,7 @@ class Api:
         db = self.db.get_graph_db(graph_id)
         it = self.to_line_generator(request)
         info = await merge_graph_process(db, self.event_sender, self.args, it, self.merge_max_wait_time, None)
+        self.db.publish_snapshot_in_background(db.name)
         return web.json_response(to_js(info))
 
     async def update_merge_graph_batch(self, request: Request) -> StreamResponse:
@@ -661,6 +722,7 @@ class Api:
         graph_db = self.db.get_graph_db(request.match_info.get("graph_id", "resoto"))
         batch_id = request.match_info.get("batch_id", "some_existing")
         await graph_db.commit_batch_update(batch_id)
+        self.db.publish_snapshot_in_background(graph_db.name)
         return web.HTTPOk(body="Batch committed.")
 
     async def abort_batch(self, request: Request) -> StreamResponse:
@@ -669,13 +731,15 @@ class Api:
         await graph_db.abort_update(batch_id)
         return web.HTTPOk(body="Batch aborted.")
 
-    async def graph_query_model_from_request(self, request: Request) -> Tuple[GraphDB, QueryModel]:
+    async def graph_query_model_from_request(
+        self, request: Request, profile: Optional[SearchProfile] = None
+    ) -> Tuple[GraphDB, QueryModel]:
         section = section_of(request)
         query_string = await request.text()
         graph_db = self.db.get_graph_db(request.match_info.get("graph_id", "resoto"))
         q = await self.query_parser.parse_query(query_string, section, **request.query)
         m = await self.model_handler.load_model()
-        return graph_db, QueryModel(q, m)
+        return graph_db, QueryModel(q, m, profile)
 
     async def raw(self, request: Request) -> StreamResponse:
         graph_db, query_model = await self.graph_query_model_from_request(request)
@@ -689,10 +753,14 @@ class Api:
         return web.json_response(to_js(result))
 
     async def query_list(self, request: Request) -> StreamResponse:
-        graph_db, query_model = await self.graph_query_model_from_request(request)
+        started = perf_counter()
+        profile = self.search_profile(request)
+        graph_db, query_model = await self.graph_query_model_from_request(request, profile)
         count = request.query.get("count", "true").lower() != "false"
         timeout = if_set(request.query.get("search_timeout"), duration)
         async with await graph_db.search_list(query_model, count, timeout) as cursor:
+            if profile:
+                return await self.profiled_response(request, cursor, profile, started, cursor.count())
             return await self.stream_response_from_gen(request, cursor, cursor.count())
 
     async def cytoscape(self, request: Request) -> StreamResponse:
@@ -702,17 +770,30 @@ class Api:
         return web.json_response(node_link_data)
 
     async def query_graph_stream(self, request: Request) -> StreamResponse:
-        graph_db, query_model = await self.graph_query_model_from_request(request)
+        started = perf_counter()
+        profile = self.search_profile(request)
+        graph_db, query_model = await self.graph_query_model_from_request(request, profile)
         count = request.query.get("count", "true").lower() != "false"
         timeout = if_set(request.query.get("search_timeout"), duration)
         async with await graph_db.search_graph_gen(query_model, count, timeout) as cursor:
+            if profile:
+                return await self.profiled_response(request, cursor, profile, started, cursor.count())
             return await self.stream_response_from_gen(request, cursor, cursor.count())
 
     async def query_aggregation(self, request: Request) -> StreamResponse:
-        graph_db, query_model = await self.graph_query_model_from_request(request)
-        async with await graph_db.search_aggregation(query_model) as gen:
+        started = perf_counter()
+        profile = self.search_profile(request)
+        graph_db, query_model = await self.graph_query_model_from_request(request, profile)
+        timeout = if_set(request.query.get("search_timeout"), duration)
+        async with await graph_db.search_aggregation(query_model, timeout) as gen:
+            if profile:
+                return await self.profiled_response(request, gen, profile, started)
             return await self.stream_response_from_gen(request, gen)
 
+    @staticmethod
+    def search_profile(request: Request) -> Optional[SearchProfile]:
+        return SearchProfile() if request.query.get("profile", "false").lower() == "true" else None
+
     async def wipe(self, request: Request) -> StreamResponse:
         graph_id = request.match_info.get("graph_id", "resoto")
         if "truncate" in request.query:
@@ -782,6 +863,9 @@ class Api:
 
             # we want to eagerly evaluate the command, so that parse exceptions will throw directly here
             parsed = await self.cli.evaluate_cli_command(command, ctx)
+            # commands that only read data can be executed by every process
+            if not all(line.side_effect_free for line in parsed):
+                self.redirect_to_leader(request)
             return await self.execute_parsed(request, command, parsed)
         finally:
             if temp_dir:
@@ -827,22 +911,45 @@ class Api:
                 else:
                     raise AttributeError(f"Can not handle type: {first_result.produces}")
         elif len(parsed) > 1:
+
+            async def write_json_part(single: ParsedCommandLine, gen: AsyncIterator[JsonElement]) -> None:
+                with MultipartWriter(repr(single.produces), boundary) as mp:
+                    content_type, result_stream = await result_binary_gen(request, gen)
+                    mp.append_payload(
+                        AsyncIterablePayload(result_stream, content_type=content_type, headers=single.envelope)
+                    )
+                    await mp.write(mp_response, close_boundary=True)
+
+            def line_producer(single: ParsedCommandLine) -> Callable[[], AsyncIterator[JsonElement]]:
+                async def produce() -> AsyncIterator[JsonElement]:
+                    _, generator = await list_or_gen(single)
+                    async with generator.stream() as streamer:
+                        async for elem in streamer:
+                            yield elem
+
+                return produce
+
             await mp_response.prepare(request)
-            for single in parsed:
-                count, generator = await list_or_gen(single)
-                async with generator.stream() as streamer:
-                    gen = await force_gen(streamer)
-                    if single.produces.json:
-                        with MultipartWriter(repr(single.produces), boundary) as mp:
-                            content_type, result_stream = await result_binary_gen(request, gen)
-                            mp.append_payload(
-                                AsyncIterablePayload(result_stream, content_type=content_type, headers=single.envelope)
-                            )
-                            await mp.write(mp_response, close_boundary=True)
-                    elif single.produces.file_path:
-                        await Api.multi_file_response(parsed, gen, boundary, mp_response)
-                    else:
-                        raise AttributeError(f"Can not handle type: {single.produces}")
+            if all(single.side_effect_free and single.produces.json for single in parsed):
+                # no line can influence another line: execute them concurrently, but write the results in order
+                producers = [line_producer(single) for single in parsed]
+                prefetched = prefetch_ordered(producers, self.cli.line_parallelism, 1000)
+                try:
+                    for single in parsed:
+                        await write_json_part(single, await force_gen(await prefetched.__anext__()))
+                finally:
+                    await prefetched.aclose()
+            else:
+                for single in parsed:
+                    count, generator = await list_or_gen(single)
+                    async with generator.stream() as streamer:
+                        gen = await force_gen(streamer)
+                        if single.produces.json:
+                            await write_json_part(single, gen)
+                        elif single.produces.file_path:
+                            await Api.multi_file_response(parsed, gen, boundary, mp_response)
+                        else:
+                            raise AttributeError(f"Can not handle type: {single.produces}")
             await mp_response.write_eof()
             return mp_response
         else:
@@ -916,6 +1023,33 @@ class Api:
         await response.write_eof()
         return response
 
+    @staticmethod
+    async def profiled_response(
+        request: Request,
+        gen: AsyncIterator[JsonElement],
+        profile: SearchProfile,
+        started: float,
+        count: Optional[int] = None,
+    ) -> StreamResponse:
+        # The profile is only complete after the whole result has been computed.
+        # Since it is sent as header, the serialized result is buffered.
+        waited = profile.fetch + profile.transform
+        start = perf_counter()
+        content_type, result_gen = await result_binary_gen(request, gen)
+        cr = "\n".encode("utf-8")
+        body = b"".join([data + cr async for data in result_gen])
+        profile.serialize = perf_counter() - start - (profile.fetch + profile.transform - waited)
+        profile.total = perf_counter() - started
+        profile_header = json.dumps(to_js(profile), separators=(",", ":"))
+        # the per node statistics can get big: omit them, if the header would exceed the common size limit of 8k
+        if len(profile_header) > 8000:
+            profile_header = json.dumps({**to_js(profile), "nodes": []}, separators=(",", ":"))
+        count_header = {"Resoto-Shell-Element-Count": str(count)} if count else {}
+        headers = {"Content-Type": content_type, "Resoto-Search-Profile": profile_header, **count_header}
+        response = web.Response(body=body, headers=headers)
+        enable_compression(request, response)
+        return response
+
     @staticmethod
     async def multi_file_response(
         parsed: List[ParsedCommandLine], results: AsyncIterator[str], boundary: str, response: StreamResponse
@@ -12,7 +12,7 @@ from functools import reduce
 from typing import Any, Optional, AsyncGenerator, Dict, List
 
 from resotocore.types import Json
-from resotocore.util import utc, Periodic, set_future_result
+from resotocore.util import utc, Periodic, set_future_result, Deadlines
 
 log = logging.getLogger(__name__)
 
@@ -91,6 +91,8 @@ class WorkerTaskQueue:
         self.work_count: Dict[str, int] = defaultdict(lambda: 0)
         self.outstanding_tasks: Dict[str, WorkerTaskInProgress] = {}
         self.unassigned_tasks: Dict[str, WorkerTaskOnHold] = {}
+        # task id -> deadline of the outstanding or unassigned task
+        self.deadlines: Deadlines[str] = Deadlines()
         self.lock = asyncio.Lock()  # note: this lock is not reentrant!
         self.outdated_checker: Periodic = Periodic(
             "check_outdated_tasks", self.check_outdated_unassigned_tasks, timedelta(seconds=5)
@@ -116,6 +118,11 @@ class WorkerTaskQueue:
                 self.work_count[worker_id] = 0
                 for subscription in subscriptions:
                     self.worker_by_task_name[subscription.task.name].append(subscription)
+                # tasks that are waiting for a worker might be performed by this worker
+                names = {td.name for td in task_descriptions}
+                for ns in [ns for ns in self.unassigned_tasks.values() if ns.task.name in names]:
+                    if await self.__add_task(ns.task, ns.retry_counter):
+                        self.unassigned_tasks.pop(ns.task.id, None)
             log.info(f"Worker {worker_id} added to following task queues: {task_descriptions}")
             yield queue
         finally:
@@ -143,19 +150,20 @@ class WorkerTaskQueue:
             await self.__error_task(worker_id, task_id, message)
 
     async def check_outdated_unassigned_tasks(self) -> None:
-        now = utc()
-        outstanding = [ip for ip in self.outstanding_tasks.values() if ip.deadline < now]
-        not_started_outdated = [ns for ns in self.unassigned_tasks.values() if ns.deadline < now]
+        """
+        Called periodically. Only tasks with an expired deadline are checked.
+        Unassigned tasks are assigned as soon as a matching worker attaches.
+        """
         async with self.lock:
+            now = utc()
+            expired = self.deadlines.expired(now)
+            outstanding = [ip for ip in map(self.outstanding_tasks.get, expired) if ip and ip.deadline <= now]
+            not_started_outdated = [ns for ns in map(self.unassigned_tasks.get, expired) if ns and ns.deadline <= now]
             await self.__retry_tasks(outstanding)
             for ns in not_started_outdated:
                 log.info(f"No worker for task: {ns.task.id}. Give up.")
                 set_future_result(ns.task.callback, Exception(f"No worker for task: {ns.task.name}"))
                 self.unassigned_tasks.pop(ns.task.id, None)
-            # unassigned_task now only holds valid tasks
-            for ns in list(self.unassigned_tasks.values()):
-                if await self.__add_task(ns.task, ns.retry_counter):
-                    self.unassigned_tasks.pop(ns.task.id, None)
 
     async def __add_task(self, task: WorkerTask, retry_count: int) -> bool:
         def outstanding_tasks(subscription: WorkerTaskSubscription) -> int:
@@ -180,14 +188,18 @@ class WorkerTaskQueue:
             subscriptions = sorted(same_filter_len, key=outstanding_tasks)
             sub = subscriptions[0]  # this is the worker with the least amount of work
             # todo: store task in db
-            self.outstanding_tasks[task.id] = WorkerTaskInProgress(task, sub, retry_count, utc() + task.timeout)
+            in_progress = WorkerTaskInProgress(task, sub, retry_count, utc() + task.timeout)
+            self.outstanding_tasks[task.id] = in_progress
+            self.deadlines.schedule(task.id, in_progress.deadline)
             await sub.queue.put(task)
             self.work_count[sub.worker_id] = self.work_count[sub.worker_id] + 1
             return True
         else:
             self.outstanding_tasks.pop(task.id, None)
             if task.id not in self.unassigned_tasks:
-                self.unassigned_tasks[task.id] = WorkerTaskOnHold(task, retry_count, utc() + task.timeout)
+                on_hold = WorkerTaskOnHold(task, retry_count, utc() + task.timeout)
+                self.unassigned_tasks[task.id] = on_hold
+                self.deadlines.schedule(task.id, on_hold.deadline)
             return False
 
     async def __acknowledge_task(self, worker_id: str, task_id: str, result: Optional[Json]) -> None:
@@ -196,6 +208,7 @@ class WorkerTaskQueue:
         if in_progress:
             if in_progress.worker.worker_id == worker_id:
                 self.outstanding_tasks.pop(task_id, None)
+                self.deadlines.cancel(task_id)
                 self.work_count[worker_id] = self.work_count[worker_id] - 1
                 set_future_result(in_progress.task.callback, result)
                 # todo: remove task from database
@@ -208,6 +221,7 @@ class WorkerTaskQueue:
         if in_progress:
             if in_progress.worker.worker_id == worker_id:
                 self.outstanding_tasks.pop(task_id, None)
+                self.deadlines.cancel(task_id)
                 self.work_count[worker_id] = self.work_count[worker_id] - 1
                 set_future_result(in_progress.task.callback, AttributeError(f"Error executing task: {message}"))
                 # todo: remove task from database
@@ -223,5 +237,6 @@ class WorkerTaskQueue:
             else:
                 log.warning(f"Too many retried executing task {task.task.id}. Give up.")
                 self.outstanding_tasks.pop(task.task.id, None)
+                self.deadlines.cancel(task.task.id)
                 self.work_count[task.worker.worker_id] = self.work_count[task.worker.worker_id] - 1
                 set_future_result(task.task.callback, TimeoutError("Could not finish the task."))
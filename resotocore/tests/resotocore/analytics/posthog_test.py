@@ -1,5 +1,11 @@
+import os
+from pathlib import Path
+from typing import List, Tuple, Dict, Any
+from unittest.mock import AsyncMock
+
 import pytest
 
+from resotocore.analytics import CoreEvent
 from resotocore.analytics.posthog import PostHogEventSender
 from resotocore.db import SystemData
 from resotocore.util import utc
@@ -23,3 +29,58 @@ async def test_send_analytics_no_service() -> None:
         event = await sender.core_event("test-event")
         assert event.kind == "test-event"
     # reaching this point means: no exception has been thrown, which is the real test
+
+
+@pytest.mark.asyncio
+async def test_aggregate_sample_and_spill(tmp_path: Path) -> None:
+    sd = SystemData("test", utc(), 1)
+    spill_file = str(tmp_path / "analytics.ndjson")
+    sender = PostHogEventSender(sd, max_queued=3, sample_rate=0, spill_file=spill_file)
+    captured: List[Tuple[str, Dict[str, Any]]] = []
+    reachable = False
+
+    def capture(event: str, properties: Dict[str, Any], message_id: str, **_: Any) -> None:
+        if reachable:
+            captured.append((event, properties))
+        else:
+            sender.send_failed(ConnectionError("not reachable"), [{"messageId": message_id}])
+
+    sender.client.capture = capture
+    sender.refresh_public_api_key = AsyncMock()  # type: ignore
+    # frequent events are aggregated by kind and context
+    for _ in range(10):
+        await sender.core_event(CoreEvent.Query, {"graph": "ns"}, nodes=2)
+    # events are sampled: system events are always sent
+    for _ in range(10):
+        await sender.core_event("some-event")
+    await sender.core_event(CoreEvent.SystemStarted)
+    assert len(sender.queue) == 1 and len(sender.aggregated) == 1
+
+    # events that could not be sent are written to disk
+    await sender.flush()
+    assert len(sender.queue) == 0 and len(sender.aggregated) == 0
+    assert os.path.exists(spill_file)
+    assert captured == []
+    assert sender.online is False
+
+    # still offline: the spilled events are kept
+    await sender.core_event(CoreEvent.SystemStopped)
+    await sender.flush()
+    assert sender.online is False
+    with open(spill_file, encoding="utf-8") as file:
+        assert len(file.readlines()) == 3
+
+    # online again: new events are sent, the spilled events follow with the next flush
+    reachable = True
+    await sender.core_event(CoreEvent.CLICommand, {"command": "search"})
+    await sender.flush()
+    assert sender.online is True
+    assert os.path.exists(spill_file)
+    await sender.flush()
+    assert not os.path.exists(spill_file)
+    assert {kind: props for kind, props in captured} == {
+        CoreEvent.SystemStarted: {"run_id": sender.run_id},
+        CoreEvent.SystemStopped: {"run_id": sender.run_id},
+        CoreEvent.CLICommand: {"command": "search", "aggregated_events": 1, "run_id": sender.run_id},
+        CoreEvent.Query: {"graph": "ns", "nodes": 20, "aggregated_events": 10, "run_id": sender.run_id},
+    }
@@ -29,6 +29,7 @@ from resotocore.message_bus import MessageBus
 from resotocore.model.adjust_node import NoAdjust
 from resotocore.model.graph_access import EdgeType
 from resotocore.model.model import Model
+from resotocore.query.query_parser import parse_query
 from resotocore.query.template_expander import TemplateExpander
 from resotocore.worker_task_queue import WorkerTaskQueue, WorkerTaskDescription
 from tests.resotocore.model import ModelHandlerStatic
@@ -142,6 +143,19 @@ async def test_multi_command(cli: CLI) -> None:
     assert isinstance(l3p2, ChunkCommand)
 
 
+@pytest.mark.asyncio
+async def test_concurrent_command_lines(cli: CLI) -> None:
+    # lines without side effects are executed concurrently, the results are returned in order
+    commands = ";".join(f"search all | count; echo {a} | chunk" for a in range(0, 10))
+    assert all(line.side_effect_free for line in await cli.evaluate_cli_command(commands))
+    result = await cli.execute_cli_command(commands, stream.list)
+    assert result[1::2] == [[[a]] for a in range(0, 10)]
+    assert all(count == result[0] for count in result[0::2])
+    # lines with side effects or sleep are executed in sequence
+    for cmd in ["echo 1; echo 2 | write foo.txt", "sleep 0.1; echo 1"]:
+        assert not all(line.side_effect_free for line in await cli.evaluate_cli_command(cmd))
+
+
 @pytest.mark.asyncio
 async def test_query_database(cli: CLI) -> None:
     query = 'search is("foo") and some_string=="hello" --> f>12 and f<100 and g[*]==2'
@@ -220,6 +234,8 @@ async def test_create_query_parts(cli: CLI) -> None:
         commands[0].executable_commands[0].arg
         == f'(reported.some_int == 0 and reported.identifier =~ "9_") {sort} -default[1:]-> all {sort}'
     )
+    # the parsed query is handed to execute_search directly: it is the same as parsing the rendered arg
+    assert commands[0].ctx.query == parse_query(commands[0].executable_commands[0].arg, **commands[0].ctx.env)
     commands = await cli.evaluate_cli_command("search some_int==0 | descendants")
     assert "-default[1:]->" in commands[0].executable_commands[0].arg  # type: ignore
     commands = await cli.evaluate_cli_command("search some_int==0 | ancestors | ancestors")
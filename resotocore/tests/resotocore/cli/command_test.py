@@ -22,11 +22,11 @@ from pytest import fixture
 from resotocore import version
 from resotocore.cli import is_node
 from resotocore.cli.cli import CLI
-from resotocore.cli.command import HttpCommand, JqCommand
+from resotocore.cli.command import HttpCommand, JqCommand, ExecuteSearchCommand
 from resotocore.cli.model import CLIDependencies, CLIContext
 from resotocore.console_renderer import ConsoleRenderer, ConsoleColorSystem
 from resotocore.db.jobdb import JobDb
-from resotocore.error import CLIParseError
+from resotocore.error import CLIParseError, HistoryNotAvailable
 from resotocore.model.model import Model, ComplexKind
 from resotocore.model.typed_model import to_js
 from resotocore.query.model import Template, Query
@@ -211,6 +211,10 @@ async def test_search_source(cli: CLI) -> None:
     result4 = await cli.execute_cli_command("search --explain --with-edges is(graph_root) -[0:1]->", stream.list)
     assert result4[0][0]["rating"] == "simple"
 
+    result_profile = await cli.execute_cli_command("search --profile --with-edges is(graph_root) -[0:1]->", stream.list)
+    assert result_profile[0][0]["items"] > 0
+    assert result_profile[0][0]["total"] > 0
+
     # use absolute path syntax
     result5 = await cli.execute_cli_command(
         "search aggregate(/reported.kind: sum(/reported.some_int) as si): "
@@ -450,6 +454,29 @@ async def test_jobs_command(cli: CLI, task_handler: TaskHandlerService, job_db:
     deleted = await execute("jobs delete timed_hi")
     assert deleted == [["Job timed_hi deleted."]]
 
+    # delete several jobs at once
+    deleted = await execute("jobs delete only_event no_trigger timed_hi")
+    assert deleted == [["Job only_event deleted.", "Job no_trigger deleted.", "No job with this id: timed_hi"]]
+    assert await job_db.get("only_event") is None and await job_db.get("no_trigger") is None
+
+    # import several jobs at once: json objects in the format of jobs list and jobs add arguments
+    definitions = [
+        {"id": "imported_event", "command": "echo hi", "trigger": {"message_type": "foo"}},
+        {"id": "imported_timed", "command": "echo hi", "trigger": {"cron_expression": "2 2 2 2 2"}, "active": False},
+        "--id imported_line --wait-for-event bla echo @NOW@",
+    ]
+    imported = await execute(f"json {json.dumps(definitions)} | jobs import")
+    assert imported == [["Job imported_event added.", "Job imported_timed added.", "Job imported_line added."]]
+    imported_event: Job = await job_db.get("imported_event")  # type: ignore
+    assert imported_event.trigger == EventTrigger("foo")
+    imported_timed: Job = await job_db.get("imported_timed")  # type: ignore
+    assert imported_timed.trigger == TimeTrigger("2 2 2 2 2") and imported_timed.active is False
+    imported_line: Job = await job_db.get("imported_line")  # type: ignore
+    # placeholders are not replaced when the job is defined
+    assert imported_line.command.command == "echo @NOW@"
+    assert imported_line.trigger == EventTrigger("bla")
+    assert set(task_handler.registered_event_trigger_by_message_type["foo"]) == {"imported_event"}
+
 
 @pytest.mark.asyncio
 async def test_tag_command(
@@ -508,6 +535,46 @@ async def test_tag_command(
         assert (await awaitable)["id"] in ["root", "collector"]  # type:ignore
 
 
+@pytest.mark.asyncio
+async def test_indexes_command(cli: CLI) -> None:
+    for _ in range(3):
+        await cli.execute_cli_command("search is(foo) and some_int==0", stream.list)
+    result = await cli.execute_cli_command("indexes", stream.list)
+    usage = {js["path"]: js for js in result[0]}
+    assert usage["reported.some_int"]["usage"] >= 3
+    assert usage["reported.some_int"]["kinds"]["foo"] >= 3
+    result = await cli.execute_cli_command("indexes --apply", stream.list)
+    assert set(result[0][0].keys()) == {"created", "dropped"}
+
+
+def test_search_options() -> None:
+    parsed, rest = ExecuteSearchCommand.parse_known("--with-edges --at 7d is(foo) and name==bla")
+    assert parsed == {"with-edges": True, "at": "7d"}
+    assert rest == "is(foo) and name==bla"
+    assert ExecuteSearchCommand.argument_string(parsed) == "--with-edges --at 7d "
+
+
+@pytest.mark.asyncio
+async def test_history_command(cli: CLI) -> None:
+    # the history is not recorded in this setup
+    with pytest.raises(HistoryNotAvailable):
+        await cli.execute_cli_command("history --after 1d", stream.list)
+    with pytest.raises(HistoryNotAvailable):
+        await cli.execute_cli_command("search --at 1d is(foo)", stream.list)
+    with pytest.raises(CLIParseError):
+        await cli.execute_cli_command("history --after never", stream.list)
+
+
+@pytest.mark.asyncio
+async def test_kill_command(cli: CLI) -> None:
+    result = await cli.execute_cli_command("kill --list", stream.list)
+    assert isinstance(result[0], list)
+    result = await cli.execute_cli_command("kill 123456789", stream.list)
+    assert result[0] == ["No running query with id 123456789."]
+    with pytest.raises(CLIParseError):
+        await cli.execute_cli_command("kill", stream.list)
+
+
 @pytest.mark.asyncio
 async def test_kinds_command(cli: CLI, foo_model: Model) -> None:
     result = await cli.execute_cli_command("kind", stream.list)
@@ -1,3 +1,7 @@
+import pytest
+from aiostream import stream
+
+from resotocore.cli import offload_map
 from resotocore.cli.model import CLIContext
 from resotocore.console_renderer import ConsoleRenderer, ConsoleColorSystem
 
@@ -24,3 +28,11 @@ def test_supports_color() -> None:
     assert CLIContext(console_renderer=ConsoleRenderer(color_system=ConsoleColorSystem.standard)).supports_color()
     assert CLIContext(console_renderer=ConsoleRenderer(color_system=ConsoleColorSystem.eight_bit)).supports_color()
     assert CLIContext(console_renderer=ConsoleRenderer(color_system=ConsoleColorSystem.truecolor)).supports_color()
+
+
+@pytest.mark.asyncio
+async def test_offload_map() -> None:
+    # elements are transformed in chunks, while the order is maintained
+    for chunk_size in [0, 1, 7, 1000]:
+        result = [e async for e in offload_map(stream.iterate(range(1234)), lambda x: x * 2, chunk_size, 3)]
+        assert result == [x * 2 for x in range(1234)]
@@ -71,7 +71,7 @@ def test_fulltext_index_query(foo_model: Model, graph_db: GraphDB) -> None:
     single_ft_index = (
         "LET m0=(FOR ft in search_ns SEARCH ANALYZER(PHRASE(ft.flat, @b0), 'delimited') "
         "SORT BM25(ft) DESC RETURN ft) "
-        'FOR result in m0 RETURN UNSET(result, ["flat"])'
+        'FOR result in m0 RETURN UNSET(result, ["flat", "ancestor_ids"])'
     )
     assert query_string('"a"') == single_ft_index
     assert query_string('"some other fulltext string"') == single_ft_index
@@ -80,3 +80,21 @@ def test_fulltext_index_query(foo_model: Model, graph_db: GraphDB) -> None:
         "ANALYZER((((PHRASE(ft.flat, @b0)) and (PHRASE(ft.flat, @b1))) or "
         "(PHRASE(ft.flat, @b2))) and (PHRASE(ft.flat, @b3)), 'delimited')"
     ) in query_string('"a" and "b" or "c" and "d"')
+
+
+def test_ancestors_query(foo_model: Model, graph_db: GraphDB) -> None:
+    def query_string(query: str) -> str:
+        query_str, _ = to_query(graph_db, QueryModel(parse_query(query), foo_model))
+        return query_str
+
+    # unbounded ancestors and descendants are looked up via the materialized ancestor ids
+    assert 'DOCUMENT("ns", NOT_NULL(io_in0.ancestor_ids, []))' in query_string("is(foo) <-[1:]-")
+    assert 'DOCUMENT("ns", APPEND([io_in0._key], NOT_NULL(io_in0.ancestor_ids, [])))' in query_string("is(foo) <-[0:]-")
+    assert "FILTER io_in0._key IN io_crs0.ancestor_ids[*]" in query_string("is(foo) -[1:]->")
+    # bounded navigation and other edge types still traverse the graph
+    assert "IN 1..2 INBOUND" in query_string("is(foo) <-[1:2]-")
+    assert "IN 1..250 INBOUND" in query_string("is(foo) <-delete[1:]-")
+    # merge with ancestors does not traverse the graph
+    merged = query_string('(merge_with_ancestors="foo, bla"):is(foo)')
+    assert "INBOUND" not in merged
+    assert 'FOR p IN DOCUMENT("ns", NOT_NULL(node.ancestor_ids, []))' in merged
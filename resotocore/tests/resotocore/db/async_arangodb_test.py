@@ -1,10 +1,15 @@
+from typing import AsyncIterator
 from uuid import uuid1
 
 import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from arango import DocumentRevisionError, DocumentGetError
 from arango.collection import StandardCollection
 from arango.database import StandardDatabase
 
 from resotocore.db.async_arangodb import AsyncArangoDB
+from resotocore.db.async_arangodb_http import AsyncArangoHttpDB, ArangoHttpConnection, AsyncArangoHttpAccess
 
 # noinspection PyUnresolvedReferences
 from tests.resotocore.db.graphdb_test import test_db, system_db, local_client
@@ -41,3 +46,64 @@ async def test_events(async_db: AsyncArangoDB, test_collection: StandardCollecti
         await tx.insert(tc, {"_key": "foo"})
     result = list(await async_db.all(tc))
     assert len(result) == 1
+
+
+@pytest.fixture
+async def async_http_db(test_db: StandardDatabase) -> AsyncIterator[AsyncArangoHttpDB]:
+    db = AsyncArangoHttpDB(test_db, ArangoHttpConnection("http://localhost:8529", "test", "test", "test"))
+    yield db
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_http_client(async_http_db: AsyncArangoHttpDB, test_collection: StandardCollection) -> None:
+    tc = test_collection.name
+
+    with pytest.raises(Exception):
+        async with async_http_db.begin_transaction(read=[tc], write=[tc]) as tx:
+            await tx.insert(tc, {"_key": "foo"})
+            raise Exception("foo")
+    assert await async_http_db.count(tc) == 0
+
+    async with async_http_db.begin_transaction(read=[tc], write=[tc]) as tx:
+        await tx.insert_many(tc, [{"_key": f"foo_{a}", "num": a} for a in range(100)])
+    assert await async_http_db.count(tc) == 100
+    doc = await async_http_db.get(tc, "foo_1")
+    assert doc is not None and doc["num"] == 1
+
+    # batches are fetched until the cursor is exhausted
+    async with await async_http_db.aql_cursor(f"FOR d IN {tc} RETURN d.num", batch_size=10) as cursor:
+        assert sorted([a async for a in cursor]) == list(range(100))
+    # a synchronous cursor only delivers the elements of the fetched batch
+    with await async_http_db.aql(f"FOR d IN {tc} RETURN d._key", batch_size=10) as cursor:
+        assert len(cursor.batch()) == 10
+        with pytest.raises(RuntimeError):
+            list(cursor)
+
+    # a revision conflict is reported via the python-arango error type
+    updated = await async_http_db.update(tc, {"_key": "foo_1", "num": 101})
+    with pytest.raises(DocumentRevisionError):
+        await async_http_db.update(tc, {"_key": "foo_1", "_rev": doc["_rev"], "num": 102})
+    assert (await async_http_db.get(tc, "foo_1"))["_rev"] == updated["_rev"]  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_http_non_json_response() -> None:
+    async def bad_gateway(_: web.Request) -> web.Response:
+        return web.Response(status=502, text="<html>Bad Gateway</html>", content_type="text/html")
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", bad_gateway)
+    async with TestServer(app) as server:
+        connection = ArangoHttpConnection(str(server.make_url("")), "test", "test", "test")
+        try:
+            _, response = await connection.request("get", "/_api/document/foo/bla")
+            assert response.is_success is False
+            assert response.status_code == 502
+            assert response.error_message == "<html>Bad Gateway</html>"
+            access = AsyncArangoHttpAccess()
+            access.connection = connection
+            with pytest.raises(DocumentGetError):
+                await access.get("foo", "bla")
+        finally:
+            await connection.close()
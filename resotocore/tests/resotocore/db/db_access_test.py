@@ -1,15 +1,27 @@
+import asyncio
+from collections import defaultdict
 from datetime import timedelta
+from typing import Dict, Set
 
+import pytest
 from arango import ArangoClient
 from arango.database import StandardDatabase
 
 from resotocore.analytics import NoEventSender
 from resotocore.db.db_access import DbAccess
+from resotocore.db.graphdb import ArangoGraphDB, GraphDB
+from resotocore.db.model import QueryModel
 from resotocore.dependencies import parse_args
+from resotocore.error import NoSuchGraph, ReadOnlyGraph
 from resotocore.model.adjust_node import NoAdjust
+from resotocore.model.model import Model
+from resotocore.query.query_parser import parse_query
+from resotocore.types import Json
+from resotocore.util import utc, utc_str
 
 # noinspection PyUnresolvedReferences
-from tests.resotocore.db.graphdb_test import test_db, system_db, local_client
+from tests.resotocore.db.graphdb_test import test_db, system_db, local_client, filled_graph_db, graph_db
+from tests.resotocore.db.graphdb_test import foo_model, foo_kinds, create_graph
 
 
 def test_already_existing(test_db: StandardDatabase) -> None:
@@ -46,3 +58,101 @@ def test_not_existing_and_default_root_account(
     changed_root = local_client.db(username="root", password="bombproof")
     # Rest the password to the default one, to reset the state before the test
     changed_root.replace_user("root", "", True)
+
+
+@pytest.mark.asyncio
+async def test_publish_snapshot(test_db: StandardDatabase, filled_graph_db: ArangoGraphDB, foo_model: Model) -> None:
+    access = DbAccess(test_db, NoEventSender(), NoAdjust(), graph_snapshots=2)
+    # remove snapshots of former runs
+    for name in access.snapshot_graphs("ns").values():
+        await access.delete_graph(name)
+    test_db.delete_collection(access.snapshot_registry, ignore_missing=True)
+    test_db.create_collection(access.snapshot_registry)
+    with pytest.raises(NoSuchGraph):
+        access.get_graph_db("ns@latest")
+
+    assert await access.publish_snapshot("ns") == 1
+    assert await access.publish_snapshot("ns") == 2
+    assert await access.publish_snapshot("ns") == 3
+    # only the last 2 snapshots are retained
+    assert access.snapshot_versions["ns"] == [2, 3]
+    # the outdated snapshot is deleted after the grace period
+    assert set(access.snapshot_graphs("ns")) == {1, 2, 3}
+    await access.delete_retired_snapshots()
+    assert set(access.snapshot_graphs("ns")) == {1, 2, 3}
+    access.snapshot_grace_period = timedelta(0)
+    await access.delete_retired_snapshots()
+    assert set(access.snapshot_graphs("ns")) == {2, 3}
+    # snapshots are not listed as graphs
+    assert [g for g in await access.list_graphs() if "_snapshot_" in g] == []
+
+    snapshot = access.get_graph_db("ns@latest")
+    assert snapshot.name == "ns_snapshot_3"
+    assert access.get_graph_db("ns@2").name == "ns_snapshot_2"
+    with pytest.raises(NoSuchGraph):
+        access.get_graph_db("ns@1")
+
+    # the snapshot holds the same nodes and edges as the graph
+    query = parse_query("is(foo) -default[0:]->").on_section("reported")
+    async with await filled_graph_db.search_list(QueryModel(query, foo_model)) as cursor:
+        expected = sorted([x["id"] async for x in cursor])
+    async with await snapshot.search_list(QueryModel(query, foo_model)) as cursor:
+        assert sorted([x["id"] async for x in cursor]) == expected
+
+    # versions are allocated in the database: concurrent publishers get distinct versions
+    other = DbAccess(test_db, NoEventSender(), NoAdjust(), graph_snapshots=2)
+    assert set(await asyncio.gather(access.publish_snapshot("ns"), other.publish_snapshot("ns"))) == {4, 5}
+    await access.refresh_snapshots()
+    assert access.snapshot_versions["ns"] == [4, 5]
+
+    # snapshots can not be changed
+    with pytest.raises(ReadOnlyGraph):
+        await snapshot.wipe()
+    with pytest.raises(ReadOnlyGraph):
+        await snapshot.delete_node("sub_root")
+
+
+@pytest.mark.asyncio
+async def test_graph_history(test_db: StandardDatabase, foo_model: Model) -> None:
+    access = DbAccess(test_db, NoEventSender(), NoAdjust(), graph_history=True)
+    await access.delete_graph("hist")
+    graph = await access.create_graph("hist")
+
+    async def nodes(db: GraphDB) -> Dict[str, Json]:
+        query = QueryModel(parse_query("is([foo, bla])").on_section("reported"), foo_model)
+        async with await db.search_list(query) as cursor:
+            return {node["id"]: node["reported"] async for node in cursor}
+
+    await graph.merge_graph(create_graph("yes or no"), foo_model)
+    merged = utc()
+    before = await nodes(graph)
+    at = utc()
+    # updates all bla nodes and deletes all nodes with width >= 5
+    await graph.merge_graph(create_graph("maybe", width=5), foo_model)
+    assert await nodes(graph) != before
+
+    async with await graph.search_history() as cursor:
+        history = [h async for h in cursor]
+    assert {"node_created", "node_updated", "node_deleted", "edge_deleted"} <= {h["action"] for h in history}
+    # all entries of a merge share one sequence number: a merge is reverted as a whole
+    seq_by_change: Dict[str, Set[int]] = defaultdict(set)
+    for h in history:
+        seq_by_change[h["change"]].add(h["seq"])
+    assert len(seq_by_change) == 2 and all(len(seqs) == 1 for seqs in seq_by_change.values())
+    async with await graph.search_history(node_id="0_0") as cursor:
+        assert [h["action"] async for h in cursor] == ["node_updated", "node_created"]
+
+    # the state of the graph at the given time is reconstructed from the history
+    async with access.use_graph_at("hist", at) as past:
+        assert await nodes(past) == before
+        with pytest.raises(ReadOnlyGraph):
+            await past.wipe()
+        # all points in time between the same changes share one reconstructed graph
+        assert await access.graph_at("hist", merged) is past
+    assert len(access.history_graphs) == 1
+
+    # all changes of a node on the same day are combined: the changes are replaced in batches
+    hist = ArangoGraphDB(access.db, "hist", NoAdjust(), keep_history=True)
+    assert await hist.compact_history(utc_str(utc() + timedelta(minutes=1)), batch_size=10) > 0
+    async with await graph.search_history(node_id="0_0") as cursor:
+        assert [h["action"] async for h in cursor] == ["node_created"]
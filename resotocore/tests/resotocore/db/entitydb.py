@@ -38,6 +38,10 @@ class InMemoryDb(EntityDb[T]):
         key = key_or_object if isinstance(key_or_object, str) else self.key_fn(key_or_object)
         self.items.pop(key, None)
 
+    async def delete_many(self, keys: List[str]) -> None:
+        for key in keys:
+            self.items.pop(key, None)
+
     async def create_update_schema(self) -> None:
         pass
 
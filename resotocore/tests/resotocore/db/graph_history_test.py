@@ -0,0 +1,106 @@
+from typing import Optional, List
+
+from resotocore.db.graph_history import (
+    node_diff,
+    revert_node,
+    combine_changes,
+    compact_changes,
+    revert_changes,
+    NodeCreated,
+    NodeUpdated,
+    NodeDeleted,
+    EdgeCreated,
+    EdgeDeleted,
+)
+from resotocore.types import Json
+
+
+def update(doc: Json, change: Json) -> Json:
+    # the update replaces the given top level properties and keeps all others
+    return {**doc, **change}
+
+
+def node_change(action: str, before: Optional[Json], full: bool = False, at: str = "2022-01-01T00:00:00Z") -> Json:
+    return {"id": "a", "action": action, "before": before, "full": full, "changed_at": at}
+
+
+def test_node_diff() -> None:
+    old = {"_key": "a", "kinds": ["foo"], "reported": {"name": "a", "size": 1}, "updated": "t1"}
+    new = {
+        "kinds": ["foo"],
+        "reported": {"name": "a", "size": 2, "tag": "x"},
+        "desired": {"clean": True},
+        "updated": "t2",
+    }
+    before = node_diff(old, new)
+    assert before == {"reported.size": 1, "reported.tag": None, "desired": None, "updated": "t1"}
+    # reverting the diff restores the old document
+    assert revert_node(update(old, new), node_change(NodeUpdated, before)) == old
+
+
+def test_revert_node() -> None:
+    doc = {"_key": "a", "_rev": "1", "reported": {"name": "a"}}
+    # node has been created: it did not exist before
+    assert revert_node(doc, node_change(NodeCreated, None)) is None
+    # node has been deleted: the complete document is restored
+    deleted = {"_key": "a", "reported": {"name": "b"}}
+    assert revert_node(None, node_change(NodeDeleted, deleted, full=True)) == deleted
+    # database properties are not kept
+    assert revert_node(doc, node_change(NodeUpdated, {"reported.name": "b"})) == {
+        "_key": "a",
+        "reported": {"name": "b"},
+    }
+
+
+def test_combine_changes() -> None:
+    v1 = {"_key": "a", "reported": {"name": "a", "size": 1}}
+    v2 = {"_key": "a", "reported": {"name": "b", "size": 1}}
+    v3 = {"_key": "a", "reported": {"name": "b", "size": 3}, "desired": {"clean": True}}
+    c1 = node_change(NodeUpdated, node_diff(v1, v2))
+    c2 = node_change(NodeUpdated, node_diff(v2, v3))
+    combined = combine_changes(c1, c2)
+    assert combined["action"] == NodeUpdated
+    assert revert_node(v3, combined) == v1
+
+    # created and updated: the node did not exist before
+    assert revert_node(v3, combine_changes(node_change(NodeCreated, None), c2)) is None
+    # updated and deleted: the complete document before the update is restored
+    deleted = combine_changes(c1, node_change(NodeDeleted, v2, full=True))
+    assert deleted["action"] == NodeDeleted
+    assert revert_node(None, deleted) == v1
+    # deleted and created again: the document is replaced
+    recreated = combine_changes(node_change(NodeDeleted, v1, full=True), node_change(NodeCreated, None))
+    assert recreated["action"] == NodeUpdated
+    assert revert_node(v3, recreated) == v1
+    # a top level property of the earlier change wins over a section property of the later change
+    c3 = node_change(NodeUpdated, {"desired": None})
+    c4 = node_change(NodeUpdated, {"desired.clean": False})
+    assert revert_node({"desired": {"clean": True}}, combine_changes(c3, c4)) == {}
+
+
+def test_compact_changes() -> None:
+    v1 = {"_key": "a", "reported": {"size": 1}}
+    v2 = {"_key": "a", "reported": {"size": 2}}
+    created_deleted = [node_change(NodeCreated, None), node_change(NodeDeleted, v2, full=True)]
+    assert compact_changes(created_deleted) == []
+    updates = [node_change(NodeUpdated, node_diff(v1, v2)), node_change(NodeUpdated, node_diff(v2, v1))]
+    assert len(compact_changes(updates)) == 1
+
+    def edge(action: str) -> Json:
+        return {"id": "e", "edge_type": "default", "action": action, "from": "a", "to": "b"}
+
+    assert compact_changes([edge(EdgeCreated), edge(EdgeDeleted)]) == []
+    assert compact_changes([edge(EdgeDeleted), edge(EdgeCreated), edge(EdgeDeleted)]) == [edge(EdgeDeleted)]
+
+
+def test_revert_changes() -> None:
+    changes: List[Json] = [
+        node_change(NodeUpdated, {"reported.size": 1}, at="1"),
+        {"id": "e", "edge_type": "default", "action": EdgeDeleted, "from": "a", "to": "b", "changed_at": "2"},
+        node_change(NodeUpdated, {"reported.size": 2}, at="3"),
+        {"id": "e", "edge_type": "default", "action": EdgeCreated, "from": "a", "to": "b", "changed_at": "4"},
+    ]
+    nodes, edges = revert_changes(changes)
+    assert revert_node({"reported": {"size": 3}}, nodes["a"]) == {"reported": {"size": 1}}
+    # the earliest change defines the state of the edge: it existed before
+    assert edges[("default", "e")]["action"] == EdgeDeleted
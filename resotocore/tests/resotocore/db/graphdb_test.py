@@ -1,17 +1,18 @@
 import asyncio
 import string
 from abc import ABC
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 from random import SystemRandom
 from typing import List, Optional
 
 import pytest
-from arango import ArangoClient
+from arango import ArangoClient, AQLQueryExecuteError
 from arango.database import StandardDatabase
 from arango.typings import Json
 from networkx import MultiDiGraph
 
 from resotocore.analytics import AnalyticsEventSender, CoreEvent, InMemoryEventSender
+from resotocore.db import SearchProfile
 from resotocore.db.async_arangodb import AsyncArangoDB
 from resotocore.db.graphdb import ArangoGraphDB, GraphDB, EventGraphDB
 
@@ -24,7 +25,7 @@ from resotocore.model.typed_model import from_js, to_js
 from resotocore.query.model import Query, P, Navigation
 from resotocore.query.query_parser import parse_query
 from resotocore.types import JsonElement
-from resotocore.util import AccessJson, utc, value_in_path, AccessNone
+from resotocore.util import AccessJson, utc, value_in_path, AccessNone, utc_str
 
 # noinspection PyUnresolvedReferences
 from tests.resotocore.analytics import event_sender
@@ -369,6 +370,56 @@ async def test_query_list(filled_graph_db: ArangoGraphDB, foo_model: Model) -> N
         assert len(result) == 111  # 113 minus 1 graph_root, minus one cloud
 
 
+@pytest.mark.asyncio
+async def test_query_profile(filled_graph_db: ArangoGraphDB, foo_model: Model) -> None:
+    profile = SearchProfile()
+    query = QueryModel(parse_query("is(bla) and f==23").on_section("reported"), foo_model, profile)
+    async with await filled_graph_db.search_list(query) as gen:
+        result = [x async for x in gen]
+    assert profile.items == len(result) == 100
+    assert profile.compile > 0 and profile.fetch > 0 and profile.transform > 0
+    assert profile.db_execution > 0
+    assert "executing" in profile.db_phases
+    assert profile.scanned_full + profile.scanned_index > 0
+    assert profile.nodes[-1].type == "ReturnNode"
+    assert all(node.calls > 0 for node in profile.nodes)
+
+
+def test_document_to_instance_fn(foo_model: Model) -> None:
+    def doc(kind: str, key: str) -> Json:
+        ctime = utc_str(utc() - timedelta(days=2))
+        reported = {"kind": kind, "identifier": key, "ctime": ctime}
+        return {"_key": key, "_rev": "r", "reported": reported, "metadata": {"a": 1}, "ancestors": {"b": 2}}
+
+    render = ArangoGraphDB.document_to_instance_fn(foo_model, parse_query("is(foo)"))
+    rendered = render(doc("foo", "1"))
+    assert rendered is not None
+    assert list(rendered) == ["id", "type", "revision", "reported", "metadata", "ancestors"]
+    assert rendered["reported"]["age"] == "2d"
+    # kinds without synthetic properties and documents without sections
+    assert "age" not in render(doc("bla", "2"))["reported"]  # type: ignore
+    assert render({"_key": "3", "foo": "bla"}) == {"_key": "3", "foo": "bla"}
+    # merge results are rendered as well
+    render = ArangoGraphDB.document_to_instance_fn(foo_model, parse_query("is(foo) {foo: --> is(foo)}"))
+    merged = render({**doc("foo", "4"), "foo": [doc("foo", "5")]})
+    assert merged is not None
+    assert merged["foo"][0]["id"] == "5"
+    assert merged["foo"][0]["reported"]["age"] == "2d"
+    assert "ancestors" not in merged["foo"][0]
+
+
+@pytest.mark.asyncio
+async def test_kill_tagged_query(filled_graph_db: ArangoGraphDB) -> None:
+    # this query would run for 10 seconds, if it is not killed
+    task = asyncio.create_task(filled_graph_db.db.aql_cursor("/* search:slow */ RETURN SLEEP(10)"))
+    await asyncio.sleep(0.5)
+    assert any("search:slow" in q["query"] for q in await filled_graph_db.db.queries())
+    await filled_graph_db.kill_tagged_query("search:slow")
+    with pytest.raises(AQLQueryExecuteError):
+        await task
+    assert not any("search:slow" in q["query"] for q in await filled_graph_db.db.queries())
+
+
 @pytest.mark.asyncio
 async def test_query_not(filled_graph_db: ArangoGraphDB, foo_model: Model) -> None:
     # select everything that is not foo --> should be blas
@@ -0,0 +1,78 @@
+from resotocore.db.index_advisor import IndexAdvisor, IndexAdvisorConfig
+from resotocore.db.model import QueryModel
+from resotocore.model.model import Model
+from resotocore.query.query_parser import parse_query
+
+# noinspection PyUnresolvedReferences
+from tests.resotocore.db.graphdb_test import foo_kinds, foo_model
+
+
+def test_record_usage(foo_model: Model) -> None:
+    advisor = IndexAdvisor()
+
+    def record(query: str) -> None:
+        advisor.record(QueryModel(parse_query(query).on_section("reported"), foo_model))
+
+    record("is(foo) and some_int==1 and name in [a, b]")
+    record("is(foo) and some_int>2 and not name==c")
+    record("age>1d")
+    record("some_string==null and some_string=~foo")
+    record("some_int==1 or name==a")
+    record("g[*] == 1")
+    record("name==a --> is(bla) and f==1")
+    record("is(foo) and some_int==1 {parent: <-- name==foo} parent.reported.name==bar")
+    usage = advisor.usage
+    assert set(usage.keys()) == {
+        "reported.some_int",
+        "reported.name",
+        "reported.ctime",
+        "reported.some_string",
+        "reported.g[*]",
+    }
+    assert usage["reported.some_int"].count == 3
+    assert usage["reported.some_int"].kinds == {"foo": 3}
+    # negated terms, or branches and filters after a traversal are not recorded
+    assert usage["reported.name"].count == 2
+    # synthetic properties are mapped to the underlying property
+    assert usage["reported.ctime"].count == 1
+    # regular expressions can not be answered by an index
+    assert usage["reported.some_string"].count == 1
+    assert usage["reported.some_string"].matches_null is True
+    assert usage["reported.some_int"].hit_rate == 0
+
+
+def test_index_changes(foo_model: Model) -> None:
+    advisor = IndexAdvisor(IndexAdvisorConfig(budget=2, min_usage=2))
+    for query, times in [("some_int==1", 5), ("name==a", 4), ("f==1", 3), ('now_is>"2022-01-01"', 1)]:
+        for _ in range(times):
+            advisor.record(QueryModel(parse_query(query).on_section("reported"), foo_model))
+
+    existing = [{"type": "persistent", "name": "kinds", "fields": ["kinds[*]"]}]
+    create, drop = advisor.index_changes(existing)
+    assert [(r.path, r.name, r.sparse) for r in create] == [
+        ("reported.some_int", "advised_reported_some_int", True),
+        ("reported.name", "advised_reported_name", True),
+    ]
+    assert drop == []
+
+    # name is covered by a user defined index: f takes its place
+    existing = [
+        {"type": "persistent", "name": "advised_reported_some_int", "fields": ["reported.some_int"]},
+        {"type": "persistent", "name": "advised_reported_name", "fields": ["reported.name"]},
+        {"type": "persistent", "name": "by_name", "fields": ["reported.name"]},
+    ]
+    advisor.record(QueryModel(parse_query("some_int==1").on_section("reported"), foo_model))
+    assert advisor.usage["reported.some_int"].hits == 0
+    advisor.sync_indexes(existing)
+    advisor.record(QueryModel(parse_query("some_int==1").on_section("reported"), foo_model))
+    assert advisor.usage["reported.some_int"].hits == 1
+    for _ in range(4):
+        advisor.record(QueryModel(parse_query("f==1").on_section("reported"), foo_model))
+    create, drop = advisor.index_changes(existing)
+    assert [r.path for r in create] == ["reported.f"]
+    assert [d["name"] for d in drop] == ["advised_reported_name"]
+
+    # decay halves all counters and removes unused properties
+    advisor.decay()
+    assert advisor.usage["reported.some_int"].count == 3
+    assert "reported.now_is" not in advisor.usage
@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+import pytest
+from arango.database import StandardDatabase
+
+from resotocore.db import leasedb
+from resotocore.db.async_arangodb import AsyncArangoDB
+from resotocore.db.leasedb import LeaseDb
+
+# noinspection PyUnresolvedReferences
+from tests.resotocore.db.graphdb_test import test_db, local_client, system_db
+
+
+@pytest.fixture
+async def lease_db(test_db: StandardDatabase) -> LeaseDb:
+    db = leasedb.lease_db(AsyncArangoDB(test_db), "leases")
+    await db.create_update_schema()
+    test_db.collection("leases").truncate()
+    return db
+
+
+@pytest.mark.asyncio
+async def test_acquire_release(lease_db: LeaseDb) -> None:
+    ttl = timedelta(seconds=10)
+    assert await lease_db.get("test") is None
+    # first holder gets the lease
+    lease = await lease_db.acquire("test", "a", ttl, {"url": "http://a"})
+    assert lease is not None and lease.holder == "a" and lease.data == {"url": "http://a"}
+    # second holder does not get the lease, but sees the current holder
+    lease = await lease_db.acquire("test", "b", ttl, {"url": "http://b"})
+    assert lease is not None and lease.holder == "a" and lease.data == {"url": "http://a"}
+    # the holder can renew the lease
+    renewed = await lease_db.acquire("test", "a", ttl)
+    assert renewed is not None and renewed.holder == "a" and renewed.expires >= lease.expires
+    # only the holder can release the lease
+    await lease_db.release("test", "b")
+    assert (await lease_db.get("test")).holder == "a"  # type: ignore
+    await lease_db.release("test", "a")
+    assert await lease_db.get("test") is None
+    # released lease can be acquired by another holder
+    lease = await lease_db.acquire("test", "b", ttl)
+    assert lease is not None and lease.holder == "b"
+
+
+@pytest.mark.asyncio
+async def test_expired_lease(lease_db: LeaseDb) -> None:
+    lease = await lease_db.acquire("test", "a", timedelta(milliseconds=1))
+    assert lease is not None and lease.holder == "a"
+    # lease is not renewed in time: another holder takes over
+    lease = await lease_db.acquire("test", "b", timedelta(seconds=10))
+    for _ in range(10):
+        if lease and lease.holder == "b":
+            break
+        lease = await lease_db.acquire("test", "b", timedelta(seconds=10))
+    assert lease is not None and lease.holder == "b"
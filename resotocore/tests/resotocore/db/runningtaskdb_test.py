@@ -1,11 +1,15 @@
+import asyncio
+from datetime import timedelta
+
 import pytest
 from arango.database import StandardDatabase
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Any
 
 from resotocore.db import runningtaskdb
 from resotocore.db.async_arangodb import AsyncArangoDB
-from resotocore.db.runningtaskdb import RunningTaskData, RunningTaskDb
+from resotocore.db.runningtaskdb import RunningTaskData, RunningTaskDb, ArangoRunningTaskDb
 from resotocore.message_bus import ActionDone
+from resotocore.model.typed_model import to_js
 from resotocore.util import utc
 from resotocore.task.model import Subscriber
 
@@ -98,3 +102,101 @@ async def test_update_state(
     last = await assert_state("done", 9)
 
     assert last.received_messages[-3:] == [first, second, third]
+
+
+@pytest.mark.asyncio
+async def test_state_log(
+    test_db: StandardDatabase,
+    workflow_instance: Tuple[RunningTask, Subscriber, Subscriber, Dict[str, List[Subscriber]]],
+) -> None:
+    wi, _, _, _ = workflow_instance
+    db = AsyncArangoDB(test_db)
+    task_db = ArangoRunningTaskDb(db, "running_task", compact_after=3, write_behind=timedelta(hours=1))
+    await task_db.create_update_schema()
+    await task_db.wipe()
+    await task_db.insert(wi)
+    messages = [ActionDone(f"step_{a}", "test", "bla", "sf") for a in range(4)]
+
+    # messages are appended to the log: the snapshot is not changed
+    for message in messages[0:2]:
+        await task_db.update_state(wi, message)
+    assert await db.count("running_task_log") == 2
+    assert len((await db.get("running_task", wi.id))["received_messages"]) == 6  # type: ignore
+
+    # an update without message is written later
+    wi.machine.set_state("done")
+    await task_db.update_state(wi, None)
+    assert await db.count("running_task_log") == 2
+
+    # reading the state writes all pending updates: the third entry folds the log into the snapshot
+    state: RunningTaskData = await task_db.get(wi.id)  # type: ignore
+    assert state.current_state_name == "done"
+    assert state.received_messages[-2:] == messages[0:2]
+    assert await db.count("running_task_log") == 0
+    assert len((await db.get("running_task", wi.id))["received_messages"]) == 8  # type: ignore
+
+    # entries already folded into the snapshot are not applied again
+    await db.insert("running_task_log", {"task_id": wi.id, "seq": state.log_seq, "message": to_js(messages[0])})
+    assert len((await task_db.get(wi.id)).received_messages) == 8  # type: ignore
+
+    # after a restart the state is the snapshot plus the log tail
+    await task_db.update_state(wi, messages[3])
+    restarted = ArangoRunningTaskDb(db, "running_task")
+    await restarted.create_update_schema()
+    assert restarted.last_seq >= task_db.last_seq
+    recovered = [data async for data in restarted.all()]
+    assert len(recovered) == 1
+    assert recovered[0].received_messages[-1] == messages[3]
+    assert len(recovered[0].received_messages) == 9
+
+    # deleting a task deletes its log
+    await restarted.delete(wi.id)
+    assert await db.count("running_task_log") == 0
+    if task_db.flush_task:
+        task_db.flush_task.cancel()
+
+
+@pytest.mark.asyncio
+async def test_pending_state_flush(
+    test_db: StandardDatabase,
+    workflow_instance: Tuple[RunningTask, Subscriber, Subscriber, Dict[str, List[Subscriber]]],
+) -> None:
+    wi, _, _, _ = workflow_instance
+    db = AsyncArangoDB(test_db)
+    task_db = ArangoRunningTaskDb(db, "running_task", write_behind=timedelta(hours=1))
+    await task_db.create_update_schema()
+    await task_db.wipe()
+    await task_db.insert(wi)
+    await task_db.update_state(wi, None)
+    insert_many = db.insert_many
+
+    # a failed write keeps the entry pending
+    async def failing_insert(*args: Any, **kwargs: Any) -> None:
+        raise RuntimeError("database not available")
+
+    db.insert_many = failing_insert  # type: ignore
+    with pytest.raises(RuntimeError):
+        await task_db.flush()
+    assert wi.id in task_db.pending
+    assert await db.count("running_task_log") == 0
+
+    # a delete waits for the in-flight flush: no log entry is left behind
+    started, release = asyncio.Event(), asyncio.Event()
+
+    async def slow_insert(*args: Any, **kwargs: Any) -> Any:
+        started.set()
+        await release.wait()
+        return await insert_many(*args, **kwargs)
+
+    db.insert_many = slow_insert  # type: ignore
+    flush = asyncio.create_task(task_db.flush())
+    await started.wait()
+    delete = asyncio.create_task(task_db.delete(wi.id))
+    await asyncio.sleep(0.1)
+    assert not delete.done()
+    release.set()
+    await asyncio.gather(flush, delete)
+    assert task_db.pending == {}
+    assert await db.count("running_task_log") == 0
+    if task_db.flush_task:
+        task_db.flush_task.cancel()
@@ -0,0 +1,121 @@
+import asyncio
+from datetime import timedelta
+from multiprocessing import Process, Queue
+from time import time, monotonic
+from typing import List, Optional, Tuple
+
+from arango import ArangoClient
+
+import pytest
+from arango.database import StandardDatabase
+
+from resotocore.db import leasedb
+from resotocore.db.async_arangodb import AsyncArangoDB
+from resotocore.db.leasedb import LeaseDb, Lease
+from resotocore.types import Json
+from resotocore.leader_election import LeaderElection
+
+# noinspection PyUnresolvedReferences
+from tests.resotocore.db.graphdb_test import test_db, local_client, system_db
+
+# name of the process, elected or demoted, time of the event
+Event = Tuple[str, str, float]
+
+
+@pytest.mark.asyncio
+async def test_leader_election(test_db: StandardDatabase) -> None:
+    db = leasedb.lease_db(AsyncArangoDB(test_db), "leases")
+    await db.create_update_schema()
+    test_db.collection("leases").truncate()
+    events: List[str] = []
+
+    def election(name: str) -> LeaderElection:
+        async def elected() -> None:
+            events.append(f"{name} elected")
+
+        async def demoted() -> None:
+            events.append(f"{name} demoted")
+
+        return LeaderElection(db, f"http://{name}", elected, demoted, timedelta(seconds=3), name)
+
+    a = election("a")
+    b = election("b")
+    await a.start()
+    await b.start()
+    try:
+        assert a.is_leader and not b.is_leader
+        assert a.leader_url == b.leader_url == "http://a"
+        # the leader gives up the lease: the other process takes over
+        await a.stop()
+        await b.check_lease()
+        assert b.is_leader
+        assert b.leader_url == "http://b"
+        assert events == ["a elected", "a demoted", "b elected"]
+    finally:
+        await a.stop()
+        await b.stop()
+
+
+class FailingLeaseDb(LeaseDb):
+    """
+    Delegates to the underlying lease db, but can not reach the database after fail_after seconds.
+    """
+
+    def __init__(self, db: LeaseDb, fail_after: Optional[float]):
+        self.db = db
+        self.fail_at = monotonic() + fail_after if fail_after is not None else None
+
+    async def acquire(self, name: str, holder: str, ttl: timedelta, data: Optional[Json] = None) -> Optional[Lease]:
+        if self.fail_at is not None and monotonic() > self.fail_at:
+            raise ConnectionError("database not reachable")
+        return await self.db.acquire(name, holder, ttl, data)
+
+    async def release(self, name: str, holder: str) -> None:
+        await self.db.release(name, holder)
+
+    async def get(self, name: str) -> Optional[Lease]:
+        return await self.db.get(name)
+
+    async def create_update_schema(self) -> None:
+        await self.db.create_update_schema()
+
+
+def run_election(name: str, fail_after: Optional[float], run_for: float, events: "Queue[Event]") -> None:
+    async def run() -> None:
+        test_db = ArangoClient(hosts="http://localhost:8529").db("test", username="test", password="test")
+        db = FailingLeaseDb(leasedb.lease_db(AsyncArangoDB(test_db), "leases"), fail_after)
+
+        async def elected() -> None:
+            events.put((name, "elected", time()))
+
+        async def demoted() -> None:
+            events.put((name, "demoted", time()))
+
+        election = LeaderElection(db, f"http://{name}", elected, demoted, timedelta(seconds=3), name)
+        await election.start()
+        await asyncio.sleep(run_for)
+        await election.renewer.stop()
+        if election.is_leader:
+            await demoted()
+
+    asyncio.run(run())
+
+
+@pytest.mark.asyncio
+async def test_leader_election_processes(test_db: StandardDatabase) -> None:
+    db = leasedb.lease_db(AsyncArangoDB(test_db), "leases")
+    await db.create_update_schema()
+    test_db.collection("leases").truncate()
+    events: "Queue[Event]" = Queue()
+    # a loses the connection to the database while being leader: the lease is not renewed any longer
+    a = Process(target=run_election, args=("a", 2.5, 8, events))
+    b = Process(target=run_election, args=("b", None, 8, events))
+    a.start()
+    assert events.get(timeout=10)[0:2] == ("a", "elected")
+    b.start()
+    a.join(timeout=20)
+    b.join(timeout=20)
+    received = [events.get(timeout=1) for _ in range(3)]
+    assert [(name, event) for name, event, _ in received] == [("a", "demoted"), ("b", "elected"), ("b", "demoted")]
+    # a demotes itself, before its lease expires and b is elected
+    assert received[0][2] < received[1][2]
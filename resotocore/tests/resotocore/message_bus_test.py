@@ -3,10 +3,20 @@ from typing import AsyncGenerator, Any, Type, List
 
 from datetime import timedelta
 from deepdiff import DeepDiff
-from pytest import fixture, mark
-
-from resotocore.message_bus import MessageBus, Message, Event, Action, ActionDone, ActionError
-from resotocore.model.typed_model import to_js, from_js
+from pytest import fixture, mark, raises
+
+from resotocore.error import MessageQueueOverflow
+from resotocore.message_bus import (
+    MessageBus,
+    Message,
+    Event,
+    Action,
+    ActionDone,
+    ActionError,
+    MessageQueue,
+    OverflowPolicy,
+)
+from resotocore.model.typed_model import to_js, from_js, to_js_str
 from resotocore.util import AnyT, utc, first
 
 
@@ -81,6 +91,77 @@ async def test_handler(message_bus: MessageBus) -> None:
     bla_t.cancel()
 
 
+@mark.asyncio
+async def test_emit_does_not_block(message_bus: MessageBus) -> None:
+    async with message_bus.subscribe("slow", ["foo"], queue_size=2) as slow:
+        async with message_bus.subscribe("all", ["foo"]) as unbounded:
+            for num in range(10):
+                await asyncio.wait_for(message_bus.emit(Event("foo", {"num": num})), 1)
+            assert slow.qsize() == 2
+            assert slow.dropped == 8
+            assert [(await slow.get()).data["num"] for _ in range(2)] == [8, 9]
+            assert unbounded.qsize() == 10
+
+
+@mark.asyncio
+async def test_overflow_policies() -> None:
+    def queue(policy: OverflowPolicy, *messages: Message) -> MessageQueue:
+        q = MessageQueue("test", 3, policy)
+        for message in messages:
+            q.offer(message)
+        return q
+
+    def content(q: MessageQueue) -> List[str]:
+        return [f'{m.message_type}{m.data.get("n", "")}' for m in [q.get_nowait() for _ in range(q.qsize())]]
+
+    a1, b1, a2, c1 = Event("a", {"n": 1}), Event("b", {"n": 1}), Event("a", {"n": 2}), Event("c", {"n": 1})
+    assert content(queue(OverflowPolicy.DropOldest, a1, b1, a2, c1)) == ["b1", "a2", "c1"]
+    assert content(queue(OverflowPolicy.DropNewest, a1, b1, a2, c1)) == ["a1", "b1", "a2"]
+    assert content(queue(OverflowPolicy.Coalesce, a1, b1, c1, a2)) == ["b1", "c1", "a2"]
+    # no message of the same type: the oldest one is dropped
+    assert content(queue(OverflowPolicy.Coalesce, a1, b1, a2, c1)) == ["b1", "a2", "c1"]
+    disconnect = queue(OverflowPolicy.Disconnect, a1, b1, a2, c1)
+    assert disconnect.disconnected and disconnect.dropped == 1
+    assert disconnect.offer(a1) is False
+    with raises(MessageQueueOverflow):
+        await disconnect.get()
+    assert OverflowPolicy.from_name("drop-oldest") == OverflowPolicy.DropOldest
+    assert OverflowPolicy.from_name("coalesce") == OverflowPolicy.Coalesce
+
+
+@mark.asyncio
+async def test_get_batch() -> None:
+    queue = MessageQueue("test")
+    for num in range(5):
+        queue.offer(Event("foo", {"num": num}))
+    assert len(await queue.get_batch(3)) == 3
+    assert len(await queue.get_batch(3)) == 2
+
+    async def emit_later() -> None:
+        await asyncio.sleep(0.05)
+        queue.offer(Event("bla"))
+
+    # wait for more messages to fill the batch
+    queue.offer(Event("foo"))
+    emitter = asyncio.create_task(emit_later())
+    assert [m.message_type for m in await queue.get_batch(10, timedelta(seconds=1))] == ["foo", "bla"]
+    await emitter
+    # without waiting, only available messages are returned
+    queue.offer(Event("foo"))
+    emitter = asyncio.create_task(emit_later())
+    assert [m.message_type for m in await queue.get_batch(10)] == ["foo"]
+    await emitter
+
+
+def test_message_json_str() -> None:
+    message = ActionDone("test", "123", "step_name", "sub", {"test": 1})
+    js = message.json_str()
+    assert js == to_js_str(message)
+    assert message.json_str() is js
+    # the cached json string does not change the identity of the message
+    assert message == ActionDone("test", "123", "step_name", "sub", {"test": 1})
+
+
 def test_message_serialization() -> None:
     roundtrip(Event("test", {"a": "b", "c": 1, "d": "bla"}))
     roundtrip(Action("test", "123", "step_name"))
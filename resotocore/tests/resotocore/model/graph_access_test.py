@@ -57,7 +57,7 @@ def test_access_node() -> None:
     g.add_node("1", reported=to_json(FooTuple(a="1")))
     access: GraphAccess = GraphAccess(g)
     elem: Json = node(access, "1")  # type: ignore
-    assert elem["hash"] == "153c1a5c002f6213a95383f33b63aa18b8ed6939f57418fb0f27312576f0cea4"
+    assert elem["hash"] == "f7e8e3865c394faeb701c1db9d7545dd35bd41af1462a06d738947f851165cf9"
     assert elem["reported"] == {
         "a": "1",
         "b": 0,
@@ -93,6 +93,23 @@ def test_content_hash() -> None:
     assert sha1 == sha2
 
 
+def test_content_hash_with_ancestors() -> None:
+    def graph(parent: str) -> GraphAccess:
+        g = MultiDiGraph()
+        for node_id in ["a", "b", "c"]:
+            g.add_node(node_id, reported={"kind": "a", "id": node_id}, hash=f"hash_{node_id}")
+        g.add_edge(parent, "c", GraphAccess.edge_key(parent, "c", EdgeType.default), edge_type=EdgeType.default)
+        access = GraphAccess(g)
+        access.resolve()
+        return access
+
+    # same content, but moved under another parent: the hash changes, so the node is updated in the db
+    under_a, under_b = graph("a"), graph("b")
+    assert under_a.nodes["c"]["ancestor_ids"] == ["a"]
+    assert under_a.nodes["c"]["hash"] != under_b.nodes["c"]["hash"]
+    assert under_a.nodes["a"]["hash"] == under_b.nodes["a"]["hash"]
+
+
 def test_root(graph_access: GraphAccess) -> None:
     assert graph_access.root() == "1"
 
@@ -102,8 +119,8 @@ def test_not_visited(graph_access: GraphAccess) -> None:
     graph_access.node("3")
     not_visited = list(graph_access.not_visited_nodes())
     assert len(not_visited) == 2
-    assert not_visited[0]["hash"] == "0546994698f57ed4a7a4463b0353397ebe4acc7196b9e9ca1dd7bc0b72245be6"
-    assert not_visited[1]["hash"] == "0fead7dd5aff45049878e4c1b108b78c5fab594ac503eaba2199b71725241fce"
+    assert not_visited[0]["hash"] == "3bb76917a9919c3758a51458ed61dcffb68b95c5ba4e8ca5aaac654b04759cd7"
+    assert not_visited[1]["hash"] == "aff25fb5009e174cfac20857a87234a7fd0995b689e43e0f43e5a1828a0581c2"
 
 
 def test_edges(graph_access: GraphAccess) -> None:
@@ -349,6 +366,14 @@ def test_resolve_graph_data() -> None:
     assert n1.ancestors.account.reported.name == "name_account_cloud_gcp_1"
     assert n1.ancestors.region.reported.id == "id_region_account_cloud_gcp_1_europe"
     assert n1.ancestors.region.reported.name == "name_region_account_cloud_gcp_1_europe"
+    # all ancestors are materialized: nearest first
+    assert n1.ancestor_ids == [
+        "parent_region_account_cloud_gcp_1_europe_1",
+        "region_account_cloud_gcp_1_europe",
+        "account_cloud_gcp_1",
+        "cloud_gcp",
+        "root",
+    ]
     # make sure there is no summary
     assert n1.descendant_summary == AccessNone(None)
 
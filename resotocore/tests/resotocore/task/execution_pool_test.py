@@ -0,0 +1,76 @@
+import asyncio
+from datetime import timedelta
+from typing import List, Any, cast
+
+import pytest
+from pytest import raises
+
+from resotocore.cli.cli import CLI
+from resotocore.cli.model import CLIContext
+from resotocore.error import JobQueueFull
+from resotocore.task.execution_pool import JobExecutionPool
+
+
+class SleepingCLI:
+    def __init__(self) -> None:
+        self.max_running = 0
+        self.running = 0
+
+    async def execute_cli_command(self, cli_input: str, sink: Any, ctx: CLIContext) -> List[Any]:
+        self.running += 1
+        self.max_running = max(self.running, self.max_running)
+        try:
+            await asyncio.sleep(float(cli_input))
+            return [cli_input]
+        finally:
+            self.running -= 1
+
+
+@pytest.mark.asyncio
+async def test_concurrency() -> None:
+    cli = SleepingCLI()
+    pool = JobExecutionPool(cast(CLI, cli), concurrency=2, max_queued=3)
+    ctx = CLIContext()
+    timeout = timedelta(seconds=5)
+    results = await asyncio.gather(*[pool.execute("0.01", ctx, timeout) for _ in range(3)])
+    assert results == [["0.01"]] * 3
+    assert cli.max_running == 2
+    assert pool.running == 0 and pool.queued == 0
+
+    # the queue is full: commands are rejected
+    tasks = [asyncio.create_task(pool.execute("0.1", ctx, timeout)) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    tasks += [asyncio.create_task(pool.execute("0.1", ctx, timeout)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    assert pool.running == 2 and pool.queued == 3
+    with raises(JobQueueFull):
+        await pool.execute("0.1", ctx, timeout)
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_timeout() -> None:
+    cli = SleepingCLI()
+    pool = JobExecutionPool(cast(CLI, cli), concurrency=1)
+    with raises(asyncio.TimeoutError):
+        await pool.execute("10", CLIContext(), timedelta(milliseconds=10))
+    # the slot has been freed
+    assert pool.running == 0 and cli.running == 0
+    assert await pool.execute("0", CLIContext(), timedelta(seconds=1)) == ["0"]
+
+
+@pytest.mark.asyncio
+async def test_cancel_waiting() -> None:
+    cli = SleepingCLI()
+    pool = JobExecutionPool(cast(CLI, cli), concurrency=1)
+    running = asyncio.create_task(pool.execute("0.1", CLIContext(), timedelta(seconds=1)))
+    await asyncio.sleep(0.01)
+    # commands waiting for a slot are cancelled or time out: no slot is lost
+    waiting = asyncio.create_task(pool.execute("0", CLIContext(), timedelta(seconds=1)))
+    await asyncio.sleep(0.01)
+    waiting.cancel()
+    with raises(asyncio.TimeoutError):
+        await pool.execute("0", CLIContext(), timedelta(milliseconds=10))
+    assert await running == ["0.1"]
+    assert pool.queued == 0 and pool.slots._value == 1  # pylint: disable=protected-access
+    assert await pool.execute("0", CLIContext(), timedelta(seconds=1)) == ["0"]
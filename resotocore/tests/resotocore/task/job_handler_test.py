@@ -27,6 +27,14 @@ class InMemJobHandler(TaskHandler):
         else:
             return None
 
+    async def add_jobs(self, jobs: List[Job]) -> None:
+        self.jobs.extend(jobs)
+
+    async def delete_jobs(self, job_ids: List[str]) -> List[Job]:
+        deleted = [job for job in self.jobs if job.id in job_ids]
+        self.jobs = [job for job in self.jobs if job.id not in job_ids]
+        return deleted
+
     async def parse_job_line(
         self, source: str, line: str, env: Optional[Dict[str, str]] = None, mutable: bool = True
     ) -> Job:
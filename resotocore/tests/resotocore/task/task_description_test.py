@@ -146,6 +146,29 @@ def test_handle_error(
     assert len(events) == 0
 
 
+def test_handle_failed_command() -> None:
+    workflow = Workflow(
+        "commands",
+        "commands",
+        [
+            Step("first", ExecuteCommand("echo first"), timedelta(seconds=10)),
+            Step("second", ExecuteCommand("echo second"), timedelta(seconds=10), StepErrorBehaviour.Stop),
+        ],
+        [EventTrigger("run")],
+    )
+    wi, commands = RunningTask.empty(workflow, lambda: {})
+    assert wi.current_step.name == "first"
+    # the failed command is the result: this step is configured to continue
+    commands = wi.handle_command_results({commands[-1]: RuntimeError("boom")})
+    assert wi.current_step.name == "second"
+    assert [c.command for c in commands] == ["echo second"]  # type: ignore
+    # this step is configured to fail the whole task
+    commands = wi.handle_command_results({commands[0]: TimeoutError()})
+    assert wi.is_active is False
+    assert wi.is_error is True
+    assert len(commands) == 0
+
+
 def test_complete_workflow(
     workflow_instance: Tuple[RunningTask, Subscriber, Subscriber, Dict[str, List[Subscriber]]]
 ) -> None:
@@ -24,6 +24,7 @@ from resotocore.task.task_description import (
     TimeTrigger,
     Job,
     TaskSurpassBehaviour,
+    ExecuteCommand,
 )
 from resotocore.task import TaskHandler
 from resotocore.task.task_handler import TaskHandlerService
@@ -93,7 +94,8 @@ async def task_handler(
     task_handler = TaskHandlerService(
         running_task_db, job_db, message_bus, event_sender, subscription_handler, Scheduler(), cli, task_handler_args
     )
-    task_handler.task_descriptions = [test_workflow]
+    # the task descriptions are rebuilt on start: use the test workflow as only built-in workflow
+    task_handler.known_workflows = lambda: [test_workflow]  # type: ignore
     cli.dependencies.lookup["task_handler"] = task_handler
     async with task_handler:
         yield task_handler
@@ -121,6 +123,43 @@ async def test_run_job(task_handler: TaskHandlerService, all_events: List[Messag
     assert started.data["task"] == "Speakable name of workflow"
 
 
+@pytest.mark.asyncio
+async def test_add_delete_jobs(task_handler: TaskHandlerService, job_db: JobDb) -> None:
+    jobs = [
+        Job(f"job_{a}", ExecuteCommand("echo hello"), timedelta(seconds=10), trigger)
+        for a, trigger in enumerate([EventTrigger("start me up"), EventTrigger("foo"), TimeTrigger("2 2 2 2 2")])
+    ]
+    await task_handler.add_jobs(jobs)
+    assert [key async for key in job_db.keys()] == ["job_0", "job_1", "job_2"]
+    # triggers are indexed by message type and descriptor
+    assert set(task_handler.registered_event_trigger_by_message_type["start me up"]) == {"test_workflow", "job_0"}
+    assert set(task_handler.registered_event_trigger_by_message_type["foo"]) == {"job_1"}
+    assert set(task_handler.registered_time_trigger) == {"test_workflow", "job_2"}
+    # unknown ids are ignored
+    deleted = await task_handler.delete_jobs(["job_1", "job_2", "unknown"])
+    assert [job.id for job in deleted] == ["job_1", "job_2"]
+    assert [key async for key in job_db.keys()] == ["job_0"]
+    assert "foo" not in task_handler.registered_event_trigger_by_message_type
+    assert set(task_handler.registered_time_trigger) == {"test_workflow"}
+    assert [td.id for td in task_handler.task_descriptions] == ["test_workflow", "job_0"]
+
+
+@pytest.mark.asyncio
+async def test_restart_with_deleted_job(task_handler: TaskHandlerService, job_db: JobDb) -> None:
+    jobs = [
+        Job(f"job_{a}", ExecuteCommand("echo hello"), timedelta(seconds=10), trigger)
+        for a, trigger in enumerate([EventTrigger("foo"), TimeTrigger("2 2 2 2 2")])
+    ]
+    await task_handler.add_jobs(jobs)
+    await task_handler.stop()
+    # while this node is stopped, another leader deletes both jobs
+    await job_db.delete_many(["job_0", "job_1"])
+    await task_handler.start()
+    assert [td.id for td in task_handler.task_descriptions] == ["test_workflow"]
+    assert "foo" not in task_handler.registered_event_trigger_by_message_type
+    assert set(task_handler.registered_time_trigger) == {"test_workflow"}
+
+
 @pytest.mark.asyncio
 async def test_parse_job_line_time_trigger(task_handler: TaskHandler) -> None:
     job = await task_handler.parse_job_line("test", '0 5 * * sat   match t2 == "node" | clean')
@@ -174,7 +213,7 @@ async def test_recover_workflow(
             cli,
             task_handler_args,
         )
-        th.task_descriptions = [test_workflow]
+        th.known_workflows = lambda: [test_workflow]  # type: ignore
         return th
 
     await subscription_handler.add_subscription("sub_1", "start_collect", True, timedelta(seconds=30))
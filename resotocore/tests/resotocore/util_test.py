@@ -1,6 +1,10 @@
+import asyncio
 import json
 import shutil
 
+from datetime import datetime, timezone, timedelta
+from typing import Callable, AsyncIterator
+
 import pytest
 from aiostream import stream
 from copy import deepcopy
@@ -14,6 +18,15 @@ from resotocore.util import (
     set_value_in_path,
     rnd_str,
     del_value_in_path,
+    json_digest,
+    DigestSet,
+    BloomFilter,
+    gather_limited,
+    prefetch_ordered,
+    from_utc,
+    time_or_duration_ago,
+    Deadlines,
+    utc,
 )
 
 
@@ -49,6 +62,20 @@ def test_uuid() -> None:
     assert uuid_str() != uuid_str()
 
 
+def test_from_utc() -> None:
+    assert from_utc("2021-01-02T03:04:05Z") == datetime(2021, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert from_utc("2021-01-02T03:04:05.123Z").microsecond == 123000
+    assert from_utc("20210102T030405Z") == datetime(2021, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert from_utc("2021-01-02T05:04:05+02:00") == datetime(2021, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+
+
+def test_time_or_duration_ago() -> None:
+    assert time_or_duration_ago("2021-01-02T03:04:05Z") == datetime(2021, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert time_or_duration_ago("2021-01-02") == datetime(2021, 1, 2, tzinfo=timezone.utc)
+    three_days_ago = time_or_duration_ago("3d")
+    assert timedelta(days=3) <= utc() - three_days_ago < timedelta(days=3, minutes=1)
+
+
 def test_random_str() -> None:
     assert rnd_str() != rnd_str()
 
@@ -104,3 +131,77 @@ async def test_async_gen() -> None:
 
     async with stream.iterate(range(0, 100)).stream() as elems:
         assert [x async for x in await force_gen(elems)] == list(range(0, 100))
+
+
+def test_json_digest() -> None:
+    assert len(json_digest({"a": 1})) == 16
+    assert json_digest({"a": 1, "b": 2}) == json_digest({"b": 2, "a": 1})
+    assert json_digest({"a": 1}) != json_digest({"a": "1"})
+
+
+def test_digest_set() -> None:
+    # spill to disk after 10 digests and merge runs after 3 runs
+    digests = DigestSet(max_in_memory=10, max_runs=3)
+    for a in range(100):
+        assert digests.add(json_digest(a))
+    assert len(digests.runs) <= 3
+    for a in range(100):
+        assert json_digest(a) in digests
+        assert not digests.add(json_digest(a))
+    assert json_digest(100) not in digests
+    assert len(digests) == 100
+    digests.close()
+
+
+def test_bloom_filter() -> None:
+    bloom = BloomFilter(1000, 0.01)
+    added = [bloom.add(json_digest(a)) for a in range(1000)]
+    # false positives are possible, but rare
+    assert sum(added) > 980
+    assert not any(bloom.add(json_digest(a)) for a in range(1000))
+
+
+@pytest.mark.asyncio
+async def test_gather_limited() -> None:
+    running = []
+
+    async def work(num: int) -> int:
+        running.append(num)
+        assert len(running) <= 3
+        await asyncio.sleep(0.001 * (10 - num))
+        running.remove(num)
+        return num
+
+    assert await gather_limited([work(a) for a in range(10)], 3) == list(range(10))
+
+
+@pytest.mark.asyncio
+async def test_prefetch_ordered() -> None:
+    def producer(num: int) -> Callable[[], AsyncIterator[int]]:
+        async def produce() -> AsyncIterator[int]:
+            for a in range(num * 10, num * 10 + 10):
+                await asyncio.sleep(0.001 * (5 - num))
+                yield a
+
+        return produce
+
+    result = []
+    async for gen in prefetch_ordered([producer(a) for a in range(5)], 2, 3):
+        result.extend([a async for a in gen])
+    assert result == list(range(50))
+
+
+def test_deadlines() -> None:
+    now = utc()
+    deadlines: Deadlines[str] = Deadlines()
+    for key, seconds in [("a", 3), ("b", 1), ("c", 2), ("d", 5)]:
+        deadlines.schedule(key, now + timedelta(seconds=seconds))
+    # rescheduling replaces the deadline, cancelling removes the key
+    deadlines.schedule("a", now + timedelta(seconds=4))
+    deadlines.cancel("c")
+    assert len(deadlines) == 3 and "c" not in deadlines
+    assert deadlines.next_deadline() == now + timedelta(seconds=1)
+    assert deadlines.expired(now) == []
+    assert deadlines.expired(now + timedelta(seconds=3)) == ["b"]
+    assert deadlines.expired(now + timedelta(seconds=10)) == ["a", "d"]
+    assert len(deadlines) == 0 and deadlines.next_deadline() is None
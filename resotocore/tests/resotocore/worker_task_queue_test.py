@@ -163,3 +163,21 @@ async def test_handle_outdated(
 
 def create_task(uid: str, name: str) -> WorkerTask:
     return WorkerTask(uid, name, {}, {}, asyncio.get_event_loop().create_future(), timedelta())
+
+
+@mark.asyncio
+async def test_assign_on_attach(task_queue: WorkerTaskQueue) -> None:
+    task = WorkerTask("1", "late_task", {}, {}, asyncio.get_event_loop().create_future(), timedelta(seconds=10))
+    await task_queue.add_task(task)
+    # no worker: the task is on hold
+    assert "1" in task_queue.unassigned_tasks
+    # the deadline is not expired: nothing changes
+    await task_queue.check_outdated_unassigned_tasks()
+    assert "1" in task_queue.unassigned_tasks
+    # a matching worker attaches and gets the task
+    async with task_queue.attach("worker", [WorkerTaskDescription("late_task")]) as queue:
+        assert (await queue.get()).id == "1"
+        assert "1" not in task_queue.unassigned_tasks
+        await task_queue.acknowledge_task("worker", "1", {"done": True})
+    assert await task.callback == {"done": True}
+    assert len(task_queue.deadlines) == 0
@@ -0,0 +1,75 @@
+"""
+Measure the time to parse and compile a CLI search.
+
+Before, the CLI rendered the combined search to a string, execute_search parsed it again,
+and the query was compiled twice: once for validation and once for execution.
+Now the parsed query is handed over directly and the compiled query is kept in the query model.
+No database is required: only the parser and the query compiler are measured.
+
+Usage: PYTHONPATH=. python tools/search_benchmark.py [-n 1000] [search]
+"""
+from argparse import ArgumentParser
+from timeit import timeit
+from typing import Any, Callable, cast
+
+from resotocore.db.arango_query import to_query
+from resotocore.db.graphdb import ArangoGraphDB
+from resotocore.db.model import QueryModel
+from resotocore.model.adjust_node import NoAdjust
+from resotocore.model.model import ComplexKind, Model, Property
+from resotocore.query.query_parser import parse_query
+
+parser = ArgumentParser()
+parser.add_argument("-n", "--number", type=int, default=1000)
+parser.add_argument(
+    "search",
+    nargs="?",
+    default='is(foo) and some_int==0 and identifier=~"9_" sort some_int asc -default[1:]-> is(bla) limit 10',
+)
+ns = parser.parse_args()
+
+model = Model.from_kinds(
+    [
+        ComplexKind(
+            "base",
+            [],
+            [Property("identifier", "string", required=True), Property("kind", "string", required=True)],
+        ),
+        ComplexKind("foo", ["base"], [Property("name", "string"), Property("some_int", "int32")]),
+        ComplexKind("bla", ["base"], [Property("name", "string"), Property("f", "int32")]),
+    ]
+)
+# the compiler only needs the collection names: the database is never accessed
+graph_db = ArangoGraphDB(cast(Any, None), "ns", NoAdjust())
+query = parse_query(ns.search).on_section("reported")
+rendered = str(query)
+
+
+def before() -> None:
+    # render and parse again, compile for validation and for execution
+    query_model = QueryModel(parse_query(rendered), model)
+    to_query(graph_db, query_model)
+    to_query(graph_db, query_model)
+
+
+def after() -> None:
+    # use the parsed query, compile once
+    to_query(graph_db, QueryModel(query, model))
+
+
+def per_call(fn: Callable[[], Any]) -> float:
+    number: int = ns.number
+    return timeit(fn, number=number) / number * 1e6
+
+
+def run() -> None:
+    parse = per_call(lambda: parse_query(rendered))
+    compile_query = per_call(lambda: to_query(graph_db, QueryModel(query, model)))
+    print(f"search:  {rendered}")
+    print(f"parse:   {parse:8.1f}us")
+    print(f"compile: {compile_query:8.1f}us")
+    print(f"before:  {per_call(before):8.1f}us (parse + 2 x compile)")
+    print(f"after:   {per_call(after):8.1f}us (1 x compile)")
+
+
+run()
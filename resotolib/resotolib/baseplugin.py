@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
 from enum import Enum, auto
 from resotolib.graph import Graph
+from resotolib.checkpoint import CollectorCheckpoints
 from resotolib.core.actions import CoreActions
+from resotolib.core.query import CoreGraph
 from resotolib.args import ArgumentParser
 from resotolib.logging import log, setup_logger
 from resotolib.baseresources import Cloud
@@ -171,6 +173,11 @@ class BaseCollectorPlugin(BasePlugin):
 
     When the collect() method finishes, the Collector will retrieve the
     Plugins Graph and append it to the global Graph.
+
+    Collectors can collect incrementally: if self.incremental is True, a collector
+    may use self.checkpoints.get() to only fetch resources that changed since the
+    last run and use carry_forward() to add the unchanged resources from the graph
+    in resotocore. New checkpoints are stored via self.checkpoints.set().
     """
 
     plugin_type = PluginType.COLLECTOR  # Type of the Plugin
@@ -182,6 +189,16 @@ class BaseCollectorPlugin(BasePlugin):
         cloud = Cloud(self.cloud)
         self.root = cloud
         self.graph = Graph(root=self.root)
+        self.checkpoints = CollectorCheckpoints(self.name)
+
+    @property
+    def incremental(self) -> bool:
+        """True if only changes since the last run need to be collected"""
+        return not self.checkpoints.full_resync
+
+    def carry_forward(self, query: str) -> Graph:
+        """Fetch the graph of unchanged resources defined by query from resotocore"""
+        return CoreGraph().graph(query)
 
     @abstractmethod
     def collect(self) -> None:
@@ -190,6 +207,7 @@ class BaseCollectorPlugin(BasePlugin):
 
     def go(self) -> None:
         self.collect()
+        self.checkpoints.save()
 
 
 class BaseCliPlugin(ABC):
@@ -0,0 +1,133 @@
+import json
+import os
+import time
+from glob import glob
+from resotolib.args import ArgumentParser
+from resotolib.logging import log
+from typing import Dict, Optional
+
+
+class CollectorCheckpoints:
+    """Persistent per collector checkpoints used for incremental collection.
+
+    A collector plugin can store a checkpoint (e.g. a timestamp, an ETag or a next-token)
+    for every resource collector it runs. On the next run the checkpoint is handed back,
+    so the collector only has to fetch resources that changed since then.
+
+    Checkpoints of a run are written to a pending file when the plugin finished collecting.
+    They only become active once the graph has been sent to resotocore successfully
+    (see commit_checkpoints()), so a failed import never skips changes.
+
+    A full resync is required when there is no state directory, no previous full resync
+    or the last full resync is older than the configured full resync interval.
+    During a full resync no checkpoints are handed out.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        state_dir: Optional[str] = None,
+        full_resync_interval: Optional[int] = None,
+    ) -> None:
+        if state_dir is None:
+            state_dir = getattr(ArgumentParser.args, "collector_state_dir", None)
+        if full_resync_interval is None:
+            full_resync_interval = (
+                getattr(ArgumentParser.args, "full_resync_interval", None) or 86400
+            )
+        self.name = name
+        self.full_resync_interval = full_resync_interval
+        self.path = (
+            os.path.join(state_dir, f"{name}.checkpoints.json") if state_dir else None
+        )
+        self.last_full_resync: Optional[float] = None
+        self.committed: Dict[str, Dict] = {}
+        self.pending: Dict[str, Dict] = {}
+        self.load()
+
+    def load(self) -> None:
+        if self.path is None or not os.path.isfile(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+            self.last_full_resync = state.get("last_full_resync")
+            self.committed = state.get("checkpoints", {})
+        except Exception:
+            log.exception(f"Unable to load checkpoints from {self.path} - ignoring")
+
+    @property
+    def full_resync(self) -> bool:
+        return (
+            self.path is None
+            or self.last_full_resync is None
+            or time.time() - self.last_full_resync > self.full_resync_interval
+        )
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the checkpoint of the last run or None if everything needs to be collected"""
+        if self.full_resync:
+            return None
+        return self.committed.get(key)
+
+    def set(self, key: str, **checkpoint) -> None:
+        self.pending[key] = checkpoint
+
+    def save(self) -> None:
+        """Write the checkpoints of this run to the pending checkpoint file"""
+        if self.path is None:
+            return
+        state = {
+            "last_full_resync": time.time()
+            if self.full_resync
+            else self.last_full_resync,
+            "checkpoints": {**self.committed, **self.pending},
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(f"{self.path}.pending", "w") as f:
+            json.dump(state, f)
+        log.debug(f"Wrote {len(self.pending)} pending checkpoints of {self.name}")
+
+    def discard(self) -> None:
+        """Drop the pending checkpoints of this run, e.g. when its results are ignored"""
+        self.pending = {}
+        if self.path is not None and os.path.isfile(f"{self.path}.pending"):
+            os.remove(f"{self.path}.pending")
+
+
+def commit_checkpoints(state_dir: Optional[str] = None) -> None:
+    """Activate all pending checkpoints after a collect run has been imported"""
+    if state_dir is None:
+        state_dir = getattr(ArgumentParser.args, "collector_state_dir", None)
+    if not state_dir:
+        return
+    for pending in glob(os.path.join(state_dir, "*.checkpoints.json.pending")):
+        os.replace(pending, pending[: -len(".pending")])
+        log.debug(f"Committed checkpoints {pending}")
+
+
+def discard_checkpoints(state_dir: Optional[str] = None) -> None:
+    """Drop all pending checkpoints of a collect run that could not be imported"""
+    if state_dir is None:
+        state_dir = getattr(ArgumentParser.args, "collector_state_dir", None)
+    if not state_dir:
+        return
+    for pending in glob(os.path.join(state_dir, "*.checkpoints.json.pending")):
+        os.remove(pending)
+
+
+def add_args(arg_parser: ArgumentParser) -> None:
+    arg_parser.add_argument(
+        "--collector-state-dir",
+        help="Directory to store incremental collection checkpoints in (default: None - always collect everything)",
+        default=None,
+        dest="collector_state_dir",
+        type=str,
+    )
+    arg_parser.add_argument(
+        "--full-resync-interval",
+        help="Seconds after which all resources are collected again (default: 86400)",
+        default=86400,
+        dest="full_resync_interval",
+        type=int,
+    )
@@ -0,0 +1,48 @@
+import os
+import time
+from resotolib.checkpoint import (
+    CollectorCheckpoints,
+    commit_checkpoints,
+    discard_checkpoints,
+)
+
+
+def test_checkpoints(tmp_path):
+    state_dir = str(tmp_path)
+    checkpoints = CollectorCheckpoints("test", state_dir, 3600)
+    # nothing collected so far
+    assert checkpoints.full_resync is True
+    assert checkpoints.get("instances") is None
+    checkpoints.set("instances", timestamp=123)
+    checkpoints.save()
+    assert os.path.isfile(os.path.join(state_dir, "test.checkpoints.json.pending"))
+
+    # pending checkpoints are not used before they are committed
+    assert CollectorCheckpoints("test", state_dir, 3600).full_resync is True
+    commit_checkpoints(state_dir)
+    checkpoints = CollectorCheckpoints("test", state_dir, 3600)
+    assert checkpoints.full_resync is False
+    assert checkpoints.get("instances") == {"timestamp": 123}
+
+    # discarded checkpoints are never committed
+    checkpoints.set("instances", timestamp=456)
+    checkpoints.save()
+    discard_checkpoints(state_dir)
+    commit_checkpoints(state_dir)
+    assert CollectorCheckpoints("test", state_dir, 3600).get("instances") == {
+        "timestamp": 123
+    }
+
+    # a full resync is required once the interval has passed
+    checkpoints = CollectorCheckpoints("test", state_dir, 3600)
+    checkpoints.last_full_resync = time.time() - 7200
+    assert checkpoints.full_resync is True
+    assert checkpoints.get("instances") is None
+
+
+def test_no_state_dir():
+    checkpoints = CollectorCheckpoints("test", "", 3600)
+    assert checkpoints.full_resync is True
+    checkpoints.set("instances", timestamp=123)
+    checkpoints.save()
+    assert checkpoints.get("instances") is None
@@ -1,6 +1,7 @@
 import os
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from resotolib.logging import log, setup_logger, add_args as logging_add_args
 from resotolib.jwt import add_args as jwt_add_args
 from resotolib.core.config import get_config, set_config, ConfigNotFoundError
@@ -21,6 +22,7 @@ from threading import Event
 from resotolib.args import ArgumentParser
 from signal import signal, SIGTERM, SIGINT
 from yaml import load
+from typing import List, Dict
 
 try:
     from yaml import CLoader as Loader
@@ -141,54 +143,71 @@ def find_metrics():
 @metrics_update_metrics.time()
 def update_metrics(metrics: Metrics, query_uri: str) -> None:
     metrics_descriptions = find_metrics()
-    for _, data in metrics_descriptions.items():
-        if shutdown_event.is_set():
-            return
-
-        metrics_query = data.get("query")
-        metric_type = data.get("type")
-        metric_help = data.get("help", "")
-
-        if metrics_query is None:
-            continue
+    # All metric queries are sent concurrently, so generating the metrics
+    # takes about as long as the slowest query.
+    with ThreadPoolExecutor(
+        max_workers=ArgumentParser.args.pool_size,
+        thread_name_prefix="resotometrics_query",
+    ) as executor:
+        futures = {}
+        for _, data in metrics_descriptions.items():
+            metrics_query = data.get("query")
+            metric_type = data.get("type")
+
+            if metrics_query is None:
+                continue
+
+            if metric_type not in ("gauge", "counter"):
+                log.error(f"Do not know how to handle metrics of type {metric_type}")
+                continue
+
+            future = executor.submit(lambda q: list(query(q, query_uri)), metrics_query)
+            futures[future] = data
+
+        for future in as_completed(futures):
+            if shutdown_event.is_set():
+                for pending in futures:
+                    pending.cancel()
+                return
+
+            data = futures[future]
+            try:
+                add_metrics_from_results(
+                    metrics, data.get("type"), data.get("help", ""), future.result()
+                )
+            except RuntimeError as e:
+                log.error(e)
+                continue
+    metrics.swap()
 
-        if metric_type not in ("gauge", "counter"):
-            log.error(f"Do not know how to handle metrics of type {metric_type}")
-            continue
 
-        try:
-            for result in query(metrics_query, query_uri):
-                labels = get_labels_from_result(result)
-                label_values = get_label_values_from_result(result, labels)
-
-                for metric_name, metric_value in get_metrics_from_result(
-                    result
-                ).items():
-                    if metric_name not in metrics.staging:
-                        log.debug(f"Adding metric {metric_name} of type {metric_type}")
-                        if metric_type == "gauge":
-                            metrics.staging[metric_name] = GaugeMetricFamily(
-                                f"resoto_{metric_name}",
-                                metric_help,
-                                labels=labels,
-                            )
-                        elif metric_type == "counter":
-                            metrics.staging[metric_name] = CounterMetricFamily(
-                                f"resoto_{metric_name}",
-                                metric_help,
-                                labels=labels,
-                            )
-                    if metric_type == "counter" and metric_name in metrics.live:
-                        current_metric = metrics.live[metric_name]
-                        for sample in current_metric.samples:
-                            if sample.labels == result.get("group"):
-                                metric_value += sample.value
-                                break
-                    metrics.staging[metric_name].add_metric(label_values, metric_value)
-        except RuntimeError as e:
-            log.error(e)
-            continue
-    metrics.swap()
+def add_metrics_from_results(
+    metrics: Metrics, metric_type: str, metric_help: str, results: List[Dict]
+) -> None:
+    for result in results:
+        labels = get_labels_from_result(result)
+        label_values = get_label_values_from_result(result, labels)
+
+        for metric_name, metric_value in get_metrics_from_result(result).items():
+            if metric_name not in metrics.staging:
+                log.debug(f"Adding metric {metric_name} of type {metric_type}")
+                if metric_type == "gauge":
+                    metrics.staging[metric_name] = GaugeMetricFamily(
+                        f"resoto_{metric_name}",
+                        metric_help,
+                        labels=labels,
+                    )
+                elif metric_type == "counter":
+                    metrics.staging[metric_name] = CounterMetricFamily(
+                        f"resoto_{metric_name}",
+                        metric_help,
+                        labels=labels,
+                    )
+            if metric_type == "counter":
+                metric_value = metrics.add_counter_value(
+                    metric_name, label_values, metric_value
+                )
+            metrics.staging[metric_name].add_metric(label_values, metric_value)
 
 
 def add_args(arg_parser: ArgumentParser) -> None:
@@ -217,6 +236,13 @@ def add_args(arg_parser: ArgumentParser) -> None:
         dest="timeout",
         type=int,
     )
+    arg_parser.add_argument(
+        "--pool-size",
+        help="Number of metric queries to run in parallel (default: 5)",
+        default=5,
+        dest="pool_size",
+        type=int,
+    )
 
 
 if __name__ == "__main__":
@@ -1,14 +1,28 @@
 from resotolib.logging import log
+from typing import Dict, Tuple
 
 
 class Metrics:
     def __init__(self) -> None:
         self.live = {}
         self.staging = {}
+        # counter values by metric name and label values
+        self.live_counters: Dict[str, Dict[Tuple[str, ...], float]] = {}
+        self.staging_counters: Dict[str, Dict[Tuple[str, ...], float]] = {}
+
+    def add_counter_value(
+        self, metric_name: str, label_values: Tuple[str, ...], value: float
+    ) -> float:
+        """Add value to the live counter with the same label values and return the sum"""
+        value += self.live_counters.get(metric_name, {}).get(label_values, 0)
+        self.staging_counters.setdefault(metric_name, {})[label_values] = value
+        return value
 
     def swap(self) -> None:
         self.live = self.staging
         self.staging = {}
+        self.live_counters = self.staging_counters
+        self.staging_counters = {}
 
 
 class GraphCollector:
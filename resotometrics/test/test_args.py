@@ -12,3 +12,4 @@ def test_args():
     assert ArgumentParser.args.resotocore_ws_uri == "ws://localhost:8900"
     assert ArgumentParser.args.resotocore_graph == "resoto"
     assert ArgumentParser.args.timeout == 300
+    assert ArgumentParser.args.pool_size == 5
@@ -0,0 +1,30 @@
+from resotometrics.metrics import Metrics
+from resotometrics.__main__ import add_metrics_from_results
+
+
+def test_counter_values():
+    metrics = Metrics()
+    results = [
+        {"group": {"cloud": "aws"}, "cleaned_total": 2},
+        {"group": {"cloud": "gcp"}, "cleaned_total": 3},
+    ]
+    add_metrics_from_results(metrics, "counter", "Cleaned", results)
+    metrics.swap()
+    assert metrics.live_counters["cleaned_total"] == {("aws",): 2, ("gcp",): 3}
+
+    # counters add up the values of the previous run with the same labels
+    add_metrics_from_results(metrics, "counter", "Cleaned", results[:1])
+    metrics.swap()
+    assert metrics.live_counters["cleaned_total"] == {("aws",): 4}
+    samples = metrics.live["cleaned_total"].samples
+    assert [(s.labels, s.value) for s in samples] == [({"cloud": "aws"}, 4)]
+
+
+def test_gauge_values():
+    metrics = Metrics()
+    results = [{"group": {"cloud": "aws"}, "instances_total": 2}]
+    add_metrics_from_results(metrics, "gauge", "Instances", results)
+    add_metrics_from_results(metrics, "gauge", "Instances", results)
+    metrics.swap()
+    assert metrics.live_counters == {}
+    assert [s.value for s in metrics.live["instances_total"].samples] == [2, 2]
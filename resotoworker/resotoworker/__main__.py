@@ -6,6 +6,7 @@ import resotolib.signal
 from typing import List, Dict
 from resotolib.logging import log, setup_logger, add_args as logging_add_args
 from resotolib.graph import add_args as graph_add_args
+from resotolib.checkpoint import add_args as checkpoint_add_args
 from resotolib.jwt import add_args as jwt_add_args
 from resotolib.pluginloader import PluginLoader
 from resotolib.baseplugin import BaseCollectorPlugin, PluginType
@@ -65,6 +66,7 @@ def main() -> None:
     jwt_add_args(arg_parser)
     logging_add_args(arg_parser)
     graph_add_args(arg_parser)
+    checkpoint_add_args(arg_parser)
     collect_add_args(arg_parser)
     cleanup_add_args(arg_parser)
     core_add_args(arg_parser)
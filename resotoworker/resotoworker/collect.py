@@ -6,6 +6,7 @@ from resotoworker.resotocore import send_to_resotocore
 from resotolib.args import ArgumentParser
 from resotolib.baseplugin import BaseCollectorPlugin
 from resotolib.baseresources import GraphRoot
+from resotolib.checkpoint import commit_checkpoints, discard_checkpoints
 from resotolib.graph import Graph, sanitize
 from resotolib.logging import log, setup_logger
 from typing import List, Optional
@@ -53,7 +54,17 @@ def collect_and_send(collectors: List[BaseCollectorPlugin]) -> None:
         sanitize(graph)
         return graph
 
-    send_to_resotocore(collect(collectors))
+    try:
+        sent = send_to_resotocore(collect(collectors))
+    except Exception:
+        # the changes of this run have not been imported and need to be collected again
+        discard_checkpoints()
+        raise
+    # only a confirmed import makes the checkpoints of this run active
+    if sent:
+        commit_checkpoints()
+    else:
+        discard_checkpoints()
 
 
 def collect_plugin_graph(
@@ -84,6 +95,7 @@ def collect_plugin_graph(
                 f"Graph of plugin {collector.cloud} is not acyclic"
                 " - ignoring plugin results"
             )
+            collector.checkpoints.discard()
             return None
         log.info(f"Collector of plugin {collector.cloud} finished in {elapsed:.4f}s")
         return collector.graph
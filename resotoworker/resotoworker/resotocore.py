@@ -8,9 +8,10 @@ from resotolib.jwt import encode_jwt_to_headers
 from resotolib.graph import Graph, GraphExportIterator
 
 
-def send_to_resotocore(graph: Graph):
+def send_to_resotocore(graph: Graph) -> bool:
+    """Send the graph to resotocore. Returns True, if the graph has been imported."""
     if not ArgumentParser.args.resotocore_uri:
-        return
+        return False
 
     log.info("resotocore Event Handler called")
 
@@ -29,6 +30,7 @@ def send_to_resotocore(graph: Graph):
     del graph
     graph_export_iterator.export_graph()
     send_graph(graph_export_iterator, base_uri, resotocore_graph)
+    return True
 
 
 def create_graph(resotocore_base_uri: str, resotocore_graph: str):